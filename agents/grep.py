@@ -0,0 +1,87 @@
+"""
+File scanning for `grep_code`.
+
+Each file is first searched as a whole, which rejects the (usually many)
+files without a match in one regex call; only files that pass are scanned
+line by line. A handful of files is scanned in this process. Larger sets,
+typically patterns the trigram index cannot narrow, are split into
+batches over a process pool; batches are collected in order and the scan
+stops as soon as `limit` matches are known.
+"""
+
+import multiprocessing
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Tuple
+
+from core.config import GREP_WORKERS, GREP_PARALLEL_MIN_FILES
+
+Match = Tuple[str, int, str]   # (relative path, line number, stripped line)
+
+_BATCH_FILES = 32
+# Whole-file searching may disagree with line-by-line searching on these
+_LINE_ONLY = ("\\A", "\\Z", "(?<")
+
+def scan_files(files: Sequence[Tuple[str, str]], pattern: str, limit: int) -> List[Match]:
+    """Scans (absolute path, relative path) pairs in order, returning at most `limit` matches."""
+    regex = re.compile(pattern)
+    prefilter = None if any(token in pattern for token in _LINE_ONLY) else re.compile(pattern, re.MULTILINE)
+    matches = []
+    for abs_path, rel_path in files:
+        try:
+            with open(abs_path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+        except OSError:
+            continue
+        if prefilter is not None and not prefilter.search(text):
+            continue
+        for line_num, line in enumerate(text.splitlines(keepends=True), 1):
+            if regex.search(line):
+                matches.append((rel_path, line_num, line.strip()))
+                if len(matches) >= limit:
+                    return matches
+    return matches
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The agent process runs threads, which forked workers must not inherit
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=GREP_WORKERS, mp_context=context)
+        return _pool
+
+def grep_files(files: Sequence[Tuple[str, str]], pattern: str, limit: int) -> List[Match]:
+    """
+    Returns the first `limit` matches of `pattern` in `files`, in file order.
+
+    Args:
+        files: (absolute path, relative path) pairs
+        pattern: Regex, searched line by line
+        limit: Matches after which scanning stops
+    """
+    if len(files) < GREP_PARALLEL_MIN_FILES or GREP_WORKERS <= 1:
+        return scan_files(files, pattern, limit)
+
+    pool = _get_pool()
+    batches = deque(files[i : i + _BATCH_FILES] for i in range(0, len(files), _BATCH_FILES))
+    running = deque()
+    matches = []
+    try:
+        while batches or running:
+            # Keep every worker busy, a little ahead of the batch being collected
+            while batches and len(running) < GREP_WORKERS * 2:
+                running.append(pool.submit(scan_files, batches.popleft(), pattern, limit))
+            matches.extend(running.popleft().result())
+            if len(matches) >= limit:
+                break
+    finally:
+        for future in running:
+            future.cancel()
+    return matches[:limit]
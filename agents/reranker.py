@@ -1,36 +1,165 @@
-from typing import List
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
 from langchain_core.documents import Document
 
+from core.config import RERANK_CACHE_SIZE, RERANK_LEXICAL_MARGIN, RERANK_MARGIN
+from indexing.lexical import identifier_terms, split_identifier
+
+TIERS = ("passthrough", "margin", "lexical", "llm", "cache")
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+# Words of a question that say nothing about which code is meant
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "the", "this", "to", "what", "when", "where", "which", "who", "why", "with",
+}
+# How much each kind of chunk is worth on its own: definitions over loose blocks
+_CHUNK_TYPE_SCORES = {"class": 1.0, "function": 1.0, "method": 1.0, "module": 0.5, "block": 0.5}
+
+
+def _terms(text: str) -> set:
+    """Lower-cased words and identifier parts of `text`."""
+    terms = set()
+    for word in _WORD_RE.findall(text):
+        terms.add(word.lower())
+        terms.update(part.lower() for part in split_identifier(word) if len(part) > 1)
+    return terms - _STOPWORDS
+
 
 class Reranker:
-    """Reranks search results using LLM to assess relevance to the query."""
-    
-    def __init__(self, llm):
+    """
+    Reranks search results, as cheaply as the results allow.
+
+    Each call is served by the first tier that can settle the order:
+    - `passthrough`: no more results than top_k, so there is nothing to rank
+    - `cache`: the same query over the same candidates was ranked before,
+      for the same top_k
+    - `margin`: the best vector hit is clearly closer than the rest, so the
+      order is kept
+    - `lexical`: a local score of identifier overlap, path match and chunk
+      type has a clear winner
+    - `llm`: the LLM ranks the results
+
+    `tier_counts` records which tier served each call.
+    """
+
+    def __init__(self, llm=None):
         """Initialize reranker with an LLM instance.
-        
+
         Args:
-            llm: LangChain LLM instance for scoring relevance
+            llm: LangChain LLM instance for scoring relevance; without one,
+                ambiguous results keep the lexical order
         """
         self.llm = llm
-    
+        self.tier_counts = dict.fromkeys(TIERS, 0)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.tier_counts)
+
     def rerank(self, query: str, documents: List[Document], top_k: int = 5) -> List[Document]:
         """Rerank documents by relevance to the query.
-        
+
         Args:
             query: The search query
             documents: List of documents to rerank
             top_k: Number of top documents to return
-            
+
         Returns:
             List of top_k most relevant documents, ordered by relevance
         """
         if not documents:
             return []
-        
+
         # If we have fewer documents than top_k, return all
         if len(documents) <= top_k:
+            with self._lock:
+                self.tier_counts["passthrough"] += 1
             return documents
-        
+
+        # Chunk IDs derive from path and content, so a cached ranking can't go stale;
+        # it only holds top_k documents, so a different top_k is a different entry
+        ids = [doc.metadata.get("id", i) for i, doc in enumerate(documents)]
+        key = (query, frozenset(ids), top_k)
+        with self._lock:
+            order = self._cache.get(key)
+            if order is not None:
+                self._cache.move_to_end(key)
+                self.tier_counts["cache"] += 1
+        if order is not None:
+            by_id = dict(zip(ids, documents))
+            return [by_id[id_] for id_ in order]
+
+        tier, ranked = self._rank(query, documents, top_k)
+        id_of = {id(doc): id_ for id_, doc in zip(ids, documents)}
+        with self._lock:
+            self.tier_counts[tier] += 1
+            self._cache[key] = [id_of[id(doc)] for doc in ranked]
+            while len(self._cache) > RERANK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return ranked
+
+    def _rank(self, query: str, documents: List[Document], top_k: int):
+        if self._has_clear_margin(documents):
+            return "margin", documents[:top_k]
+
+        scores = self.lexical_scores(query, documents)
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        lexical = [documents[i] for i in order[:top_k]]
+        if self.llm is None or scores[order[0]] - scores[order[1]] >= RERANK_LEXICAL_MARGIN:
+            return "lexical", lexical
+
+        ranked = self._llm_rank(query, documents, top_k)
+        if ranked is None:
+            return "lexical", lexical
+        return "llm", ranked
+
+    @staticmethod
+    def _has_clear_margin(documents: List[Document]) -> bool:
+        """True if the first result is the closest vector hit and far ahead of the next one."""
+        distances = sorted(
+            (doc.metadata["distance"], i) for i, doc in enumerate(documents) if "distance" in doc.metadata
+        )
+        # Keyword-only results have no distances to compare
+        if len(distances) < 3 or distances[0][1] != 0:
+            return False
+        spread = distances[-1][0] - distances[0][0]
+        return spread > 0 and (distances[1][0] - distances[0][0]) / spread >= RERANK_MARGIN
+
+    @staticmethod
+    def lexical_scores(query: str, documents: List[Document]) -> List[float]:
+        """
+        Scores each document between 0 and 1 from how many query terms its
+        identifiers, symbol and path contain, its chunk type, and its
+        position in the incoming order.
+        """
+        terms = _terms(query)
+        scores = []
+        for rank, doc in enumerate(documents):
+            symbol = doc.metadata.get("symbol") or ""
+            if terms:
+                identifiers = set(identifier_terms(f"{symbol} {doc.page_content}").split())
+                identifier_score = len(terms & identifiers) / len(terms)
+                symbol_score = len(terms & _terms(symbol)) / len(terms)
+                path_score = len(terms & _terms(doc.metadata.get("path", ""))) / len(terms)
+            else:
+                identifier_score = symbol_score = path_score = 0.0
+            type_score = _CHUNK_TYPE_SCORES.get(doc.metadata.get("chunk_type"), 0.3)
+            scores.append(
+                0.4 * identifier_score
+                + 0.25 * symbol_score
+                + 0.15 * path_score
+                + 0.1 * type_score
+                + 0.1 / (rank + 1)
+            )
+        return scores
+
+    def _llm_rank(self, query: str, documents: List[Document], top_k: int) -> Optional[List[Document]]:
+        """Asks the LLM for the top_k documents; None if it fails or gives no usable answer."""
         # Create a concise representation of each document for the LLM
         doc_summaries = []
         for i, doc in enumerate(documents):
@@ -39,9 +168,9 @@ class Reranker:
             # Include file path from metadata if available
             file_path = doc.metadata.get('path', 'unknown')
             doc_summaries.append(f"[{i}] File: {file_path}\nContent: {content_preview}...")
-        
+
         docs_text = "\n\n".join(doc_summaries)
-        
+
         # Create prompt for LLM to rank documents
         prompt = f"""Given the search query: "{query}"
 
@@ -56,33 +185,28 @@ Code snippets:
 Return ONLY the indices of the top {top_k} most relevant snippets, in order from most to least relevant.
 Format: comma-separated numbers (e.g., "3,0,7,1,5")
 Response:"""
-        
+
         try:
             # Get LLM response
             response = self.llm.invoke(prompt).content.strip()
-            
-            # Parse the response to extract indices
-            indices = []
-            for part in response.split(','):
-                part = part.strip()
-                # Extract first number found in the part
-                num_str = ''.join(c for c in part if c.isdigit())
-                if num_str and int(num_str) < len(documents):
-                    indices.append(int(num_str))
-            
-            # If we got valid indices, reorder documents
-            if indices:
-                reranked = [documents[i] for i in indices[:top_k]]
-                # If we didn't get enough indices, append remaining docs
-                if len(reranked) < top_k:
-                    remaining = [doc for i, doc in enumerate(documents) if i not in indices]
-                    reranked.extend(remaining[:top_k - len(reranked)])
-                return reranked
-            else:
-                # Fallback: return original order
-                return documents[:top_k]
-                
         except Exception as e:
-            # On any error, fallback to original order
-            print(f"Reranking failed: {e}. Using original order.")
-            return documents[:top_k]
+            print(f"Reranking failed: {e}. Using the lexical order.")
+            return None
+
+        # Parse the response to extract indices
+        indices = []
+        for part in response.split(','):
+            part = part.strip()
+            # Extract first number found in the part
+            num_str = ''.join(c for c in part if c.isdigit())
+            if num_str and int(num_str) < len(documents) and int(num_str) not in indices:
+                indices.append(int(num_str))
+
+        if not indices:
+            return None
+        reranked = [documents[i] for i in indices[:top_k]]
+        # If we didn't get enough indices, append remaining docs
+        if len(reranked) < top_k:
+            remaining = [doc for i, doc in enumerate(documents) if i not in indices]
+            reranked.extend(remaining[:top_k - len(reranked)])
+        return reranked
@@ -1,44 +1,184 @@
 from langchain.tools import tool
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
-from core.config import get_vector_persist_dir
+from langchain_core.documents import Document
+from core.ignore import get_matcher
+from embeddings.factory import get_embedding_model
+from vectorstore.chroma import get_vector_store
+from indexing.lexical import get_lexical_index, is_identifier_query, reciprocal_rank_fusion
+from ingestion.loaders.document import is_document, extract_pages, load_cached_pages
+from ingestion.chunking.code import parse_python
+from indexing.symbols import SymbolIndex, extract_symbols
+from indexing.trigrams import get_trigram_index, regex_query
+from indexing.file_tree import get_file_tree
+from indexing.state import read_records
+from ingestion.watcher import pending_updates
+from agents.grep import grep_files
+from agents.reranker import Reranker
+from core.config import GREP_MAX_MATCHES
 import os
 import ast
+import hashlib
 import fnmatch
 import re
 import subprocess
 import jedi
 
-def get_embeddings():
-    return OllamaEmbeddings(model="qwen3-embedding:0.6b", base_url="http://localhost:11434")
-
 class ProjectTools:
     def __init__(self, project_path: str = ".", llm=None):
         self.project_path = os.path.abspath(project_path)
         self.llm = llm
-        self.vectorstore = Chroma(
-            collection_name="cortex",
-            embedding_function=get_embeddings(),
-            persist_directory=get_vector_persist_dir(self.project_path)
-        )
+        self.matcher = get_matcher(self.project_path)
+        # The same handles the indexer and the watcher use in this process
+        self.vectorstore = get_vector_store(self.project_path)
+        self.embedding_model = get_embedding_model()
+        self.lexical_index = get_lexical_index(self.project_path)
+        self.symbols = SymbolIndex(self.project_path)
+        self.trigram_index = get_trigram_index(self.project_path)
+        # One per session, so its ranking cache and tier counts carry across searches
+        self.reranker = Reranker(llm)
+
+    def similarity_search(self, query: str, k: int = 10) -> list[Document]:
+        """Returns the `k` chunks closest to `query`; repeated queries skip the embedding call."""
+        embedding = self.embedding_model.embed_query(query)
+        return [
+            Document(page_content=result.content, metadata={**result.metadata, "id": result.id, "distance": result.distance})
+            for result in self.vectorstore.query(embedding, k=k)
+        ]
+
+    def keyword_search(self, query: str, k: int = 10) -> list[Document]:
+        """Returns the `k` best BM25 matches for `query` from the lexical index."""
+        if self.lexical_index is None:
+            return []
+        return [
+            Document(page_content=result.content, metadata={**result.metadata, "id": result.id})
+            for result in self.lexical_index.search(query, k=k)
+        ]
+
+    def hybrid_search(self, query: str, k: int = 10) -> list[Document]:
+        """
+        Runs keyword and vector search and merges them with reciprocal rank fusion.
+
+        A query that is just an identifier (`parse_config`, `Foo.bar`) is
+        answered from the keyword index alone when it has matches, without
+        an embedding call.
+        """
+        keyword_results = self.keyword_search(query, k=k)
+        if keyword_results and is_identifier_query(query):
+            return keyword_results
+        vector_results = self.similarity_search(query, k=k)
+        if not keyword_results:
+            return vector_results
+
+        by_id = {}
+        for doc in keyword_results + vector_results:
+            # Keep the vector hit's metadata (with its distance) when both found a chunk
+            by_id[doc.metadata["id"]] = doc
+        fused = reciprocal_rank_fusion([
+            [doc.metadata["id"] for doc in keyword_results],
+            [doc.metadata["id"] for doc in vector_results],
+        ])
+        return [by_id[id_] for id_ in fused[:k]]
+
+    def _resolve_ambiguous(self, sites, symbol_name: str, limit: int):
+        """
+        Keeps the sites that are among the first `limit` uses of `symbol_name`,
+        asking Jedi about those the symbol table could not attribute.
+        """
+        kept = []
+        project = None
+        for site in sites:
+            if len(kept) >= limit:
+                break
+            if not site.ambiguous:
+                kept.append(site)
+                continue
+            if project is None:
+                project = jedi.Project(self.project_path)
+            try:
+                script = jedi.Script(path=os.path.join(self.project_path, site.path), project=project)
+                names = script.goto(site.line, site.column, follow_imports=True)
+            except Exception:
+                continue
+            if any(name.full_name and (name.full_name == symbol_name or name.full_name.endswith("." + symbol_name)) for name in names):
+                kept.append(site)
+        return kept
+
+    def _jedi_definitions(self, symbol_name: str) -> list[str]:
+        project = jedi.Project(self.project_path)
+        results = []
+        for name in project.search(symbol_name):
+            if name.is_definition():
+                results.append(
+                    f"Symbol: {name.full_name}\n"
+                    f"Type: {name.type}\n"
+                    f"File: {name.module_path}\n"
+                    f"Line: {name.line}, Column: {name.column}\n"
+                )
+        return results
+
+    def _jedi_references(self, symbol_name: str) -> list[str]:
+        project = jedi.Project(self.project_path)
+        results = []
+        for name in project.search(symbol_name):
+            if name.is_definition():
+                try:
+                    refs = name.references()
+                    for ref in refs:
+                        results.append(
+                            f"File: {ref.module_path}\n"
+                            f"Line: {ref.line}, Column: {ref.column}\n"
+                            f"Context: {ref.description}\n"
+                        )
+                except AttributeError:
+                    # Some Name objects don't support references()
+                    results.append(
+                        f"File: {name.module_path}\n"
+                        f"Line: {name.line}, Column: {name.column}\n"
+                        f"Definition: {name.full_name} ({name.type})\n"
+                    )
+        return results
+
+    @staticmethod
+    def _indexed_as_is(abs_path: str, records: dict) -> bool:
+        """True if the file's stat still matches the state recorded when it was indexed."""
+        record = records.get(abs_path)
+        if record is None:
+            return False
+        try:
+            return record.matches(os.stat(abs_path))
+        except OSError:
+            return False
+
+    def _source_line(self, rel_path: str, line: int) -> str:
+        try:
+            with open(os.path.join(self.project_path, rel_path), "r", encoding="utf-8", errors="ignore") as f:
+                for number, text in enumerate(f, start=1):
+                    if number == line:
+                        return text.strip()
+        except OSError:
+            pass
+        return ""
+
+    def _read_document(self, full_path: str) -> str:
+        """Returns a PDF or DOCX file's text, from the extraction cache when the file was indexed."""
+        with open(full_path, "rb") as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+        pages = load_cached_pages(self.project_path, file_hash)
+        if pages is None:
+            pages = extract_pages(full_path)
+        return "\n\n".join(f"--- Page {number} ---\n{text}" for number, text in enumerate(pages, start=1))
 
     def get_tools(self):
-        @tool("search_code", description="Semantic search for code snippets based on meaning/context. Best for concepts and understanding 'how things work'. For exact function/class names, use grep_code instead.")
+        @tool("search_code", description="Search code snippets by meaning and by keyword. Works for concepts ('how does X work') and for exact function/class/variable names, which are matched directly.")
         def search_code(query: str):
-            # Fetch more results initially for reranking
-            results = self.vectorstore.similarity_search(query, k=10)
-            
-            # Rerank results if LLM is available
-            if self.llm and results:
-                from agents.reranker import Reranker
-                reranker = Reranker(self.llm)
-                results = reranker.rerank(query, results, top_k=5)
-            else:
-                # Fallback to top 5 if no LLM
-                results = results[:5]
+            # Fetch more results initially for reranking; the LLM is only asked when cheaper signals disagree
+            results = self.hybrid_search(query, k=10)
+            results = self.reranker.rerank(query, results, top_k=5)
             formatted = []
             for doc in results:
-                formatted.append(f"File: {doc.metadata.get('path')}\nContent:\n{doc.page_content}\n---")
+                location = doc.metadata.get('path')
+                if doc.metadata.get('page'):
+                    location += f" (page {doc.metadata['page']})"
+                formatted.append(f"File: {location}\nContent:\n{doc.page_content}\n---")
             return "\n".join(formatted)
 
         @tool("read_file", description="Read the full content of a file. Handles various encodings automatically. Use this to get context from specific files.")
@@ -50,6 +190,9 @@ class ProjectTools:
                 if not os.path.exists(full_path):
                     return f"Error: File '{path}' does not exist."
 
+                if is_document(full_path):
+                    return self._read_document(full_path)
+
                 # Try common encodings
                 encodings = ["utf-8", "latin-1", "utf-16"]
                 for enc in encodings:
@@ -65,20 +208,19 @@ class ProjectTools:
             except Exception as e:
                 return f"Error reading file {path}: {str(e)}"
 
-        @tool("get_symbol_info", description="Find definitions of a code symbol (class, function, variable) across the project.")
+        @tool("get_symbol_info", description="Find definitions of a code symbol (class, function, method, variable) across the project. Accepts a plain or qualified name, e.g. 'apply_updates' or 'Indexer.apply_updates'.")
         def get_symbol_info(symbol_name: str):
-            """Search for symbol definitions using static analysis."""
-            project = jedi.Project(self.project_path)
-            names = project.search(symbol_name)
-            results = []
-            for name in names:
-                if name.is_definition():
-                    results.append(
-                        f"Symbol: {name.full_name}\n"
-                        f"Type: {name.type}\n"
-                        f"File: {name.module_path}\n"
-                        f"Line: {name.line}, Column: {name.column}\n"
-                    )
+            """Look up symbol definitions in the symbol table (Jedi if the project has none yet)."""
+            if self.symbols.available():
+                results = [
+                    f"Symbol: {info.full_name}\n"
+                    f"Type: {info.kind}\n"
+                    f"File: {info.path}\n"
+                    f"Line: {info.line}, Column: {info.column}\n"
+                    for info in self.symbols.definitions(symbol_name)
+                ]
+            else:
+                results = self._jedi_definitions(symbol_name)
             
             if not results:
                 return f"No definitions found for symbol '{symbol_name}'."
@@ -88,26 +230,16 @@ class ProjectTools:
         @tool("find_references", description="Find where a specific code symbol is used across the project.")
         def find_references(symbol_name: str):
             """Search for usages of a symbol across the project."""
-            project = jedi.Project(self.project_path)
-            names = project.search(symbol_name)
-            results = []
-            for name in names:
-                if name.is_definition():
-                    try:
-                        refs = name.references()
-                        for ref in refs:
-                            results.append(
-                                f"File: {ref.module_path}\n"
-                                f"Line: {ref.line}, Column: {ref.column}\n"
-                                f"Context: {ref.description}\n"
-                            )
-                    except AttributeError:
-                        # Some Name objects don't support references()
-                        results.append(
-                            f"File: {name.module_path}\n"
-                            f"Line: {name.line}, Column: {name.column}\n"
-                            f"Definition: {name.full_name} ({name.type})\n"
-                        )
+            if self.symbols.available():
+                sites = self._resolve_ambiguous(self.symbols.references(symbol_name), symbol_name, limit=15)
+                results = [
+                    f"File: {site.path}\n"
+                    f"Line: {site.line}, Column: {site.column}\n"
+                    f"Context: {self._source_line(site.path, site.line)}\n"
+                    for site in sites
+                ]
+            else:
+                results = self._jedi_references(symbol_name)
             
             if not results:
                 return f"No references found for symbol '{symbol_name}'."
@@ -121,37 +253,38 @@ class ProjectTools:
             # Resolve directory relative to project_path
             search_path = directory if os.path.isabs(directory) else os.path.join(self.project_path, directory)
             
+            # Answered from the file manifest when it knows the directory
+            tree = get_file_tree(self.project_path)
+            rel_dir = os.path.relpath(os.path.abspath(search_path), self.project_path)
+            if tree is not None and not rel_dir.startswith(".."):
+                files_list = tree.list_dir(rel_dir, recursive)
+                if files_list:
+                    return "\n".join(files_list[:100])
+            
             if not os.path.exists(search_path):
                 return f"Error: Directory '{directory}' does not exist."
             
             files_list = []
-            ignore_list = [".git", "__pycache__", ".venv", ".cortex", ".gemini", ".pytest_cache", "node_modules"]
             
             if recursive:
-                for root, dirs, files in os.walk(search_path):
-                    dirs[:] = [d for d in dirs if not (d.startswith(".") or d in ignore_list)]
+                for root, dirs, files in self.matcher.walk(search_path):
                     for d in dirs:
                         rel_path = os.path.relpath(os.path.join(root, d), self.project_path)
                         files_list.append(rel_path + "/")
                     for file in files:
-                        if not (file.startswith(".") or file.endswith((".pyc", ".pyo", "-journal", ".tmp"))):
-                            rel_path = os.path.relpath(os.path.join(root, file), self.project_path)
-                            files_list.append(rel_path)
+                        rel_path = os.path.relpath(os.path.join(root, file), self.project_path)
+                        files_list.append(rel_path)
             else:
                 try:
                     items = os.listdir(search_path)
                     for item in items:
-                        if item.startswith(".") or item in ignore_list:
+                        item_path = os.path.join(search_path, item)
+                        is_dir = os.path.isdir(item_path)
+                        if self.matcher.is_ignored(item_path, is_dir):
                             continue
                         
-                        item_path = os.path.join(search_path, item)
                         rel_path = os.path.relpath(item_path, self.project_path)
-                        
-                        if os.path.isdir(item_path):
-                            files_list.append(rel_path + "/")
-                        else:
-                            if not item.endswith((".pyc", ".pyo", "-journal", ".tmp")):
-                                files_list.append(rel_path)
+                        files_list.append(rel_path + "/" if is_dir else rel_path)
                 except Exception as e:
                     return f"Error listing directory: {e}"
             
@@ -163,67 +296,93 @@ class ProjectTools:
 
         @tool("search_files_by_name", description="Find files matching a pattern (e.g., '*.py', 'test_*').")
         def search_files_by_name(pattern: str):
-            matches = []
-            ignore = [".git", "__pycache__", ".venv", ".cortex", "node_modules"]
+            tree = get_file_tree(self.project_path)
+            if tree is not None:
+                matches = tree.glob(pattern)
+                return "\n".join(matches[:30]) if matches else f"No files matching '{pattern}'"
             
-            for root, dirs, files in os.walk(self.project_path):
-                dirs[:] = [d for d in dirs if d not in ignore]
-                for file in files:
-                    if fnmatch.fnmatch(file, pattern):
-                        rel_path = os.path.relpath(os.path.join(root, file), self.project_path)
-                        matches.append(rel_path)
+            matches = []
+            for file_path in self.matcher.iter_files():
+                if fnmatch.fnmatch(os.path.basename(file_path), pattern):
+                    matches.append(os.path.relpath(file_path, self.project_path))
             
             return "\n".join(matches[:30]) if matches else f"No files matching '{pattern}'"
 
         @tool("get_file_outline", description="Get classes and functions in a Python file without full content.")
         def get_file_outline(path: str):
             full_path = path if os.path.isabs(path) else os.path.join(self.project_path, path)
+            full_path = os.path.abspath(full_path)
             
             try:
-                with open(full_path, 'r') as f:
-                    tree = ast.parse(f.read())
+                # Indexed and unchanged since: read it from the symbol table
+                if self.symbols.is_current(full_path):
+                    definitions = self.symbols.file_definitions(full_path)
+                else:
+                    with open(full_path, 'r') as f:
+                        tree = parse_python(f.read())
+                    if tree is None:
+                        return f"Error: {path} is not valid Python"
+                    definitions = extract_symbols(tree).definitions
                 
                 outline = []
-                for node in ast.iter_child_nodes(tree):
-                    if isinstance(node, ast.ClassDef):
-                        methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
-                        outline.append(f"class {node.name} (L{node.lineno}): {', '.join(methods)}")
-                    elif isinstance(node, ast.FunctionDef):
-                        outline.append(f"def {node.name}() (L{node.lineno})")
+                for definition in definitions:
+                    if definition.parent is not None:
+                        continue
+                    if definition.kind == "class":
+                        methods = [
+                            d.name for d in definitions
+                            if d.parent == definition.qualname and d.kind == "method"
+                        ]
+                        outline.append(f"class {definition.name} (L{definition.line}): {', '.join(methods)}")
+                    elif definition.kind == "function":
+                        outline.append(f"def {definition.name}() (L{definition.line})")
                 
                 return "\n".join(outline) if outline else "No classes/functions found"
             except Exception as e:
                 return f"Error: {e}"
 
-        @tool("grep_code", description="Exact pattern matching using regex. CRITICAL for finding specific function names, class names, variable names, or when search_code returns no results. Always use this as a fallback if semantic search fails.")
+        @tool("grep_code", description="Exact pattern matching using regex. Use it for patterns search_code cannot express (e.g. all call sites, string literals), or as a fallback when search_code returns no results.")
         def grep_code(pattern: str, file_pattern: str = "*.py"):
             """Search for regex pattern in files matching file_pattern."""
-            matches = []
-            ignore = [".git", "__pycache__", ".venv", ".cortex", "node_modules"]
-            
             try:
-                compiled_pattern = re.compile(pattern)
+                re.compile(pattern)
             except re.error as e:
                 return f"Invalid regex pattern: {e}"
             
-            for root, dirs, files in os.walk(self.project_path):
-                dirs[:] = [d for d in dirs if d not in ignore]
-                for file in files:
-                    if fnmatch.fnmatch(file, file_pattern):
-                        file_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(file_path, self.project_path)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                for line_num, line in enumerate(f, 1):
-                                    if compiled_pattern.search(line):
-                                        matches.append(f"{rel_path}:{line_num}: {line.strip()}")
-                        except Exception:
-                            continue
+            # Indexed files are only read if they contain the trigrams a match needs;
+            # files the index does not know about, or that changed since they were
+            # indexed, are always read. The session's watcher knows which files those
+            # are; without one, the rejected files are checked against their recorded stat.
+            indexed, candidates, pending, records = set(), None, None, {}
+            if self.trigram_index is not None:
+                indexed, candidates = self.trigram_index.candidates(regex_query(pattern))
+            if candidates is not None:
+                pending = pending_updates(self.project_path)
+                if pending is None:
+                    records = read_records(self.project_path)
+            
+            tree = get_file_tree(self.project_path)
+            if tree is not None:
+                rel_paths = tree.glob(file_pattern)
+            else:
+                rel_paths = sorted(
+                    os.path.relpath(file_path, self.project_path) for file_path in self.matcher.iter_files()
+                    if fnmatch.fnmatch(os.path.basename(file_path), file_pattern)
+                )
+            
+            files = []
+            for rel_path in rel_paths:
+                abs_path = os.path.join(self.project_path, rel_path)
+                if candidates is not None and rel_path in indexed and rel_path not in candidates:
+                    if abs_path not in pending if pending is not None else self._indexed_as_is(abs_path, records):
+                        continue
+                files.append((abs_path, rel_path))
             
+            matches = grep_files(files, pattern, GREP_MAX_MATCHES)
             if not matches:
                 return f"No matches found for pattern '{pattern}' in {file_pattern} files"
             
-            return "\n".join(matches[:50])  # Limit to 50 matches
+            return "\n".join(f"{rel_path}:{line_num}: {line}" for rel_path, line_num, line in matches)
 
         # ============================================================
         # WRITE TOOLS 
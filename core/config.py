@@ -23,6 +23,11 @@ TEXT_EXTENSIONS = {
     ".txt": "text"
 }
 
+DOCUMENT_EXTENSIONS = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+}
+
 IGNORED_DIRS = {
     ".git",
     "__pycache__",
@@ -42,11 +47,151 @@ IGNORED_FILE_SUFFIXES = (
     ".DS_Store"
 )
 
+# Project files are listed with `git ls-files` in git work trees instead of walking
+USE_GIT_LS_FILES = os.getenv("CORTEX_USE_GIT_LS_FILES", "1") not in ("0", "false", "no")
+
+# --- Loader Guard Constants ---
+
+# Files larger than this are recorded as skipped without being read
+MAX_FILE_KB = int(os.getenv("CORTEX_MAX_FILE_KB", "1024"))
+# Bytes read from the start of each file for the binary/minified/generated checks
+GUARD_SAMPLE_BYTES = int(os.getenv("CORTEX_GUARD_SAMPLE_BYTES", "65536"))
+# Code whose sampled lines average more characters than this is treated as minified
+MINIFIED_AVG_LINE_CHARS = int(os.getenv("CORTEX_MINIFIED_AVG_LINE_CHARS", "300"))
+# PDF and DOCX files are allowed up to this size instead
+MAX_DOCUMENT_KB = int(os.getenv("CORTEX_MAX_DOCUMENT_KB", "51200"))
+
+LOCKFILE_NAMES = {
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "composer.lock",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "Cargo.lock",
+    "poetry.lock",
+    "Pipfile.lock",
+}
+
+GENERATED_FILE_SUFFIXES = (
+    ".min.js",
+    ".min.css",
+    ".bundle.js",
+    ".chunk.js",
+    "_pb2.py",
+    "_pb2_grpc.py",
+)
+
+# Markers near the top of a file that identify it as generated
+GENERATED_MARKERS = (
+    "@generated",
+    "do not edit",
+    "auto-generated",
+    "autogenerated",
+    "code generated by",
+)
+
 # --- Model Constants ---
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "qwen3-embedding:0.6b")
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "600"))
+# Token budgets for Ollama embedding requests (estimated, ~3 characters per token)
+OLLAMA_MAX_INPUT_TOKENS = int(os.getenv("OLLAMA_MAX_INPUT_TOKENS", "2048"))
+OLLAMA_MAX_BATCH_TOKENS = int(os.getenv("OLLAMA_MAX_BATCH_TOKENS", "16384"))
+OLLAMA_MAX_BATCH_ITEMS = int(os.getenv("OLLAMA_MAX_BATCH_ITEMS", "64"))
+# Embedding requests kept in flight against the server at most
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "4"))
+# Attempts per request on connection errors, timeouts and 429/5xx responses
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "5"))
+
+# --- Indexing Constants ---
+
+# Processes used to read, hash and chunk files during `cortex index`
+INDEX_WORKERS = int(os.getenv("CORTEX_INDEX_WORKERS", str(os.cpu_count() or 1)))
+# Threads sending chunk batches to the embedding model concurrently
+EMBED_WORKERS = int(os.getenv("CORTEX_EMBED_WORKERS", "4"))
+# Chunks grouped into a single embedding request by the pipeline
+EMBED_BATCH_CHUNKS = int(os.getenv("CORTEX_EMBED_BATCH_CHUNKS", "64"))
+# Chunks accumulated before the writer flushes them to the vector store
+WRITE_BATCH_CHUNKS = int(os.getenv("CORTEX_WRITE_BATCH_CHUNKS", "512"))
+# Files allowed between being read and being written; bounds peak memory
+MAX_IN_FLIGHT_FILES = int(os.getenv("CORTEX_MAX_IN_FLIGHT_FILES", "256"))
+# State DB writes are committed every N files or every T milliseconds
+STATE_COMMIT_EVERY = int(os.getenv("CORTEX_STATE_COMMIT_EVERY", "500"))
+STATE_COMMIT_INTERVAL_MS = int(os.getenv("CORTEX_STATE_COMMIT_INTERVAL_MS", "2000"))
+# Files modified this close to when they were last read are re-hashed even if
+# their stat is unchanged, since a same-size edit could share the mtime tick
+RACY_WINDOW_MS = int(os.getenv("CORTEX_RACY_WINDOW_MS", "2000"))
+# Clones or pulls run at the same time when indexing a manifest
+CLONE_WORKERS = int(os.getenv("CORTEX_CLONE_WORKERS", "8"))
+# Repositories from a manifest indexed at the same time; they share one
+# prepare pool and one embedding model
+REPO_WORKERS = int(os.getenv("CORTEX_REPO_WORKERS", "4"))
+# PDFs longer than this are extracted in ranges of this many pages, spread
+# across the prepare processes
+PDF_PAGES_PER_TASK = int(os.getenv("CORTEX_PDF_PAGES_PER_TASK", "16"))
+
+# --- Chunking Constants ---
+
+# Code chunks are kept between these sizes (in characters): smaller siblings
+# are merged, larger bodies are split
+CHUNK_MAX_CHARS = int(os.getenv("CORTEX_CHUNK_MAX_CHARS", "4000"))
+CHUNK_MIN_CHARS = int(os.getenv("CORTEX_CHUNK_MIN_CHARS", "400"))
+
+# --- Embedding Cache Constants ---
+
+# Embeddings are cached across all projects, keyed by model and chunk text
+EMBED_CACHE_ENABLED = os.getenv("CORTEX_EMBED_CACHE", "1") not in ("0", "false", "no")
+EMBED_CACHE_MAX_MB = int(os.getenv("CORTEX_EMBED_CACHE_MAX_MB", "2048"))
+# Search queries whose embeddings are kept in memory, per process
+QUERY_CACHE_SIZE = int(os.getenv("CORTEX_QUERY_CACHE_SIZE", "1024"))
+
+# --- Vector Index Constants ---
+
+# HNSW parameters of the vector index. Space (l2, cosine or ip), M and
+# construction_ef are fixed when a collection is built; search_ef, the
+# candidate list size at query time, applies immediately
+HNSW_SPACE = os.getenv("CORTEX_HNSW_SPACE", "l2")
+HNSW_M = int(os.getenv("CORTEX_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("CORTEX_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("CORTEX_HNSW_SEARCH_EF", "100"))
+
+# --- Lexical Search Constants ---
+
+# Chunks are also indexed for BM25 keyword search (SQLite FTS5) and
+# search_code fuses both rankings
+LEXICAL_INDEX_ENABLED = os.getenv("CORTEX_LEXICAL_INDEX", "1") not in ("0", "false", "no")
+# Reciprocal rank fusion constant: higher values flatten the rank weighting
+RRF_K = int(os.getenv("CORTEX_RRF_K", "60"))
+
+# --- Reranking Constants ---
+
+# search_code keeps the vector order when the best hit leads the runner-up
+# by this fraction of the distance spread of the results
+RERANK_MARGIN = float(os.getenv("CORTEX_RERANK_MARGIN", "0.5"))
+# Otherwise a local scorer ranks the results, and the LLM is asked only when
+# the scorer's best result leads the next by less than this (scores are 0-1)
+RERANK_LEXICAL_MARGIN = float(os.getenv("CORTEX_RERANK_LEXICAL_MARGIN", "0.15"))
+# Rankings kept per process, keyed by query and candidate set
+RERANK_CACHE_SIZE = int(os.getenv("CORTEX_RERANK_CACHE_SIZE", "256"))
+
+# --- Grep Constants ---
+
+# Files are also indexed by the trigrams they contain, so grep_code only
+# reads files that can match
+TRIGRAM_INDEX_ENABLED = os.getenv("CORTEX_TRIGRAM_INDEX", "1") not in ("0", "false", "no")
+# Processes scanning files when the index leaves many candidates
+GREP_WORKERS = int(os.getenv("CORTEX_GREP_WORKERS", str(os.cpu_count() or 1)))
+# Candidates scanned in this process before a pool is worth starting
+GREP_PARALLEL_MIN_FILES = int(os.getenv("CORTEX_GREP_PARALLEL_MIN_FILES", "64"))
+GREP_MAX_MATCHES = int(os.getenv("CORTEX_GREP_MAX_MATCHES", "50"))
+
+# --- Watcher Constants ---
+
+# Quiet period after the last file event before a batch is re-indexed
+WATCH_DEBOUNCE_MS = int(os.getenv("CORTEX_WATCH_DEBOUNCE_MS", "500"))
+# Upper bound on how long events are held while activity continues
+WATCH_MAX_DELAY_MS = int(os.getenv("CORTEX_WATCH_MAX_DELAY_MS", "5000"))
 
 # --- Path Constants ---
 
@@ -56,16 +201,38 @@ def get_global_repos_dir() -> Path:
     repos_dir.mkdir(parents=True, exist_ok=True)
     return repos_dir
 
+def get_embedding_cache_dir() -> Path:
+    """Returns the absolute path to the global embedding cache shared by all projects."""
+    cache_dir = Path.home() / ".cortex" / "embedding_cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
 def get_project_metadata_dir(project_path: str) -> str:
     """Returns the absolute path to the .cortex directory within the project."""
     return os.path.abspath(os.path.join(project_path, ".cortex"))
 
+def get_document_cache_dir(project_path: str) -> str:
+    """Returns the directory caching the text extracted from the project's PDF and DOCX files."""
+    return os.path.join(get_project_metadata_dir(project_path), "documents")
+
 def get_state_db_path(project_path: str) -> str:
     """Returns the path to the SQLite state database for the project."""
     metadata_dir = get_project_metadata_dir(project_path)
     os.makedirs(os.path.join(metadata_dir, "indexing"), exist_ok=True)
     return os.path.join(metadata_dir, "indexing", "state.db")
 
+def get_lexical_db_path(project_path: str) -> str:
+    """Returns the path to the SQLite full-text index of the project's chunks."""
+    metadata_dir = get_project_metadata_dir(project_path)
+    os.makedirs(os.path.join(metadata_dir, "indexing"), exist_ok=True)
+    return os.path.join(metadata_dir, "indexing", "lexical.db")
+
+def get_trigram_db_path(project_path: str) -> str:
+    """Returns the path to the SQLite trigram index of the project's files."""
+    metadata_dir = get_project_metadata_dir(project_path)
+    os.makedirs(os.path.join(metadata_dir, "indexing"), exist_ok=True)
+    return os.path.join(metadata_dir, "indexing", "trigrams.db")
+
 def get_vector_persist_dir(project_path: str) -> str:
     """Returns the path to the ChromaDB directory for the project."""
     metadata_dir = get_project_metadata_dir(project_path)
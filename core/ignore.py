@@ -0,0 +1,260 @@
+"""
+Project-wide ignore rules, shared by the loader, the watcher and the agent tools.
+
+A path is ignored when any of these say so, checked in order:
+1. the built-in defaults: hidden files and directories, `IGNORED_DIRS` and
+   `IGNORED_FILE_SUFFIXES` from the config
+2. `.gitignore` files, at the root and in any subdirectory (deeper files
+   take precedence, `!` re-includes, last match wins)
+3. `.cortexignore` at the project root, in the same syntax
+
+`.gitignore` files are read lazily, the first time a path under their
+directory is checked, and decisions about directories are cached, so a
+check costs a few dictionary lookups once the tree has been seen.
+"""
+
+import os
+import re
+import subprocess
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from core.config import IGNORED_DIRS, IGNORED_FILE_SUFFIXES, USE_GIT_LS_FILES
+
+IGNORE_FILES = (".gitignore", ".cortexignore")
+
+def _translate(pattern: str) -> str:
+    """Translates a gitignore glob (without leading/trailing slashes) into a regex body."""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                at_end = i + 2 == n or pattern[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        parts.append(".*")
+                        i += 2
+                    else:
+                        # "**/" matches zero or more directories
+                        parts.append("(?:.*/)?")
+                        i += 3
+                    continue
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+def parse_rules(lines) -> List[Tuple[re.Pattern, bool, bool]]:
+    """Compiles gitignore lines into (regex, negated, directories only) rules."""
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n")
+        # Trailing spaces are ignored unless escaped
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith(("\\#", "\\!")):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to the file's directory
+        anchored = "/" in line
+        line = line.lstrip("/")
+        prefix = "^" if anchored else "^(?:.*/)?"
+        rules.append((re.compile(prefix + _translate(line) + "$"), negated, dir_only))
+    return rules
+
+class PathMatcher:
+    """Compiled ignore rules for one project; see the module docstring."""
+
+    def __init__(self, root: str, use_git: bool = USE_GIT_LS_FILES):
+        self.root = os.path.abspath(root)
+        self.use_git = use_git
+        self._lock = threading.Lock()
+        self._rules = {}         # directory (relative, "/"-separated) -> rules of its ignore file(s)
+        self._dir_ignored = {}   # directory -> cached decision
+
+    # --- Rules ---
+
+    def _load_rules(self, directory: str):
+        rules = self._rules.get(directory)
+        if rules is not None:
+            return rules
+        names = IGNORE_FILES if directory == "" else IGNORE_FILES[:1]
+        rules = []
+        for name in names:
+            path = os.path.join(self.root, directory, name)
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    rules.extend(parse_rules(f))
+            except OSError:
+                continue
+        with self._lock:
+            self._rules[directory] = rules
+        return rules
+
+    def invalidate(self, directory: str = None):
+        """Forgets cached rules (of one directory, relative to the root, or all) after an ignore file changed."""
+        with self._lock:
+            if directory is None:
+                self._rules.clear()
+            else:
+                directory = _to_posix(directory).strip("/")
+                self._rules.pop("" if directory == "." else directory, None)
+            self._dir_ignored.clear()
+
+    def _default_ignored(self, name: str, is_dir: bool) -> bool:
+        if name.startswith(".") or name in IGNORED_DIRS:
+            return True
+        return not is_dir and name.endswith(IGNORED_FILE_SUFFIXES)
+
+    def _match(self, rel_path: str, is_dir: bool) -> bool:
+        """Decides a single path, assuming none of its parent directories is ignored."""
+        name = rel_path.rsplit("/", 1)[-1]
+        if self._default_ignored(name, is_dir):
+            return True
+
+        ignored = False
+        directory = ""
+        parents = rel_path.split("/")[:-1]
+        for depth in range(len(parents) + 1):
+            if depth:
+                directory = "/".join(parents[:depth])
+            rules = self._load_rules(directory)
+            if not rules:
+                continue
+            candidate = rel_path[len(directory) + 1 :] if directory else rel_path
+            for regex, negated, dir_only in rules:
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(candidate):
+                    ignored = not negated
+        return ignored
+
+    def _directory_ignored(self, rel_dir: str) -> bool:
+        decision = self._dir_ignored.get(rel_dir)
+        if decision is None:
+            parent = rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+            decision = (parent != "" and self._directory_ignored(parent)) or self._match(rel_dir, True)
+            self._dir_ignored[rel_dir] = decision
+        return decision
+
+    def is_ignored(self, path: str, is_dir: Optional[bool] = None) -> bool:
+        """
+        Returns True if `path` (absolute, or relative to the root) is ignored.
+
+        Paths outside the project are always ignored. When `is_dir` is None
+        the file system is asked.
+        """
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root)
+        rel_path = _to_posix(path).strip("/")
+        if rel_path in ("", "."):
+            return False
+        if rel_path == ".." or rel_path.startswith("../"):
+            return True
+        if is_dir is None:
+            is_dir = os.path.isdir(os.path.join(self.root, rel_path))
+        parent = rel_path.rsplit("/", 1)[0] if "/" in rel_path else ""
+        if parent and self._directory_ignored(parent):
+            return True
+        if is_dir:
+            return self._directory_ignored(rel_path)
+        return self._match(rel_path, False)
+
+    # --- Enumeration ---
+
+    def walk(self, start: str = None) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """`os.walk` over `start` (default: the root) with ignored directories and files removed."""
+        start = os.path.abspath(start or self.root)
+        if start != self.root and self.is_ignored(start, is_dir=True):
+            return
+        for dirpath, dirnames, filenames in os.walk(start):
+            rel_dir = os.path.relpath(dirpath, self.root)
+            rel_dir = "" if rel_dir == "." else _to_posix(rel_dir) + "/"
+            dirnames[:] = [d for d in dirnames if not self._directory_ignored(rel_dir + d)]
+            filenames = [f for f in filenames if not self._match(rel_dir + f, False)]
+            yield dirpath, dirnames, filenames
+
+    def iter_files(self, start: str = None) -> Iterator[str]:
+        """
+        Yields the absolute paths of every non-ignored file under `start`.
+
+        In a git work tree `git ls-files` lists the files (tracked plus
+        untracked-but-not-ignored) without walking ignored directories at
+        all; the default and `.cortexignore` rules are still applied.
+        """
+        start = os.path.abspath(start or self.root)
+        files = self._git_files(start) if self.use_git else None
+        if files is None:
+            for dirpath, _, filenames in self.walk(start):
+                for name in filenames:
+                    yield os.path.join(dirpath, name)
+            return
+        for rel_path in files:
+            if not self.is_ignored(rel_path, is_dir=False):
+                yield os.path.join(self.root, rel_path)
+
+    def _git_files(self, start: str) -> Optional[List[str]]:
+        if not os.path.exists(os.path.join(self.root, ".git")):
+            return None
+        rel_start = os.path.relpath(start, self.root)
+        pathspec = "." if rel_start == "." else rel_start
+        try:
+            listed = self._git_ls_files(pathspec, "--cached", "--others", "--exclude-standard")
+            # The index still lists tracked files deleted from the work tree
+            deleted = set(self._git_ls_files(pathspec, "--deleted"))
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        # dict.fromkeys: unmerged files are listed once per conflict stage
+        return [p for p in dict.fromkeys(listed) if p not in deleted]
+
+    def _git_ls_files(self, pathspec: str, *options: str) -> List[str]:
+        output = subprocess.run(
+            ["git", "-C", self.root, "ls-files", "-z", *options, "--", pathspec],
+            capture_output=True,
+            check=True,
+        ).stdout
+        return [p for p in output.decode("utf-8", errors="surrogateescape").split("\0") if p]
+
+def _to_posix(path: str) -> str:
+    return path.replace(os.sep, "/") if os.sep != "/" else path
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+def get_matcher(root: str) -> PathMatcher:
+    """Returns the shared matcher for a project root, building it on first use."""
+    root = os.path.abspath(root)
+    with _matchers_lock:
+        matcher = _matchers.get(root)
+        if matcher is None:
+            matcher = _matchers[root] = PathMatcher(root)
+        return matcher
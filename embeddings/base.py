@@ -1,7 +1,166 @@
+import base64
+import math
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import List
 
+import numpy as np
+
+from core.config import QUERY_CACHE_SIZE
+
+def to_matrix(vectors) -> np.ndarray:
+    """Stacks vectors into a contiguous (n, dim) float32 array."""
+    if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.vstack([np.asarray(v, dtype=np.float32) for v in vectors]))
+
+def decode_embedding(value) -> np.ndarray:
+    """Decodes one embedding from an OpenAI-style response: base64 little-endian float32, or a float list."""
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype="<f4")
+    return np.asarray(value, dtype=np.float32)
+
+class QueryEmbeddingCache:
+    """
+    Process-wide LRU of query embeddings, keyed by (model, text).
+
+    Agents and their sub-agents often search for the same thing several
+    times in one session; repeats are answered without a round trip.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model: str, text: str):
+        with self._lock:
+            vector = self._entries.get((model, text))
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((model, text))
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, text: str, vector: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(model, text)] = vector
+            self._entries.move_to_end((model, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+query_cache = QueryEmbeddingCache()
+
 class EmbeddingModel(ABC):
+    """
+    Base class for embedding providers.
+
+    `embed` packs texts into requests by estimated token count rather than
+    by a fixed number of items: each request stays under `max_batch_tokens`
+    and `max_batch_items`, and any single text longer than
+    `max_input_tokens` is split into pieces whose embeddings are averaged
+    back into one vector. Providers implement `_embed_batch`, and may
+    override `_embed_batches` to send requests concurrently.
+
+    Vectors are returned as one contiguous (n, dim) float32 array.
+    """
+
+    max_input_tokens: int = 8192
+    max_batch_tokens: int = 8192
+    max_batch_items: int = 256
+    # Deliberately pessimistic for code, which tokenizes densely
+    chars_per_token: float = 3.0
+
+    def estimate_tokens(self, text: str) -> int:
+        return max(1, math.ceil(len(text) / self.chars_per_token))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        pieces, owners = self._split_inputs(texts)
+        batches = self._pack(pieces)
+        matrices = [to_matrix(vectors) for vectors in self._embed_batches(batches)]
+        piece_vectors = matrices[0] if len(matrices) == 1 else np.concatenate(matrices)
+
+        if len(pieces) == len(texts):
+            return piece_vectors
+        return self._combine(len(texts), pieces, owners, piece_vectors)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embeds a search query, served from the process-wide query cache when repeated."""
+        model = getattr(self, "model", type(self).__name__)
+        vector = query_cache.get(model, text)
+        if vector is None:
+            vector = self.embed([text])[0]
+            # Shared between callers, so nobody may modify it in place
+            vector.flags.writeable = False
+            query_cache.put(model, text, vector)
+        return vector
+
+    def _embed_batches(self, batches: List[List[str]]) -> list:
+        """Embeds each batch in turn; returns one (n, dim) array per batch."""
+        return [self._embed_batch(batch) for batch in batches]
+
     @abstractmethod
-    def embed(self, texts: List[str]) -> List[List[float]]:
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
         pass
+
+    def _split_inputs(self, texts: List[str]):
+        """Splits over-long texts, preferring line boundaries; returns pieces and their owning text index."""
+        max_chars = max(1, int(self.max_input_tokens * self.chars_per_token))
+        pieces, owners = [], []
+        for index, text in enumerate(texts):
+            if self.estimate_tokens(text) <= self.max_input_tokens:
+                pieces.append(text)
+                owners.append(index)
+                continue
+            start = 0
+            while start < len(text):
+                end = min(start + max_chars, len(text))
+                if end < len(text):
+                    newline = text.rfind("\n", start, end)
+                    if newline > start:
+                        end = newline + 1
+                pieces.append(text[start:end])
+                owners.append(index)
+                start = end
+        return pieces, owners
+
+    def _pack(self, pieces: List[str]) -> List[List[str]]:
+        """Greedily groups pieces, in order, under the token and item budgets."""
+        batches, batch, batch_tokens = [], [], 0
+        for piece in pieces:
+            tokens = self.estimate_tokens(piece)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_items):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(piece)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _combine(self, count, pieces, owners, piece_vectors):
+        """Averages the piece vectors of split texts, weighted by piece length, then re-normalises."""
+        owners = np.asarray(owners)
+        weights = np.array([len(piece) for piece in pieces], dtype=np.float32)
+        combined = np.zeros((count, piece_vectors.shape[1]), dtype=np.float32)
+        np.add.at(combined, owners, piece_vectors * weights[:, None])
+
+        split = np.bincount(owners, minlength=count) > 1
+        # Texts that were not split keep their vector as is; an empty one has no weight to divide by
+        whole = ~split[owners]
+        combined[owners[whole]] = piece_vectors[whole]
+        norms = np.linalg.norm(combined[split], axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        combined[split] /= norms
+        return combined
@@ -0,0 +1,300 @@
+"""
+Persistent, content-addressed embedding cache shared by every project.
+
+Vectors are keyed by (embedding model, SHA-256 of the text), so identical
+chunks in a fork, a second worktree or a vendored copy are embedded once.
+
+Layout under `~/.cortex/embedding_cache/`:
+- `index.db`: SQLite table mapping each key to a slot, with an LRU timestamp
+- `<model digest>.f32`: one file per model, a flat array of slots read
+  through `mmap`; slot `n` lives at byte offset `n * (8 + dim * 4)` and holds
+  an 8-byte tag of its key followed by the float32 vector
+
+When the cache exceeds its size budget the least recently used entries are
+evicted and their slots reused by later writes. Slots are read outside any
+transaction, so a reader checks the tag before and after copying a vector:
+a slot that another process reused in the meantime counts as a miss.
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+from core.config import EMBED_CACHE_MAX_MB, get_embedding_cache_dir
+from .base import EmbeddingModel, to_matrix
+
+# Bumped when the file layout changes; older caches are cleared on open
+_FORMAT_VERSION = 2
+_TAG_BYTES = 8
+_NO_TAG = bytes(_TAG_BYTES)
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+def _key_tag(key: str) -> bytes:
+    return bytes.fromhex(key[: _TAG_BYTES * 2])
+
+class _BlobFile:
+    """A model's vector file, memory-mapped for reads and grown by positional writes."""
+
+    def __init__(self, path: str, dim: int):
+        self.dim = dim
+        self.slot_bytes = _TAG_BYTES + dim * 4
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._map = None
+        self._mapped_size = 0
+
+    def read(self, slot: int, tag: bytes):
+        """Returns the slot's vector, or None unless it held `tag` throughout the read."""
+        start = slot * self.slot_bytes
+        if start + self.slot_bytes > self._mapped_size:
+            self._remap()
+            if start + self.slot_bytes > self._mapped_size:
+                return None
+        if self._map[start : start + _TAG_BYTES] != tag:
+            return None
+        # Copied out of the map, so a later remap can't invalidate it
+        vector = np.frombuffer(self._map, dtype="<f4", count=self.dim, offset=start + _TAG_BYTES).copy()
+        # A writer clears the tag before touching the vector
+        if self._map[start : start + _TAG_BYTES] != tag:
+            return None
+        return vector
+
+    def write(self, slot: int, tag: bytes, vector) -> None:
+        start = slot * self.slot_bytes
+        os.pwrite(self.fd, _NO_TAG, start)
+        os.pwrite(self.fd, np.asarray(vector, dtype="<f4").tobytes(), start + _TAG_BYTES)
+        os.pwrite(self.fd, tag, start)
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        size = os.fstat(self.fd).st_size
+        self._map = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ)
+        self._mapped_size = size
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        os.close(self.fd)
+
+class EmbeddingCache:
+    """Size-bounded LRU cache of embeddings, safe to share between threads and processes."""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = EMBED_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = str(cache_dir or get_embedding_cache_dir())
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._blobs = {}
+        # isolation_level=None: transactions are managed explicitly below
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, "index.db"),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                slots INTEGER NOT NULL DEFAULT 0,
+                live INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, key)
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (
+                model TEXT NOT NULL,
+                slot INTEGER NOT NULL
+            );
+        """)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < _FORMAT_VERSION:
+            self._reset()
+
+    def _reset(self):
+        """Empties a cache written in an older layout."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have done it while this one waited for the lock
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < _FORMAT_VERSION:
+                self._conn.execute("DELETE FROM entries")
+                self._conn.execute("DELETE FROM free_slots")
+                self._conn.execute("DELETE FROM models")
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith(".f32"):
+                        os.remove(os.path.join(self.cache_dir, name))
+                self._conn.execute(f"PRAGMA user_version = {_FORMAT_VERSION}")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _blob(self, model: str, dim: int) -> _BlobFile:
+        blob = self._blobs.get(model)
+        if blob is None:
+            digest = hashlib.sha256(model.encode("utf-8")).hexdigest()[:16]
+            blob = _BlobFile(os.path.join(self.cache_dir, f"{digest}.f32"), dim)
+            self._blobs[model] = blob
+        return blob
+
+    def _model_dim(self, model: str):
+        row = self._conn.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, model: str, keys: List[str]) -> dict:
+        """Returns the cached vectors for `keys` that are present, keyed by text key."""
+        found = {}
+        with self._lock:
+            dim = self._model_dim(model)
+            if dim is not None:
+                blob = self._blob(model, dim)
+                for i in range(0, len(keys), 500):
+                    batch = keys[i : i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, slot FROM entries WHERE model = ? AND key IN ({placeholders})",
+                        (model, *batch),
+                    ).fetchall()
+                    for key, slot in rows:
+                        # None: evicted and reused by another process since the lookup
+                        vector = blob.read(slot, _key_tag(key))
+                        if vector is not None:
+                            found[key] = vector
+                if found:
+                    now = int(time.time())
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "UPDATE entries SET last_used = ? WHERE model = ? AND key = ?",
+                        ((now, model, key) for key in found),
+                    )
+                    self._conn.execute("COMMIT")
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, keys: List[str], vectors) -> None:
+        """Stores vectors for `keys`, evicting least recently used entries if over budget."""
+        if not keys:
+            return
+        dim = len(vectors[0])
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so slot allocation is
+            # serialised with other processes writing to the same cache
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored_dim = self._model_dim(model)
+                if stored_dim is None:
+                    self._conn.execute("INSERT INTO models (model, dim) VALUES (?, ?)", (model, dim))
+                elif stored_dim != dim:
+                    # The model behind this name changed shape; don't mix vectors
+                    self._conn.execute("ROLLBACK")
+                    return
+
+                blob = self._blob(model, dim)
+                now = int(time.time())
+                for key, vector in zip(keys, vectors):
+                    if len(vector) != dim:
+                        continue
+                    exists = self._conn.execute(
+                        "SELECT 1 FROM entries WHERE model = ? AND key = ?", (model, key)
+                    ).fetchone()
+                    if exists:
+                        continue
+                    slot = self._allocate_slot(model)
+                    # Data lands before the row commits, so readers never see a half-written slot
+                    blob.write(slot, _key_tag(key), vector)
+                    self._conn.execute(
+                        "INSERT INTO entries (model, key, slot, last_used) VALUES (?, ?, ?, ?)",
+                        (model, key, slot, now),
+                    )
+                    self._conn.execute("UPDATE models SET live = live + 1 WHERE model = ?", (model,))
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _allocate_slot(self, model: str) -> int:
+        row = self._conn.execute(
+            "SELECT rowid, slot FROM free_slots WHERE model = ? LIMIT 1", (model,)
+        ).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM free_slots WHERE rowid = ?", (row[0],))
+            return row[1]
+        slot = self._conn.execute("SELECT slots FROM models WHERE model = ?", (model,)).fetchone()[0]
+        self._conn.execute("UPDATE models SET slots = slots + 1 WHERE model = ?", (model,))
+        return slot
+
+    def size_bytes(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(live * dim * 4), 0) FROM models").fetchone()
+        return row[0]
+
+    def _evict(self):
+        excess = self.size_bytes() - self.max_bytes
+        while excess > 0:
+            rows = self._conn.execute(
+                "SELECT e.rowid, e.model, e.slot, m.dim FROM entries e JOIN models m ON e.model = m.model "
+                "ORDER BY e.last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                return
+            for rowid, model, slot, dim in rows:
+                self._conn.execute("DELETE FROM entries WHERE rowid = ?", (rowid,))
+                self._conn.execute("INSERT INTO free_slots (model, slot) VALUES (?, ?)", (model, slot))
+                self._conn.execute("UPDATE models SET live = live - 1 WHERE model = ?", (model,))
+                excess -= dim * 4
+                if excess <= 0:
+                    break
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.size_bytes()}
+
+    def close(self):
+        with self._lock:
+            for blob in self._blobs.values():
+                blob.close()
+            self._blobs = {}
+            self._conn.close()
+
+class CachedEmbeddingModel(EmbeddingModel):
+    """Wraps an embedding model so repeated texts are served from the global cache."""
+
+    def __init__(self, inner, cache: EmbeddingCache = None):
+        self.inner = inner
+        self.cache = cache or EmbeddingCache()
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [text_key(text) for text in texts]
+        cached = self.cache.get_many(self.model, list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.inner.embed(list(missing.values()))
+            self.cache.put_many(self.model, list(missing), vectors)
+            cached.update(zip(missing, vectors))
+
+        return to_matrix([cached[key] for key in keys])
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.inner.embed(texts)
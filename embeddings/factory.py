@@ -0,0 +1,32 @@
+import threading
+
+from core.config import EMBEDDING_MODEL, OLLAMA_BASE_URL, EMBED_CACHE_ENABLED
+from .base import EmbeddingModel
+from .ollama import OllamaEmbeddingModel
+from .cache import CachedEmbeddingModel
+
+_shared_model = None
+_shared_lock = threading.Lock()
+
+def create_embedding_model() -> EmbeddingModel:
+    """Builds the configured embedding model, behind the global cache if enabled."""
+    embedding_model = OllamaEmbeddingModel(
+        model=EMBEDDING_MODEL,
+        base_url=OLLAMA_BASE_URL
+    )
+    if EMBED_CACHE_ENABLED:
+        embedding_model = CachedEmbeddingModel(embedding_model)
+    return embedding_model
+
+def get_embedding_model() -> EmbeddingModel:
+    """
+    Returns the process-wide embedding model, building it on first use.
+
+    The indexer, the watcher and the agent tools share it, and with it one
+    connection pool, one request limiter and one cache handle.
+    """
+    global _shared_model
+    with _shared_lock:
+        if _shared_model is None:
+            _shared_model = create_embedding_model()
+        return _shared_model
@@ -1,49 +1,155 @@
 from typing import List
+import random
+import threading
 import time
-from core.config import OLLAMA_BASE_URL, OLLAMA_TIMEOUT
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_TIMEOUT,
+    OLLAMA_MAX_IN_FLIGHT,
+    OLLAMA_MAX_RETRIES,
+    OLLAMA_MAX_INPUT_TOKENS,
+    OLLAMA_MAX_BATCH_TOKENS,
+    OLLAMA_MAX_BATCH_ITEMS,
+)
+from .base import EmbeddingModel, decode_embedding, to_matrix
 
-class OllamaEmbeddingModel:
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+class AdaptiveLimiter:
+    """
+    Caps concurrent requests, adapting the cap to how the server copes.
+
+    The cap halves when the server throttles (429/503) and shrinks by one
+    when per-item latency climbs well above the best seen; otherwise it
+    creeps back up towards `max_limit`.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._best_latency = None
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency_per_item: float = None, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            elif latency_per_item is not None:
+                if self._best_latency is None or latency_per_item < self._best_latency:
+                    self._best_latency = latency_per_item
+                if latency_per_item > 2 * self._best_latency:
+                    self.limit = max(self.min_limit, self.limit - 1)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+class OllamaEmbeddingModel(EmbeddingModel):
     def __init__(
         self,
         model: str,
         base_url: str = OLLAMA_BASE_URL,
         timeout: int = OLLAMA_TIMEOUT,
-        batch_size: int = 32,
+        batch_size: int = OLLAMA_MAX_BATCH_ITEMS,
+        max_in_flight: int = OLLAMA_MAX_IN_FLIGHT,
+        max_retries: int = OLLAMA_MAX_RETRIES,
+        max_input_tokens: int = OLLAMA_MAX_INPUT_TOKENS,
+        max_batch_tokens: int = OLLAMA_MAX_BATCH_TOKENS,
     ):
         self.model = model
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
-        self.batch_size = batch_size
+        self.max_batch_items = batch_size
+        self.max_input_tokens = max_input_tokens
+        self.max_batch_tokens = max_batch_tokens
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max(1, max_retries)
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
-        all_embeddings = []
+        self.limiter = AdaptiveLimiter(self.max_in_flight)
+        self._session = None
+        self._executor = None
+        self._init_lock = threading.Lock()
 
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i : i + self.batch_size]
+    @property
+    def session(self):
+        """A pooled HTTP session, so batches reuse connections instead of reconnecting."""
+        if self._session is None:
+            with self._init_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
 
-            embeddings = self._embed_batch(batch)
-            all_embeddings.extend(embeddings)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
 
-            # small delay to avoid Ollama overload
-            time.sleep(0.05)
+    def _get_executor(self):
+        if self._executor is None:
+            with self._init_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_in_flight, thread_name_prefix="cortex-ollama"
+                    )
+        return self._executor
 
-        return all_embeddings
+    def _embed_batches(self, batches: List[List[str]]) -> list:
+        if len(batches) <= 1:
+            return [self._embed_batch(batch) for batch in batches]
 
-    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
-        import requests
+        # Batches are sent concurrently; the limiter decides how many at once
+        return list(self._get_executor().map(self._embed_batch, batches))
 
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
         url = f"{self.base_url}/v1/embeddings"
+        # base64 float32 is a fraction of the size of a JSON float array and
+        # decodes without boxing; older servers ignore it and send lists
+        payload = {"model": self.model, "input": texts, "encoding_format": "base64"}
+        data = self._post_with_retry(url, payload, len(texts))
+        return to_matrix([decode_embedding(item["embedding"]) for item in data["data"]])
+
+    def _post_with_retry(self, url: str, payload: dict, items: int) -> dict:
+        import requests
 
-        response = requests.post(
-            url,
-            json={
-                "model": self.model,
-                "input": texts,
-            },
-            timeout=self.timeout,
-        )
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
+            self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self.limiter.release(throttled=True)
+                if last_attempt:
+                    raise
+                retry_after = None
+            else:
+                throttled = response.status_code in THROTTLE_STATUSES
+                latency = (time.monotonic() - started) / max(1, items) if response.ok else None
+                self.limiter.release(latency, throttled=throttled)
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
 
-        response.raise_for_status()
-        data = response.json()
+            # Exponential backoff with jitter, unless the server said how long to wait
+            delay = retry_after if retry_after is not None else min(30.0, 0.5 * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.8, 1.2))
 
-        return [item["embedding"] for item in data["data"]]
+def _parse_retry_after(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
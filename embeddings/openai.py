@@ -1,14 +1,21 @@
 from openai import OpenAI
-from .base import EmbeddingModel
+from .base import EmbeddingModel, decode_embedding, to_matrix
 
 class OpenAIEmbeddingModel(EmbeddingModel):
+    # Limits of the /v1/embeddings endpoint
+    max_input_tokens = 8191
+    max_batch_tokens = 300_000
+    max_batch_items = 2048
+
     def __init__(self, model="text-embedding-3-small"):
         self.client = OpenAI()
         self.model = model
 
-    def embed(self, texts):
+    def _embed_batch(self, texts):
         response = self.client.embeddings.create(
             model=self.model,
-            input=texts
+            input=texts,
+            # Explicit base64 makes the SDK hand back the raw payload for us to decode
+            encoding_format="base64",
         )
-        return [item.embedding for item in response.data]
+        return to_matrix([decode_embedding(item.embedding) for item in response.data])
@@ -0,0 +1,370 @@
+"""
+Manifest of a project's files, and the in-memory prefix tree built from it.
+
+Every non-ignored file of the project (indexable or not) is recorded in the
+`file_manifest` table of the state database with its type, size and
+language. Full index runs rewrite it from their walk, and so does the
+watcher when a session starts, which catches files created or deleted in
+between; during the session the watcher and git syncs update it per file,
+through the StateManager.
+
+Each process loads the manifest once into a `FileTree`: nested dicts, one
+per directory, plus an index of file names sorted forwards and backwards.
+Listing a directory then costs the size of the listing, and a name glob
+such as `test_*` or `*.py` bisects to the names sharing its literal prefix
+or suffix instead of visiting the whole tree. Writes made in this process
+are applied to the loaded tree directly; writes from other processes
+(e.g. a separate `cortex watch`) bump a generation counter that makes the
+tree reload on its next query.
+"""
+
+import bisect
+import fnmatch
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from core.config import CODE_EXTENSIONS, DOCUMENT_EXTENSIONS, TEXT_EXTENSIONS, get_state_db_path
+
+GENERATION_KEY = "file_manifest_generation"
+# Set once a full walk has filled the manifest; until then it may be partial
+COMPLETE_KEY = "file_manifest_complete"
+_WILDCARDS = "*?["
+
+class FileInfo(NamedTuple):
+    type: str                 # "code", "text", "document" or "other"
+    size: int
+    language: Optional[str]
+
+def describe_file(path: str, size: int) -> FileInfo:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CODE_EXTENSIONS:
+        return FileInfo("code", size, CODE_EXTENSIONS[ext])
+    if ext in DOCUMENT_EXTENSIONS:
+        return FileInfo("document", size, DOCUMENT_EXTENSIONS[ext])
+    return FileInfo("text" if ext in TEXT_EXTENSIONS else "other", size, None)
+
+def stat_entries(abs_paths: Iterable[str]) -> Tuple[List[Tuple[str, FileInfo]], List[str]]:
+    """Splits paths into (path, FileInfo) entries for regular files and the paths that are gone."""
+    entries, missing = [], []
+    for path in abs_paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            missing.append(path)
+            continue
+        if os.path.isdir(path):
+            continue
+        entries.append((path, describe_file(path, st.st_size)))
+    return entries, missing
+
+# --- Storage (shares the StateManager's connection and transactions) ---
+
+def create_manifest_table(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_manifest (
+            path TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            language TEXT
+        )
+    """)
+
+def _bump_generation(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (GENERATION_KEY,)).fetchone()
+    generation = int(row[0]) + 1 if row else 1
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (GENERATION_KEY, str(generation)))
+    return generation
+
+def _prefix_clause(path: str) -> Tuple[str, tuple]:
+    # Matches the path itself or anything below it, without LIKE's wildcard pitfalls
+    prefix = path.rstrip(os.sep) + os.sep
+    return "(path = ? OR (path >= ? AND path < ?))", (path, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+
+def replace_manifest(conn: sqlite3.Connection, entries: List[Tuple[str, FileInfo]], root: str, start: str = None):
+    """
+    Replaces every manifest entry under `root` with `entries`, or only those
+    under its subfolder `start`; only the former completes the manifest.
+    """
+    under = start or root
+    clause, params = _prefix_clause(under)
+    conn.execute(f"DELETE FROM file_manifest WHERE {clause}", params)
+    upsert_manifest(conn, entries, bump=False)
+    if start is None:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (COMPLETE_KEY, "1"))
+    _notify(under, lambda tree: tree.replace(under, entries), _bump_generation(conn))
+
+def upsert_manifest(conn: sqlite3.Connection, entries: List[Tuple[str, FileInfo]], bump: bool = True):
+    conn.executemany(
+        "INSERT OR REPLACE INTO file_manifest (path, type, size, language) VALUES (?, ?, ?, ?)",
+        ((path, *info) for path, info in entries),
+    )
+    if bump and entries:
+        generation = _bump_generation(conn)
+        for path, info in entries:
+            _notify(path, lambda tree: tree.add(path, info), generation)
+
+def remove_manifest(conn: sqlite3.Connection, path: str, is_directory: Optional[bool] = None):
+    """Removes a file, or everything under a directory (`is_directory` None: either)."""
+    if is_directory is False:
+        conn.execute("DELETE FROM file_manifest WHERE path = ?", (path,))
+    else:
+        clause, params = _prefix_clause(path)
+        conn.execute(f"DELETE FROM file_manifest WHERE {clause}", params)
+    _notify(path, lambda tree: tree.remove(path), _bump_generation(conn))
+
+# --- In-memory tree ---
+
+class FileTree:
+    """Prefix tree of a project's files; see the module docstring."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.generation = None
+        self._lock = threading.Lock()
+        self._top = {}
+        self._names: Dict[str, set] = {}   # file name -> relative paths
+        self._sorted = None                # (names, reversed names), rebuilt lazily
+
+    def _relative(self, path: str) -> Optional[str]:
+        if not path.startswith(self.root + os.sep):
+            return None
+        rel = path[len(self.root) + 1 :]
+        return rel.replace(os.sep, "/") if os.sep != "/" else rel
+
+    # --- Updates ---
+
+    def reset(self, entries: Iterable[Tuple[str, FileInfo]]):
+        self.replace(self.root, entries)
+
+    def replace(self, path: str, entries: Iterable[Tuple[str, FileInfo]]):
+        """Replaces everything under the directory `path` (the whole tree if it contains the root)."""
+        with self._lock:
+            if self._relative(path) is None:
+                self._top = {}
+                self._names = {}
+                self._sorted = None
+            else:
+                self._remove(path)
+            for entry_path, info in entries:
+                self._add(entry_path, info)
+
+    def add(self, path: str, info: FileInfo):
+        with self._lock:
+            self._add(path, info)
+
+    def _add(self, path: str, info: FileInfo):
+        rel = self._relative(path)
+        if rel is None:
+            return
+        *parents, name = rel.split("/")
+        node = self._top
+        for part in parents:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        node[name] = info
+        paths = self._names.get(name)
+        if paths is None:
+            paths = self._names[name] = set()
+            self._sorted = None
+        paths.add(rel)
+
+    def remove(self, path: str):
+        """Removes a file or a whole directory."""
+        with self._lock:
+            self._remove(path)
+
+    def _remove(self, path: str):
+        rel = self._relative(path)
+        if rel is None:
+            return
+        parts = rel.split("/")
+        trail = [self._top]
+        for part in parts[:-1]:
+            child = trail[-1].get(part)
+            if not isinstance(child, dict):
+                return
+            trail.append(child)
+        removed = trail[-1].pop(parts[-1], None)
+        if removed is None:
+            return
+        for file_rel in self._iter_files(removed, rel):
+            name = file_rel.rsplit("/", 1)[-1]
+            paths = self._names.get(name)
+            if paths is not None:
+                paths.discard(file_rel)
+                if not paths:
+                    del self._names[name]
+                    self._sorted = None
+        # Directories left empty disappear, as they would from a listing of files
+        for depth in range(len(parts) - 1, 0, -1):
+            if trail[depth]:
+                break
+            del trail[depth - 1][parts[depth - 1]]
+
+    # --- Queries ---
+
+    @staticmethod
+    def _iter_files(node, rel: str):
+        if not isinstance(node, dict):
+            yield rel
+            return
+        for name, child in node.items():
+            yield from FileTree._iter_files(child, f"{rel}/{name}" if rel else name)
+
+    def _find(self, rel_dir: str):
+        node = self._top
+        for part in rel_dir.strip("/").split("/"):
+            if part in ("", "."):
+                continue
+            node = node.get(part) if isinstance(node, dict) else None
+            if node is None:
+                return None
+        return node
+
+    def list_dir(self, rel_dir: str = "", recursive: bool = False) -> Optional[List[str]]:
+        """
+        Lists a directory as paths relative to the root, directories with a
+        trailing "/"; None if the tree has no such directory.
+        """
+        with self._lock:
+            node = self._find(rel_dir)
+            if not isinstance(node, dict):
+                return None
+            base = "/".join(part for part in rel_dir.strip("/").split("/") if part not in ("", "."))
+            entries = []
+            stack = [(node, base)]
+            while stack:
+                current, prefix = stack.pop()
+                for name, child in current.items():
+                    rel = f"{prefix}/{name}" if prefix else name
+                    if isinstance(child, dict):
+                        entries.append(rel + "/")
+                        if recursive:
+                            stack.append((child, rel))
+                    else:
+                        entries.append(rel)
+            return sorted(entries)
+
+    def get(self, rel_path: str) -> Optional[FileInfo]:
+        with self._lock:
+            node = self._find(rel_path)
+            return node if isinstance(node, FileInfo) else None
+
+    def glob(self, pattern: str) -> List[str]:
+        """Relative paths of the files whose name matches `pattern`, sorted."""
+        with self._lock:
+            if not any(c in pattern for c in _WILDCARDS):
+                return sorted(self._names.get(pattern, ()))
+            if self._sorted is None:
+                names = sorted(self._names)
+                self._sorted = (names, sorted(name[::-1] for name in names))
+            names, reversed_names = self._sorted
+
+            # Narrow to the names sharing the pattern's literal prefix or suffix, whichever is longer
+            first = min(pattern.find(c) for c in _WILDCARDS if c in pattern)
+            last = max(pattern.rfind(c) for c in _WILDCARDS)
+            prefix, suffix = pattern[:first], pattern[last + 1 :]
+            if len(suffix) > len(prefix) and "]" not in suffix:
+                key = suffix[::-1]
+                start = bisect.bisect_left(reversed_names, key)
+                end = bisect.bisect_left(reversed_names, key + "\U0010ffff")
+                candidates = (name[::-1] for name in reversed_names[start:end])
+            else:
+                start = bisect.bisect_left(names, prefix)
+                end = bisect.bisect_left(names, prefix + "\U0010ffff") if prefix else len(names)
+                candidates = names[start:end]
+
+            matches = []
+            for name in candidates:
+                if fnmatch.fnmatchcase(name, pattern):
+                    matches.extend(self._names[name])
+            return sorted(matches)
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(paths) for paths in self._names.values())
+
+# --- Process-wide trees ---
+
+_trees: Dict[str, "_LoadedTree"] = {}
+_trees_lock = threading.Lock()
+
+class _LoadedTree:
+    """A project's tree together with the connection used to notice writes from other processes."""
+
+    def __init__(self, root: str):
+        self.tree = FileTree(root)
+        self.conn = sqlite3.connect(get_state_db_path(root), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.data_version = None
+
+    def load(self) -> bool:
+        clause, params = _prefix_clause(self.tree.root)
+        try:
+            with self.lock:
+                if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (COMPLETE_KEY,)).fetchone() is None:
+                    return False
+                rows = self.conn.execute(
+                    f"SELECT path, type, size, language FROM file_manifest WHERE {clause}", params
+                ).fetchall()
+                generation = self._generation()
+        except sqlite3.OperationalError:
+            return False
+        self.tree.reset((path, FileInfo(*info)) for path, *info in rows)
+        self.tree.generation = generation
+        return True
+
+    def _generation(self) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (GENERATION_KEY,)).fetchone()
+        return int(row[0]) if row else None
+
+    def refresh(self):
+        """Reloads the tree if another process changed the manifest since it was loaded."""
+        with self.lock:
+            # Cheap: only changes when another connection commits to the database
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self.data_version:
+                return
+            self.data_version = data_version
+            # Behind is fine: this process's own writes reach the tree before they are committed
+            generation = self._generation()
+            stale = generation is not None and (self.tree.generation is None or generation > self.tree.generation)
+        if stale:
+            self.load()
+
+def _notify(path: str, update, generation: int):
+    for root, loaded in list(_trees.items()):
+        if path == root or path.startswith(root + os.sep) or root.startswith(path.rstrip(os.sep) + os.sep):
+            update(loaded.tree)
+            loaded.tree.generation = generation
+
+def get_file_tree(project_path: str = ".") -> Optional[FileTree]:
+    """
+    Returns the process-wide file tree of a project, loading it from the
+    state database on first use and reloading it when another process has
+    changed the manifest.
+
+    A project indexed before the manifest existed gets one from a walk of
+    its files; None is returned only if that fails.
+    """
+    root = os.path.abspath(project_path)
+    with _trees_lock:
+        loaded = _trees.get(root)
+        if loaded is None:
+            loaded = _LoadedTree(root)
+            if not loaded.load():
+                from core.ignore import get_matcher
+                from indexing.state import StateManager
+
+                print("Building the file manifest...")
+                with StateManager(project_path=root) as state_manager:
+                    state_manager.replace_manifest(get_matcher(root).iter_files(), root)
+                if not loaded.load():
+                    return None
+            _trees[root] = loaded
+    loaded.refresh()
+    return loaded.tree
@@ -1,19 +1,58 @@
-from embeddings.ollama import OllamaEmbeddingModel
-from vectorstore.chroma import VectorStoreManager
+from embeddings.factory import get_embedding_model
+from vectorstore.chroma import get_vector_store, chunk_ids, chunk_metadata
+from indexing.lexical import get_lexical_index
+from indexing.trigrams import get_trigram_index
 import os
+import numpy as np
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from core.config import EMBEDDING_MODEL, OLLAMA_BASE_URL
+@dataclass
+class ChunkDiff:
+    """How a file's freshly chunked content differs from what is stored."""
+    ids: list                                        # one ID per chunk, in order
+    new: list = field(default_factory=list)          # indices of chunks to embed
+    updated: list = field(default_factory=list)      # indices of kept chunks with changed metadata
+    removed: list = field(default_factory=list)      # stored IDs no longer present
+
+@dataclass
+class FileUpdate:
+    """A file's chunks, their diff, and the embeddings of its new chunks (an (n, dim) array)."""
+    rel_path: str
+    chunks: list
+    diff: ChunkDiff
+    embeddings: object = None
+    trigrams: bytes = None      # see indexing.trigrams.file_trigrams; None for files grep can't read
 
 class Indexer:
-    def __init__(self, project_path: str = ".", embedding_model=None, vector_store=None):
-        self.embedding_model = embedding_model or OllamaEmbeddingModel(
-            model=EMBEDDING_MODEL,
-            base_url=OLLAMA_BASE_URL 
-        )
-        self.vector_store = vector_store or VectorStoreManager(project_path=project_path)
+    """
+    Writes chunks to the vector store and, when enabled, to the lexical
+    index, keeping both keyed by the same chunk IDs. File updates also
+    refresh the trigram index used by grep.
+    """
+
+    def __init__(
+        self,
+        project_path: str = ".",
+        embedding_model=None,
+        vector_store=None,
+        lexical_index=None,
+        trigram_index=None,
+    ):
+        # Unless given, all are shared with every other user of the project in this process
+        if embedding_model is None:
+            embedding_model = get_embedding_model()
+        self.embedding_model = embedding_model
+        self.vector_store = vector_store or get_vector_store(project_path)
+        # A custom vector store only gets lexical and trigram indexes if they are given too
+        if lexical_index is None and vector_store is None:
+            lexical_index = get_lexical_index(project_path)
+        if trigram_index is None and vector_store is None:
+            trigram_index = get_trigram_index(project_path)
+        self.lexical_index = lexical_index
+        self.trigram_index = trigram_index
 
     def index_chunks(self, chunks):
         if not chunks:
@@ -21,7 +60,98 @@ class Indexer:
         texts = [chunk.content for chunk in chunks]
         embeddings = self.embedding_model.embed(texts)
         self.vector_store.add_chunks(chunks, embeddings)
+        if self.lexical_index is not None:
+            self.lexical_index.add_chunks(chunks)
+
+    def diff_file(self, rel_path: str, chunks) -> ChunkDiff:
+        """
+        Compares a file's new chunks with the stored ones by chunk ID.
+
+        Chunk IDs derive from path and content, so an unchanged chunk keeps
+        its ID (and its embedding) no matter where it moved within the file.
+        """
+        existing = self.vector_store.get_file_chunks(rel_path)
+        diff = ChunkDiff(ids=chunk_ids(rel_path, (chunk.content for chunk in chunks)))
+        for i, (id_, chunk) in enumerate(zip(diff.ids, chunks)):
+            if id_ not in existing:
+                diff.new.append(i)
+            elif existing[id_] != chunk_metadata(chunk):
+                diff.updated.append(i)
+        kept = set(diff.ids)
+        diff.removed = [id_ for id_ in existing if id_ not in kept]
+        return diff
+
+    def apply_updates(self, updates):
+        """
+        Writes several files' diffs with one delete, one update and one add.
+
+        Args:
+            updates: Iterable of FileUpdate, with embeddings for each diff's new chunks
+        """
+        updates = list(updates)
+        removed_ids = []
+        updated_ids, updated_chunks = [], []
+        new_ids, new_chunks, new_embeddings = [], [], []
+        for update in updates:
+            diff = update.diff
+            removed_ids.extend(diff.removed)
+            for i in diff.updated:
+                updated_ids.append(diff.ids[i])
+                updated_chunks.append(update.chunks[i])
+            if diff.new:
+                new_ids.extend(diff.ids[i] for i in diff.new)
+                new_chunks.extend(update.chunks[i] for i in diff.new)
+                new_embeddings.append(update.embeddings)
+
+        if removed_ids:
+            self.vector_store.delete_ids(removed_ids)
+        if updated_ids:
+            self.vector_store.update_metadata(updated_ids, updated_chunks)
+        if new_ids:
+            # One contiguous array goes to the store, no per-vector lists
+            embeddings = new_embeddings[0] if len(new_embeddings) == 1 else np.concatenate(new_embeddings)
+            self.vector_store.add_chunks(new_chunks, embeddings, ids=new_ids)
+
+        if self.lexical_index is not None:
+            if removed_ids:
+                self.lexical_index.delete_ids(removed_ids)
+            if updated_ids:
+                self.lexical_index.update_metadata(updated_ids, updated_chunks)
+            if new_ids:
+                self.lexical_index.add_chunks(new_chunks, new_ids)
+        if self.trigram_index is not None:
+            self.trigram_index.update_files((update.rel_path, update.trigrams) for update in updates)
+
+    def update_file(self, rel_path: str, chunks, trigrams: bytes = None) -> ChunkDiff:
+        """Brings a single file's stored chunks in line with `chunks`, embedding only new ones."""
+        diff = self.diff_file(rel_path, chunks)
+        embeddings = None
+        if diff.new:
+            embeddings = self.embedding_model.embed([chunks[i].content for i in diff.new])
+        self.apply_updates([FileUpdate(rel_path, chunks, diff, embeddings, trigrams)])
+        return diff
 
     def delete_file_index(self, file_path: str):
         """Removes all chunks for a given file from the vector store."""
-        self.vector_store.delete_by_file(file_path)
\ No newline at end of file
+        self.vector_store.delete_by_file(file_path)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_by_files([file_path])
+        if self.trigram_index is not None:
+            self.trigram_index.delete_files([file_path])
+
+    def delete_files_index(self, file_paths):
+        """Removes all chunks for several files from the vector store."""
+        file_paths = list(file_paths)
+        self.vector_store.delete_by_files(file_paths)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_by_files(file_paths)
+        if self.trigram_index is not None:
+            self.trigram_index.delete_files(file_paths)
+
+    def rename_file_index(self, old_path: str, new_path: str, new_abs_path: str = None):
+        """Points the chunks of a moved file at its new path."""
+        if self.lexical_index is not None:
+            self.lexical_index.rename_file(old_path, new_path, new_abs_path)
+        if self.trigram_index is not None:
+            self.trigram_index.rename_file(old_path, new_path)
+        return self.vector_store.rename_file(old_path, new_path, new_abs_path)
@@ -0,0 +1,254 @@
+"""
+Lexical (BM25) index over chunk text, kept next to the vector store.
+
+Each chunk stored in Chroma is also stored in a SQLite FTS5 table, under the
+same chunk ID, with three searchable columns:
+- `content`: the chunk text; `_` counts as a word character, so
+  `parse_config` is one token
+- `identifiers`: every identifier in the chunk plus its camelCase and
+  snake_case parts, so "parse config" finds `parseConfig`
+- `path_terms`: the words of the file path
+
+`search_code` fuses this ranking with the vector ranking (reciprocal rank
+fusion), and answers identifier-only queries from it alone, without an
+embedding call.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from core.config import LEXICAL_INDEX_ENABLED, RRF_K, get_lexical_db_path
+from vectorstore.chroma import SearchResult, assign_chunk_ids, chunk_ids, chunk_metadata, get_vector_store
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+# A single token that only makes sense as code: snake_case, camelCase,
+# dotted or scoped names, or a call
+_IDENTIFIER_QUERY_RE = re.compile(r"^[A-Za-z_$][\w$]*(?:(?:\.|::|#)[A-Za-z_$][\w$]*)*(?:\(\))?$")
+
+def split_identifier(identifier: str) -> List[str]:
+    """Splits `parseHTTPConfig_v2` into `parse`, `HTTP`, `Config`, `v`, `2`."""
+    parts = []
+    for piece in identifier.split("_"):
+        parts.extend(_CAMEL_RE.findall(piece))
+    return parts
+
+def identifier_terms(text: str) -> str:
+    """Identifiers of a text plus their parts, space-separated and de-duplicated."""
+    terms = {}
+    for identifier in _IDENTIFIER_RE.findall(text):
+        if len(identifier) < 3:
+            continue
+        terms[identifier.lower()] = None
+        for part in split_identifier(identifier):
+            if len(part) > 1:
+                terms[part.lower()] = None
+    return " ".join(terms)
+
+def is_identifier_query(query: str) -> bool:
+    """
+    True for queries that name a symbol rather than describe behaviour, such
+    as `parse_config`, `VectorStoreManager`, `os.path.join` or `reload()`.
+    A single plain word ("authentication") is not, since it may be a concept.
+    """
+    query = query.strip().strip("`")
+    if not _IDENTIFIER_QUERY_RE.match(query):
+        return False
+    return (
+        "_" in query
+        or "." in query
+        or "::" in query
+        or query.endswith("()")
+        or any(c.isupper() for c in query[1:])
+        or any(c.isdigit() for c in query)
+    )
+
+def match_expression(query: str) -> Optional[str]:
+    """Turns free text into an FTS5 query matching any of its words and identifier parts."""
+    terms = {}
+    for word in _WORD_RE.findall(query):
+        terms[word.lower()] = None
+        for part in split_identifier(word):
+            if len(part) > 1:
+                terms[part.lower()] = None
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[str]:
+    """
+    Merges ranked ID lists: each ID scores the sum of 1 / (k + rank) over
+    the lists it appears in, so agreement between retrievers wins.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class LexicalIndex:
+    """BM25 index of a project's chunks; see the module docstring."""
+
+    def __init__(self, project_path: str = ".", db_path: str = None):
+        self.db_path = db_path or get_lexical_db_path(project_path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                path TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                content, identifiers, path_terms,
+                tokenize = "unicode61 tokenchars '_'"
+            );
+        """)
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # --- Writes (mirroring VectorStoreManager) ---
+
+    def _insert(self, ids: Sequence[str], contents: Sequence[str], metadatas: Sequence[dict]):
+        for id_, content, metadata in zip(ids, contents, metadatas):
+            path = metadata.get("path", "")
+            self._delete_rows(self._conn.execute("SELECT rowid FROM chunks WHERE id = ?", (id_,)).fetchall())
+            cursor = self._conn.execute(
+                "INSERT INTO chunks (id, path, metadata) VALUES (?, ?, ?)",
+                (id_, path, json.dumps(metadata)),
+            )
+            symbol = metadata.get("symbol") or ""
+            self._conn.execute(
+                "INSERT INTO chunks_fts (rowid, content, identifiers, path_terms) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, content, identifier_terms(f"{symbol} {content}"), " ".join(_WORD_RE.findall(path))),
+            )
+
+    def _delete_rows(self, rows):
+        rowids = [(row[0],) for row in rows]
+        if rowids:
+            self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", rowids)
+            self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rowids)
+
+    def add_chunks(self, chunks, ids: Sequence[str] = None):
+        if ids is None:
+            ids = assign_chunk_ids(chunks)
+        with self._lock, self._conn:
+            self._insert(ids, [chunk.content for chunk in chunks], [chunk_metadata(chunk) for chunk in chunks])
+
+    def add_entries(self, ids: Sequence[str], contents: Sequence[str], metadatas: Sequence[dict]):
+        """Stores chunks given as stored columns (e.g. read back from the vector store)."""
+        with self._lock, self._conn:
+            self._insert(ids, contents, metadatas)
+
+    def update_metadata(self, ids: Sequence[str], chunks):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                ((json.dumps(chunk_metadata(chunk)), id_) for id_, chunk in zip(ids, chunks)),
+            )
+
+    def delete_ids(self, ids: Iterable[str]):
+        with self._lock, self._conn:
+            for id_ in ids:
+                self._delete_rows(self._conn.execute("SELECT rowid FROM chunks WHERE id = ?", (id_,)).fetchall())
+
+    def delete_by_files(self, paths: Iterable[str]):
+        with self._lock, self._conn:
+            for path in paths:
+                self._delete_rows(self._conn.execute("SELECT rowid FROM chunks WHERE path = ?", (path,)).fetchall())
+
+    def rename_file(self, old_path: str, new_path: str, new_abs_path: str = None):
+        """Re-keys a moved file's chunks, deriving new IDs the way the vector store does."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT c.rowid, c.metadata, f.content FROM chunks c JOIN chunks_fts f ON f.rowid = c.rowid "
+                "WHERE c.path = ?",
+                (old_path,),
+            ).fetchall()
+            if not rows:
+                return 0
+            contents = [row[2] for row in rows]
+            metadatas = []
+            for row in rows:
+                metadata = json.loads(row[1])
+                metadata["path"] = new_path
+                if new_abs_path is not None:
+                    metadata["abs_path"] = new_abs_path
+                metadatas.append(metadata)
+            self._delete_rows(rows)
+            self._insert(chunk_ids(new_path, contents), contents, metadatas)
+            return len(rows)
+
+    # --- Queries ---
+
+    def search(self, query: str, k: int = 10) -> List[SearchResult]:
+        """
+        Returns up to `k` chunks ranked by BM25, best first. `distance` holds
+        the (negated, so lower is better) BM25 score.
+        """
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id, f.content, c.metadata, bm25(chunks_fts, 1.0, 2.0, 1.0) AS score "
+                "FROM chunks_fts f JOIN chunks c ON c.rowid = f.rowid "
+                "WHERE chunks_fts MATCH ? ORDER BY score LIMIT ?",
+                (expression, k),
+            ).fetchall()
+        return [SearchResult(id_, content, json.loads(metadata), score) for id_, content, metadata, score in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def backfill(lexical_index: LexicalIndex, vector_store, batch_size: int = 1000) -> int:
+    """Copies every chunk of the vector store into an empty lexical index, e.g. for indexes built before it existed."""
+    offset = 0
+    while True:
+        page = vector_store.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not len(page["ids"]):
+            return offset
+        lexical_index.add_entries(page["ids"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
+
+_indexes: Dict[str, Optional[LexicalIndex]] = {}
+_indexes_lock = threading.Lock()
+
+def get_lexical_index(project_path: str = ".") -> Optional[LexicalIndex]:
+    """
+    Returns the process-wide lexical index of a project, opening it on first
+    use and filling it from the vector store if it is empty but the store is not.
+
+    Returns None when the lexical index is disabled or SQLite lacks FTS5.
+    """
+    if not LEXICAL_INDEX_ENABLED:
+        return None
+    project_path = os.path.abspath(project_path)
+    with _indexes_lock:
+        if project_path in _indexes:
+            return _indexes[project_path]
+        try:
+            index = LexicalIndex(project_path)
+        except sqlite3.OperationalError as e:
+            print(f"Lexical search disabled: {e}")
+            index = None
+        if index is not None:
+            store = get_vector_store(project_path)
+            if not index.count() and store.collection.count():
+                print("Building the lexical index from the vector store...")
+                backfill(index, store)
+        _indexes[project_path] = index
+        return index
@@ -1,47 +1,365 @@
 import sqlite3
 import hashlib
 import os
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, Optional
 
-from core.config import get_state_db_path
+from core.config import get_state_db_path, STATE_COMMIT_EVERY, STATE_COMMIT_INTERVAL_MS, RACY_WINDOW_MS
+from indexing import file_tree
+from indexing.symbols import (
+    SYMBOLS_VERSION,
+    FileSymbols,
+    create_symbol_tables,
+    delete_file_symbols,
+    is_python_file,
+    rename_file_symbols,
+    write_file_symbols,
+)
+
+def hash_file(file_path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(4096), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+@dataclass(frozen=True)
+class FileStat:
+    """The stat fields used to detect changes without hashing, like git's index."""
+    size: int
+    mtime_ns: int
+    inode: int
+    # When the stat was taken; used for the racily-clean check
+    checked_ns: int
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result) -> "FileStat":
+        return cls(st.st_size, st.st_mtime_ns, st.st_ino, time.time_ns())
+
+@dataclass
+class FileRecord:
+    hash: str
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+    inode: Optional[int] = None
+    checked_ns: Optional[int] = None
+    # Set when the loader guard rejected the file (e.g. "minified"); it has no chunks
+    skip_reason: Optional[str] = None
+    # SYMBOLS_VERSION the file's symbols were extracted with, if it has any
+    symbols_version: Optional[int] = None
+
+    def matches(self, st: os.stat_result, racy_window_ns: int = RACY_WINDOW_MS * 1_000_000) -> bool:
+        """True when `st` is the stat recorded, outside the racy window of when it was taken."""
+        return (
+            self.checked_ns is not None
+            and self.size == st.st_size
+            and self.mtime_ns == st.st_mtime_ns
+            and self.inode == st.st_ino
+            and self.checked_ns - st.st_mtime_ns > racy_window_ns
+        )
+
+def read_records(project_path: str) -> Dict[str, FileRecord]:
+    """
+    Returns the recorded state of every indexed file, keyed by absolute path,
+    for readers outside the indexing process (e.g. the agent tools). Files
+    the guard rejected are left out.
+    """
+    conn = sqlite3.connect(get_state_db_path(project_path))
+    try:
+        rows = conn.execute(
+            "SELECT path, hash, size, mtime_ns, inode, checked_ns, skip_reason, symbols_version "
+            "FROM file_states WHERE skip_reason IS NULL"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+    return {row[0]: FileRecord(*row[1:]) for row in rows}
 
 class StateManager:
-    def __init__(self, project_path: str = ".", db_path: str = None):
+    """
+    Tracks which files have been indexed and with which content hash.
+
+    A single connection is kept open for the lifetime of the manager. Writes
+    are grouped into transactions that are committed every `commit_every`
+    files or `commit_interval_ms` milliseconds, whichever comes first; call
+    `flush()` (or `close()`) to commit outstanding writes immediately.
+
+    Alongside the hash, each file's size, mtime and inode are recorded so an
+    untouched file can be recognised from a single `stat` call. Files the
+    loader guard rejected are recorded too, with their skip reason, so they
+    are not re-examined until their stat changes.
+
+    The symbol table of Python files (see `indexing.symbols`) lives in the
+    same database and is written through the same connection, so it is
+    committed, renamed and removed together with the file states. So is
+    the manifest of every file in the project (see `indexing.file_tree`).
+    """
+
+    def __init__(
+        self,
+        project_path: str = ".",
+        db_path: str = None,
+        commit_every: int = STATE_COMMIT_EVERY,
+        commit_interval_ms: int = STATE_COMMIT_INTERVAL_MS,
+        racy_window_ms: int = RACY_WINDOW_MS,
+    ):
         if db_path is None:
             self.db_path = get_state_db_path(project_path)
         else:
             self.db_path = db_path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval_ms / 1000
+        self.racy_window_ns = racy_window_ms * 1_000_000
+
+        # Shared by the pipeline writer, the watcher thread and the caller
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._records = None
         self._init_db()
 
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
                 CREATE TABLE IF NOT EXISTS file_states (
                     path TEXT PRIMARY KEY,
                     hash TEXT NOT NULL,
                     last_indexed TEXT NOT NULL
                 )
             """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            # Stat columns were added after the first release; migrate in place
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(file_states)")}
+            for column, sql_type in (
+                ("size", "INTEGER"),
+                ("mtime_ns", "INTEGER"),
+                ("inode", "INTEGER"),
+                ("checked_ns", "INTEGER"),
+                ("skip_reason", "TEXT"),
+                ("symbols_version", "INTEGER"),
+            ):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE file_states ADD COLUMN {column} {sql_type}")
+            create_symbol_tables(self._conn)
+            file_tree.create_manifest_table(self._conn)
+            self._conn.commit()
+
+    def prefetch_all(self, refresh: bool = False):
+        """
+        Loads every recorded file state into memory for bulk runs.
+
+        The in-memory copy is kept current by this manager's own writes, so
+        later calls are free unless `refresh` is set.
+        """
+        if self._records is not None and not refresh:
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, hash, size, mtime_ns, inode, checked_ns, skip_reason, symbols_version FROM file_states"
+            ).fetchall()
+            self._records = {row[0]: FileRecord(*row[1:]) for row in rows}
+
+    def get_record(self, file_path) -> Optional[FileRecord]:
+        if self._records is not None:
+            return self._records.get(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash, size, mtime_ns, inode, checked_ns, skip_reason, symbols_version "
+                "FROM file_states WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+            return FileRecord(*row) if row else None
 
     def get_file_hash(self, file_path):
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        return hash_file(file_path)
+
+    def get_stored_hash(self, file_path):
+        """Returns the hash recorded for a file at its last indexing, or None."""
+        record = self.get_record(file_path)
+        return record.hash if record else None
+
+    def is_unchanged(self, file_path, st: os.stat_result = None) -> bool:
+        """
+        Returns True when the file's stat matches the recorded one, meaning
+        its content can be assumed unchanged without hashing.
+
+        Files whose mtime falls within the racy window of when they were last
+        read are never trusted: a same-size edit in the same mtime tick would
+        otherwise go unnoticed.
+        """
+        record = self.get_record(file_path)
+        if record is None or record.checked_ns is None:
+            return False
+        if st is None:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return False
+        return record.matches(st, self.racy_window_ns)
 
     def has_changed(self, file_path):
+        if self.is_unchanged(file_path):
+            return False, self.get_stored_hash(file_path)
         current_hash = self.get_file_hash(file_path)
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT hash FROM file_states WHERE path = ?", (file_path,))
-            row = cursor.fetchone()
-            if row is None or row[0] != current_hash:
-                return True, current_hash
-            return False, current_hash
-
-    def update_state(self, file_path, file_hash):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO file_states (path, hash, last_indexed) VALUES (?, ?, ?)",
-                (file_path, file_hash, datetime.now().isoformat())
-            )
\ No newline at end of file
+        stored_hash = self.get_stored_hash(file_path)
+        return stored_hash != current_hash, current_hash
+
+    def update_state(self, file_path, file_hash, stat: FileStat = None, skip_reason: str = None):
+        # Skipped files may not have been read in full, so they have no hash
+        record = FileRecord(file_hash or "", skip_reason=skip_reason)
+        if stat is not None:
+            record = FileRecord(record.hash, stat.size, stat.mtime_ns, stat.inode, stat.checked_ns, skip_reason)
+        with self._lock:
+            # The symbols version is left alone; update_symbols() owns it
+            self._conn.execute(
+                "INSERT INTO file_states "
+                "(path, hash, last_indexed, size, mtime_ns, inode, checked_ns, skip_reason) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET hash = excluded.hash, last_indexed = excluded.last_indexed, "
+                "size = excluded.size, mtime_ns = excluded.mtime_ns, inode = excluded.inode, "
+                "checked_ns = excluded.checked_ns, skip_reason = excluded.skip_reason",
+                (
+                    file_path, record.hash, datetime.now().isoformat(),
+                    record.size, record.mtime_ns, record.inode, record.checked_ns, record.skip_reason,
+                )
+            )
+            if self._records is not None:
+                previous = self._records.get(file_path)
+                record.symbols_version = previous.symbols_version if previous else None
+                self._records[file_path] = record
+            self._pending += 1
+            self._maybe_commit()
+
+    def update_symbols(self, file_path, symbols: Optional[FileSymbols]):
+        """
+        Replaces a file's symbols; None removes them (the file is not Python
+        or no longer indexed). Call after `update_state` for the same file.
+        """
+        version = SYMBOLS_VERSION if symbols is not None else None
+        with self._lock:
+            if symbols is None:
+                delete_file_symbols(self._conn, [file_path])
+            else:
+                write_file_symbols(self._conn, file_path, symbols)
+            self._conn.execute("UPDATE file_states SET symbols_version = ? WHERE path = ?", (version, file_path))
+            if self._records is not None and file_path in self._records:
+                self._records[file_path].symbols_version = version
+            self._pending += 1
+            self._maybe_commit()
+
+    def needs_symbols(self, file_path) -> bool:
+        """True for an indexed Python file whose symbols are missing or were extracted by an older version."""
+        if not is_python_file(file_path):
+            return False
+        record = self.get_record(file_path)
+        return record is not None and not record.skip_reason and record.symbols_version != SYMBOLS_VERSION
+
+    def replace_manifest(self, abs_paths, root: str, start: str = None):
+        """
+        Records `abs_paths` as the complete list of files under `root`, e.g.
+        after a full walk, or only under its subfolder `start` if just that was walked.
+        """
+        entries, _ = file_tree.stat_entries(abs_paths)
+        with self._lock:
+            file_tree.replace_manifest(
+                self._conn, entries, os.path.abspath(root), os.path.abspath(start) if start else None
+            )
+            self._pending += 1
+            self._maybe_commit()
+
+    def update_manifest(self, abs_paths):
+        """Adds or refreshes files in the manifest; paths that no longer exist are dropped."""
+        entries, missing = file_tree.stat_entries(abs_paths)
+        with self._lock:
+            file_tree.upsert_manifest(self._conn, entries)
+            for path in missing:
+                file_tree.remove_manifest(self._conn, path, is_directory=False)
+            self._pending += 1
+            self._maybe_commit()
+
+    def remove_manifest(self, abs_path, is_directory: bool = None):
+        """Drops a file, or every file under a directory, from the manifest."""
+        with self._lock:
+            file_tree.remove_manifest(self._conn, os.path.abspath(abs_path), is_directory)
+            self._pending += 1
+            self._maybe_commit()
+
+    def all_paths(self) -> list[str]:
+        """Returns every path with a recorded state."""
+        if self._records is not None:
+            return list(self._records)
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT path FROM file_states")]
+
+    def remove_states(self, file_paths):
+        """Forgets the recorded state of the given files."""
+        file_paths = list(file_paths)
+        with self._lock:
+            self._conn.executemany("DELETE FROM file_states WHERE path = ?", ((p,) for p in file_paths))
+            delete_file_symbols(self._conn, file_paths)
+            if self._records is not None:
+                for file_path in file_paths:
+                    self._records.pop(file_path, None)
+            self._pending += len(file_paths)
+            self._maybe_commit()
+
+    def rename_state(self, old_path, new_path):
+        """Moves a file's recorded state to a new path, keeping hash and stat."""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_states WHERE path = ?", (new_path,))
+            self._conn.execute("UPDATE file_states SET path = ? WHERE path = ?", (new_path, old_path))
+            rename_file_symbols(self._conn, old_path, new_path)
+            if self._records is not None and old_path in self._records:
+                self._records[new_path] = self._records.pop(old_path)
+            self._pending += 1
+            self._maybe_commit()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Returns a project-level value, e.g. the commit a cloned repository was indexed at."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self.flush()
+
+    def _maybe_commit(self):
+        if (
+            self._pending >= self.commit_every
+            or time.monotonic() - self._last_commit >= self.commit_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Commits any pending state writes."""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+            self._last_commit = time.monotonic()
+
+    def close(self):
+        """Commits pending writes and closes the connection."""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,416 @@
+"""
+Symbol table of a project's Python files, kept in the state database.
+
+While a Python file is chunked, the same AST is walked once more to collect:
+- definitions: classes, functions, methods and module/class-level variables,
+  with their in-module qualified name (`Indexer.apply_updates`) and span
+- references: every name and attribute used, and whether it is called
+- imports: the names each import statement binds, and what they point to
+
+Rows are keyed by the file's absolute path, like `file_states`, and are
+rewritten whenever the file is re-indexed. `get_symbol_info`,
+`find_references` and `get_file_outline` read them instead of having Jedi
+search the whole project; Jedi is only asked about reference sites the
+table cannot attribute on its own (an attribute whose name several
+project definitions share).
+"""
+
+import ast
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from core.config import get_state_db_path
+
+# Bumped when extraction changes, so files indexed earlier are re-extracted
+SYMBOLS_VERSION = 1
+
+@dataclass
+class Definition:
+    name: str
+    qualname: str            # within the module, e.g. "Indexer.apply_updates"
+    kind: str                # "class", "function", "method" or "variable"
+    line: int
+    column: int              # of the name itself
+    end_line: int
+    parent: Optional[str] = None
+
+@dataclass
+class Reference:
+    name: str
+    line: int
+    column: int
+    call: bool = False
+    bare: bool = True        # `name` rather than `something.name`
+
+@dataclass
+class Import:
+    alias: str               # the name bound in the importing module
+    target: str              # dotted name it refers to, relative to `level`
+    level: int = 0           # leading dots of a relative import
+    line: int = 0
+
+@dataclass
+class FileSymbols:
+    definitions: List[Definition] = field(default_factory=list)
+    references: List[Reference] = field(default_factory=list)
+    imports: List[Import] = field(default_factory=list)
+
+@dataclass
+class SymbolInfo:
+    """A definition as returned by lookups, with its project-wide name."""
+    full_name: str
+    kind: str
+    path: str                # relative to the project root
+    line: int
+    column: int
+    end_line: int
+
+@dataclass
+class ReferenceSite:
+    path: str                # relative to the project root
+    line: int
+    column: int
+    call: bool
+    ambiguous: bool = False  # several definitions could be meant; needs type inference
+
+def is_python_file(path: str) -> bool:
+    return path.endswith(".py")
+
+def module_name(rel_path: str) -> str:
+    """`pkg/mod.py` -> `pkg.mod`, `pkg/__init__.py` -> `pkg`."""
+    parts = os.path.splitext(rel_path)[0].replace(os.sep, "/").split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(parts)
+
+def resolve_import(module: str, target: str, level: int, is_package: bool = False) -> str:
+    """Turns a relative import target into an absolute dotted name, as seen from `module`."""
+    if not level:
+        return target
+    base = module.split(".")
+    # In a package's __init__, one dot means the package itself
+    drop = level - 1 if is_package else level
+    base = base[: len(base) - drop] if drop else base
+    return ".".join(part for part in base + [target] if part)
+
+class _SymbolVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.symbols = FileSymbols()
+        self._scope = []         # (name, kind) of enclosing classes and functions
+
+    def _define(self, node, name: str, kind: str, column: int):
+        names = [scope_name for scope_name, _ in self._scope]
+        self.symbols.definitions.append(Definition(
+            name=name,
+            qualname=".".join(names + [name]),
+            kind=kind,
+            line=node.lineno,
+            column=column,
+            end_line=node.end_lineno or node.lineno,
+            parent=".".join(names) or None,
+        ))
+
+    def _in_function(self) -> bool:
+        return any(kind != "class" for _, kind in self._scope)
+
+    def _reference(self, name: str, line: int, column: int, call: bool = False, bare: bool = True):
+        if name not in ("self", "cls"):
+            self.symbols.references.append(Reference(name, line, column, call, bare))
+
+    # --- Definitions ---
+
+    def visit_ClassDef(self, node):
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        self._define(node, node.name, "class", node.col_offset + len("class "))
+        self._scope.append((node.name, "class"))
+        for stmt in node.body:
+            self.visit(stmt)
+        self._scope.pop()
+
+    def visit_FunctionDef(self, node, keyword: str = "def "):
+        for child in node.decorator_list + [node.args] + ([node.returns] if node.returns else []):
+            self.visit(child)
+        in_class = bool(self._scope) and self._scope[-1][1] == "class"
+        self._define(node, node.name, "method" if in_class else "function", node.col_offset + len(keyword))
+        self._scope.append((node.name, "function"))
+        for stmt in node.body:
+            self.visit(stmt)
+        self._scope.pop()
+
+    def visit_AsyncFunctionDef(self, node):
+        self.visit_FunctionDef(node, keyword="async def ")
+
+    def _define_targets(self, node, targets):
+        if self._in_function():
+            return
+        for target in targets:
+            for name_node in ast.walk(target):
+                if isinstance(name_node, ast.Name) and isinstance(name_node.ctx, ast.Store):
+                    self._define(name_node, name_node.id, "variable", name_node.col_offset)
+
+    def visit_Assign(self, node):
+        self._define_targets(node, node.targets)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        self._define_targets(node, [node.target])
+        self.generic_visit(node)
+
+    # --- Imports ---
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            # `import a.b` binds `a`; `import a.b as c` binds `c` to `a.b`
+            bound = alias.asname or alias.name.split(".")[0]
+            target = alias.name if alias.asname else bound
+            self.symbols.imports.append(Import(bound, target, 0, node.lineno))
+            self._reference(bound, getattr(alias, "lineno", node.lineno), getattr(alias, "col_offset", node.col_offset))
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == "*":
+                continue
+            bound = alias.asname or alias.name
+            target = f"{node.module}.{alias.name}" if node.module else alias.name
+            self.symbols.imports.append(Import(bound, target, node.level or 0, node.lineno))
+            self._reference(alias.name, getattr(alias, "lineno", node.lineno), getattr(alias, "col_offset", node.col_offset))
+
+    # --- References ---
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Store) or self._in_function():
+            self._reference(node.id, node.lineno, node.col_offset)
+
+    def _attribute(self, node, call: bool):
+        line = node.end_lineno or node.lineno
+        column = node.end_col_offset - len(node.attr) if node.end_col_offset is not None else node.col_offset
+        self._reference(node.attr, line, column, call=call, bare=False)
+        self.visit(node.value)
+
+    def visit_Attribute(self, node):
+        self._attribute(node, call=False)
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name):
+            self._reference(func.id, func.lineno, func.col_offset, call=True)
+        elif isinstance(func, ast.Attribute):
+            self._attribute(func, call=True)
+        else:
+            self.visit(func)
+        for child in node.args + node.keywords:
+            self.visit(child)
+
+def extract_symbols(tree: ast.Module) -> FileSymbols:
+    """Collects the definitions, references and imports of a parsed module."""
+    visitor = _SymbolVisitor()
+    visitor.visit(tree)
+    return visitor.symbols
+
+# --- Storage (shares the StateManager's connection and transactions) ---
+
+def create_symbol_tables(conn: sqlite3.Connection):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS symbols (
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            qualname TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            line INTEGER NOT NULL,
+            column INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            parent TEXT
+        );
+        CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+        CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+        CREATE TABLE IF NOT EXISTS symbol_refs (
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            line INTEGER NOT NULL,
+            column INTEGER NOT NULL,
+            call INTEGER NOT NULL,
+            bare INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS symbol_refs_name ON symbol_refs (name);
+        CREATE INDEX IF NOT EXISTS symbol_refs_path ON symbol_refs (path);
+        CREATE TABLE IF NOT EXISTS symbol_imports (
+            path TEXT NOT NULL,
+            alias TEXT NOT NULL,
+            target TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            line INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS symbol_imports_path ON symbol_imports (path, alias);
+    """)
+
+_SYMBOL_TABLES = ("symbols", "symbol_refs", "symbol_imports")
+
+def delete_file_symbols(conn: sqlite3.Connection, paths):
+    paths = [(path,) for path in paths]
+    for table in _SYMBOL_TABLES:
+        conn.executemany(f"DELETE FROM {table} WHERE path = ?", paths)
+
+def write_file_symbols(conn: sqlite3.Connection, path: str, symbols: FileSymbols):
+    delete_file_symbols(conn, [path])
+    conn.executemany(
+        "INSERT INTO symbols (path, name, qualname, kind, line, column, end_line, parent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((path, d.name, d.qualname, d.kind, d.line, d.column, d.end_line, d.parent) for d in symbols.definitions),
+    )
+    conn.executemany(
+        "INSERT INTO symbol_refs (path, name, line, column, call, bare) VALUES (?, ?, ?, ?, ?, ?)",
+        ((path, r.name, r.line, r.column, r.call, r.bare) for r in symbols.references),
+    )
+    conn.executemany(
+        "INSERT INTO symbol_imports (path, alias, target, level, line) VALUES (?, ?, ?, ?, ?)",
+        ((path, i.alias, i.target, i.level, i.line) for i in symbols.imports),
+    )
+
+def rename_file_symbols(conn: sqlite3.Connection, old_path: str, new_path: str):
+    # Qualified names are stored relative to the module, so only the path changes
+    delete_file_symbols(conn, [new_path])
+    for table in _SYMBOL_TABLES:
+        conn.execute(f"UPDATE {table} SET path = ? WHERE path = ?", (new_path, old_path))
+
+# --- Lookups ---
+
+def _matches(full_name: str, query: str) -> bool:
+    return full_name == query or full_name.endswith("." + query)
+
+class SymbolIndex:
+    """
+    Read side of the symbol table, for the agent tools.
+
+    Uses its own connection; rows written by an indexer in this process
+    become visible when its state manager commits.
+    """
+
+    def __init__(self, project_path: str = ".", db_path: str = None):
+        self.project_path = os.path.abspath(project_path)
+        self.db_path = db_path or get_state_db_path(self.project_path)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def available(self) -> bool:
+        """True once an indexing run has extracted symbols for this project."""
+        try:
+            row = self._conn.execute(
+                "SELECT 1 FROM file_states WHERE symbols_version = ? LIMIT 1", (SYMBOLS_VERSION,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return False
+        return row is not None
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.project_path)
+
+    def _full_name(self, path: str, qualname: str) -> str:
+        return f"{module_name(self._rel(path))}.{qualname}"
+
+    def definitions(self, query: str) -> List[SymbolInfo]:
+        """
+        Definitions named `query`, or whose qualified name ends with it
+        (`apply_updates`, `Indexer.apply_updates`, `indexing.indexer.Indexer`).
+        """
+        name = query.rsplit(".", 1)[-1]
+        rows = self._conn.execute(
+            "SELECT path, qualname, kind, line, column, end_line FROM symbols WHERE name = ? ORDER BY path, line",
+            (name,),
+        ).fetchall()
+        results = []
+        for path, qualname, kind, line, column, end_line in rows:
+            full_name = self._full_name(path, qualname)
+            if "." not in query or _matches(full_name, query):
+                results.append(SymbolInfo(full_name, kind, self._rel(path), line, column, end_line))
+        return results
+
+    def references(self, query: str) -> List[ReferenceSite]:
+        """
+        Places where the symbol(s) matching `query` are used, definitions
+        included, in path and line order.
+
+        A bare name counts when its file defines it or imports it from one
+        of the matching definitions. An attribute (`x.name`) counts when no
+        other project definition shares its name; otherwise the site is
+        returned with `ambiguous` set, for the caller to resolve.
+        """
+        name = query.rsplit(".", 1)[-1]
+        targets = {info.full_name for info in self.definitions(query)}
+        # Definitions of the same name that the query does not mean
+        others = len(self.definitions(name)) > len(targets)
+        target_paths = {
+            row[0] for row in self._conn.execute("SELECT DISTINCT path FROM symbols WHERE name = ?", (name,))
+        }
+
+        imports: Dict[str, Optional[tuple]] = {}
+        def imported_target(path: str, line: int) -> Optional[str]:
+            if path not in imports:
+                # `from m import name as alias` is a use of `name` too, on its own line
+                row = self._conn.execute(
+                    "SELECT target, level, alias, line FROM symbol_imports "
+                    "WHERE path = ? AND (alias = ? OR target = ? OR target LIKE ?) "
+                    "ORDER BY alias = ? DESC, line DESC LIMIT 1",
+                    (path, name, name, f"%.{name}", name),
+                ).fetchone()
+                imports[path] = row
+            row = imports[path]
+            if row is None or (row[2] != name and row[3] != line):
+                return None
+            rel = self._rel(path)
+            return resolve_import(module_name(rel), row[0], row[1], rel.endswith("__init__.py"))
+
+        sites = []
+        rows = self._conn.execute(
+            "SELECT path, line, column, call, bare FROM symbol_refs WHERE name = ? ORDER BY path, line, column",
+            (name,),
+        ).fetchall()
+        for path, line, column, call, bare in rows:
+            site = ReferenceSite(self._rel(path), line, column, bool(call))
+            if not targets:
+                # Not defined in the project (a library or builtin name): all uses count
+                sites.append(site)
+            elif bare:
+                target = imported_target(path, line)
+                if target is not None:
+                    if any(_matches(full_name, target) for full_name in targets):
+                        sites.append(site)
+                    elif any(full_name.startswith(target.rsplit(".", 1)[0] + ".") for full_name in targets):
+                        # Imported through a package that may re-export it
+                        site.ambiguous = True
+                        sites.append(site)
+                elif path in target_paths and any(
+                    full_name.startswith(module_name(site.path) + ".") for full_name in targets
+                ):
+                    sites.append(site)
+            else:
+                site.ambiguous = others
+                sites.append(site)
+
+        for info in self.definitions(query):
+            sites.append(ReferenceSite(info.path, info.line, info.column, False))
+        unique = {(site.path, site.line, site.column): site for site in sites}
+        return sorted(unique.values(), key=lambda site: (site.path, site.line, site.column))
+
+    def is_current(self, abs_path: str) -> bool:
+        """True when the file's symbols were extracted from its current content (judged by stat)."""
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, symbols_version FROM file_states WHERE path = ?", (abs_path,)
+        ).fetchone()
+        if row is None or row[2] != SYMBOLS_VERSION:
+            return False
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return False
+        return row[0] == st.st_size and row[1] == st.st_mtime_ns
+
+    def file_definitions(self, abs_path: str) -> List[Definition]:
+        rows = self._conn.execute(
+            "SELECT name, qualname, kind, line, column, end_line, parent FROM symbols WHERE path = ? ORDER BY line",
+            (abs_path,),
+        ).fetchall()
+        return [Definition(*row) for row in rows]
+
+    def close(self):
+        self._conn.close()
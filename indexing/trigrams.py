@@ -0,0 +1,348 @@
+"""
+Trigram index of a project's files, for regex search (codesearch-style).
+
+For every indexed file the set of distinct byte trigrams of its lines
+(lower-cased, ASCII only) is stored as posting rows `(trigram, file)`.
+A regex is translated into the trigrams any match must contain, as an
+AND/OR query: `def parse_config` needs `def`, `ef `, ..., `fig`, while
+`(load|save)_file` needs the trigrams of `load_file` or of `save_file`.
+Evaluating that query against the postings leaves the few files worth
+reading; patterns that require no trigram (`.*`, `[a-z]+`) leave them all.
+
+The index is written by the Indexer alongside the vector store, from the
+bytes the prepare stage has already read.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from re import _constants as sre_constants
+from re import _parser as sre_parse
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from core.config import TRIGRAM_INDEX_ENABLED, get_trigram_db_path
+
+# A query is None (no constraint), a trigram (bytes), or ("and" | "or", [queries])
+Query = object
+
+# Largest set of alternative strings tracked for one part of a regex
+_MAX_EXACT = 64
+# Widest character range expanded into alternatives (e.g. [0-3])
+_MAX_RANGE = 8
+
+def file_trigrams(data: bytes) -> bytes:
+    """The distinct trigrams of a file's lines, sorted and concatenated (3 bytes each)."""
+    grams = set()
+    for line in data.lower().split(b"\n"):
+        grams.update(line[i : i + 3] for i in range(len(line) - 2))
+    return b"".join(sorted(grams))
+
+def _split(trigrams: bytes) -> Set[bytes]:
+    return {trigrams[i : i + 3] for i in range(0, len(trigrams), 3)}
+
+# --- Regex translation ---
+
+def _and(*queries) -> Query:
+    parts = []
+    for query in queries:
+        if query is None:
+            continue
+        if isinstance(query, tuple) and query[0] == "and":
+            parts.extend(query[1])
+        elif query not in parts:
+            parts.append(query)
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", parts)
+
+def _or(*queries) -> Query:
+    parts = []
+    for query in queries:
+        # One unconstrained alternative makes the whole choice unconstrained
+        if query is None:
+            return None
+        if isinstance(query, tuple) and query[0] == "or":
+            parts.extend(query[1])
+        elif query not in parts:
+            parts.append(query)
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("or", parts)
+
+def _exact_query(strings) -> Query:
+    """A match contains one of `strings`: OR over them of AND over their trigrams."""
+    return _or(*(_and(*(s[i : i + 3] for i in range(len(s) - 2))) for s in strings))
+
+def _info_query(info) -> Query:
+    exact, query = info
+    return _and(query, _exact_query(exact)) if exact is not None else query
+
+def _char(code: int, ignorecase: bool) -> Optional[bytes]:
+    c = chr(code)
+    # Only ASCII is lower-cased in the index, so other letters can't be matched case-insensitively
+    if ignorecase and not c.isascii():
+        return None
+    return c.encode("utf-8").lower()
+
+def _analyze_node(op, av, ignorecase: bool):
+    """
+    Returns (exact, query) for one regex node: `exact` is the set of every
+    string it can match when that set is small, else None; `query` holds
+    what is known beyond that.
+    """
+    if op is sre_constants.LITERAL:
+        char = _char(av, ignorecase)
+        return ({char}, None) if char is not None else (None, None)
+    if op is sre_constants.IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is sre_constants.LITERAL:
+                codes = [item_av]
+            elif item_op is sre_constants.RANGE and item_av[1] - item_av[0] < _MAX_RANGE:
+                codes = range(item_av[0], item_av[1] + 1)
+            else:
+                return None, None
+            for code in codes:
+                char = _char(code, ignorecase)
+                if char is None:
+                    return None, None
+                chars.add(char)
+        return chars, None
+    if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        # Zero-width: matches the empty string as far as trigrams go
+        return {b""}, None
+    if op is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, pattern = av
+        if add_flags & re.IGNORECASE:
+            ignorecase = True
+        if del_flags & re.IGNORECASE:
+            ignorecase = False
+        return _analyze(pattern, ignorecase)
+    if op is sre_constants.ATOMIC_GROUP:
+        return _analyze(av, ignorecase)
+    if op is sre_constants.BRANCH:
+        infos = [_analyze(branch, ignorecase) for branch in av[1]]
+        if all(exact is not None for exact, _ in infos) and sum(len(exact) for exact, _ in infos) <= _MAX_EXACT:
+            return set().union(*(exact for exact, _ in infos)), None
+        return None, _or(*(_info_query(info) for info in infos))
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, sre_constants.POSSESSIVE_REPEAT):
+        low, high, pattern = av
+        info = _analyze(pattern, ignorecase)
+        if low == 0:
+            if high == 1 and info[0] is not None and info[1] is None and len(info[0]) < _MAX_EXACT:
+                return info[0] | {b""}, None
+            return None, None
+        if low == high == 1:
+            return info
+        # At least one repetition must be present
+        return None, _info_query(info)
+    # ANY, NOT_LITERAL, CATEGORY, GROUPREF, ...: no fixed text
+    return None, None
+
+def _analyze(pattern, ignorecase: bool):
+    query = None
+    run = {b""}          # alternatives for the literal text matched so far
+    exact = True
+    for op, av in pattern:
+        node_exact, node_query = _analyze_node(op, av, ignorecase)
+        query = _and(query, node_query)
+        if node_exact is not None and node_query is None and run is not None and len(run) * len(node_exact) <= _MAX_EXACT:
+            run = {a + b for a in run for b in node_exact}
+            continue
+        exact = False
+        if run is not None:
+            query = _and(query, _exact_query(run))
+        run = node_exact if node_query is None else None
+    if exact:
+        return run, query
+    return None, _and(query, _exact_query(run) if run is not None else None)
+
+def regex_query(pattern: str) -> Query:
+    """Translates a regex into the trigram query its matches must satisfy (None: no constraint)."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    ignorecase = bool(parsed.state.flags & re.IGNORECASE)
+    return _info_query(_analyze(parsed, ignorecase))
+
+# --- Index ---
+
+class TrigramIndex:
+    """Trigram postings of a project's files; see the module docstring."""
+
+    def __init__(self, project_path: str = ".", db_path: str = None):
+        self.db_path = db_path or get_trigram_db_path(project_path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                trigrams BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                trigram BLOB NOT NULL,
+                file_id INTEGER NOT NULL,
+                PRIMARY KEY (trigram, file_id)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+        # id -> path of every indexed file, and the paths on their own; reloaded
+        # after writes from this or another process
+        self._paths: Optional[Dict[int, str]] = None
+        self._indexed: FrozenSet[str] = frozenset()
+        self._data_version = None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # --- Writes ---
+
+    def _remove(self, path: str):
+        row = self._conn.execute("SELECT id, trigrams FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        file_id, trigrams = row
+        self._conn.executemany(
+            "DELETE FROM postings WHERE trigram = ? AND file_id = ?",
+            ((trigram, file_id) for trigram in _split(trigrams)),
+        )
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def update_files(self, files: Iterable[Tuple[str, Optional[bytes]]]):
+        """
+        Stores the trigrams of each (path, trigrams) pair, as returned by
+        `file_trigrams`; None removes the file. Only postings that changed
+        are written.
+        """
+        with self._lock, self._conn:
+            self._paths = None
+            for path, trigrams in files:
+                if trigrams is None:
+                    self._remove(path)
+                    continue
+                row = self._conn.execute("SELECT id, trigrams FROM files WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    file_id = self._conn.execute(
+                        "INSERT INTO files (path, trigrams) VALUES (?, ?)", (path, trigrams)
+                    ).lastrowid
+                    old, new = set(), _split(trigrams)
+                else:
+                    file_id = row[0]
+                    old, new = _split(row[1]), _split(trigrams)
+                    self._conn.execute("UPDATE files SET trigrams = ? WHERE id = ?", (trigrams, file_id))
+                self._conn.executemany(
+                    "DELETE FROM postings WHERE trigram = ? AND file_id = ?",
+                    ((trigram, file_id) for trigram in old - new),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO postings (trigram, file_id) VALUES (?, ?)",
+                    ((trigram, file_id) for trigram in new - old),
+                )
+
+    def delete_files(self, paths: Iterable[str]):
+        with self._lock, self._conn:
+            self._paths = None
+            for path in paths:
+                self._remove(path)
+
+    def rename_file(self, old_path: str, new_path: str):
+        with self._lock, self._conn:
+            self._paths = None
+            self._remove(new_path)
+            self._conn.execute("UPDATE files SET path = ? WHERE path = ?", (new_path, old_path))
+
+    # --- Queries ---
+
+    def _evaluate(self, query: Query) -> Optional[Set[int]]:
+        if query is None:
+            return None
+        if isinstance(query, bytes):
+            return {
+                row[0] for row in self._conn.execute("SELECT file_id FROM postings WHERE trigram = ?", (query,))
+            }
+        op, parts = query
+        result = None
+        for part in parts:
+            ids = self._evaluate(part)
+            if op == "or":
+                if ids is None:
+                    return None
+                result = ids if result is None else result | ids
+            elif ids is not None:
+                result = ids if result is None else result & ids
+                if not result:
+                    break
+        return result
+
+    def candidates(self, query: Query) -> Tuple[FrozenSet[str], Optional[Set[str]]]:
+        """
+        Returns (every indexed path, the indexed paths that can match).
+        The second is None when the query does not narrow anything down.
+        Paths missing from the index are for the caller to scan.
+        """
+        with self._lock:
+            # data_version only changes when another connection commits
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._paths is None or data_version != self._data_version:
+                self._paths = dict(self._conn.execute("SELECT id, path FROM files"))
+                self._indexed = frozenset(self._paths.values())
+                self._data_version = data_version
+            paths, indexed = self._paths, self._indexed
+            ids = self._evaluate(query)
+        if ids is None:
+            return indexed, None
+        return indexed, {paths[id_] for id_ in ids if id_ in paths}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def backfill(trigram_index: TrigramIndex, project_path: str) -> int:
+    """Indexes every file the project's state records as indexed, e.g. for indexes built before this one existed."""
+    from indexing.state import StateManager
+    from ingestion.loaders.document import is_document
+
+    with StateManager(project_path=project_path) as state_manager:
+        state_manager.prefetch_all()
+        paths = [
+            path for path in state_manager.all_paths()
+            if not state_manager.get_record(path).skip_reason and not is_document(path)
+        ]
+    files = []
+    for abs_path in paths:
+        try:
+            with open(abs_path, "rb") as f:
+                files.append((os.path.relpath(abs_path, project_path), file_trigrams(f.read())))
+        except OSError:
+            continue
+    trigram_index.update_files(files)
+    return len(files)
+
+_indexes: Dict[str, Optional[TrigramIndex]] = {}
+_indexes_lock = threading.Lock()
+
+def get_trigram_index(project_path: str = ".") -> Optional[TrigramIndex]:
+    """
+    Returns the process-wide trigram index of a project, opening it on first
+    use and filling it from the project's files if it is empty but the
+    project has been indexed.
+
+    Returns None when the trigram index is disabled.
+    """
+    if not TRIGRAM_INDEX_ENABLED:
+        return None
+    project_path = os.path.abspath(project_path)
+    with _indexes_lock:
+        if project_path not in _indexes:
+            index = TrigramIndex(project_path)
+            if not index.count():
+                if backfill(index, project_path):
+                    print("Built the trigram index from the indexed files")
+            _indexes[project_path] = index
+        return _indexes[project_path]
@@ -1,11 +1,15 @@
 from ingestion.chunking.base import Chunk
-from ingestion.chunking.text import chunk_text
-from ingestion.chunking.code import chunk_python_code
+from ingestion.chunking.text import chunk_text, chunk_pages
+from ingestion.chunking.code import chunk_python_code, parse_python
+from ingestion.chunking.brace import chunk_brace_code
 from ingestion.chunking.router import chunk_document
 
 __all__ = [
     "Chunk",
     "chunk_text",
+    "chunk_pages",
     "chunk_python_code",
+    "parse_python",
+    "chunk_brace_code",
     "chunk_document",
 ]
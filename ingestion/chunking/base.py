@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, List
 
 @dataclass
 class Chunk:
@@ -7,3 +7,184 @@ class Chunk:
     metadata: Dict
     start_line: int = 0
     end_line: int = 0
+
+@dataclass
+class Span:
+    """A range of source lines (1-based, inclusive) that becomes one chunk."""
+    start: int
+    end: int
+    kind: str = "block"
+    symbol: str = ""
+    context: str = ""        # enclosing signature(s), prepended to the chunk text
+    mergeable: bool = True
+
+class LineIndex:
+    """Splits a text into lines once and answers range sizes in O(1)."""
+
+    def __init__(self, text: str):
+        self.lines = text.splitlines()
+        self.offsets = [0]
+        for line in self.lines:
+            self.offsets.append(self.offsets[-1] + len(line) + 1)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def size(self, start: int, end: int) -> int:
+        return self.offsets[end] - self.offsets[start - 1]
+
+    def text(self, start: int, end: int) -> str:
+        return "\n".join(self.lines[start - 1 : end])
+
+def split_span(index: LineIndex, span: Span, max_chars: int) -> List[Span]:
+    """Cuts a span into consecutive line windows of at most `max_chars` each (context included)."""
+    budget = max(1, max_chars - len(span.context))
+    pieces = []
+    start = span.start
+    for line in range(span.start, span.end + 1):
+        if line > start and index.size(start, line) > budget:
+            pieces.append(Span(start, line - 1, span.kind, span.symbol, span.context, mergeable=False))
+            start = line
+    pieces.append(Span(start, span.end, span.kind, span.symbol, span.context, mergeable=False))
+    return pieces
+
+def merge_spans(index: LineIndex, spans: List[Span], min_chars: int, max_chars: int) -> List[Span]:
+    """Merges adjacent small spans that share a context while the result stays under `max_chars`."""
+    merged = []
+    for span in spans:
+        if merged:
+            last = merged[-1]
+            small = index.size(last.start, last.end) < min_chars or index.size(span.start, span.end) < min_chars
+            if (
+                small
+                and last.mergeable
+                and span.mergeable
+                and last.context == span.context
+                and index.size(last.start, span.end) + len(span.context) <= max_chars
+            ):
+                kind = last.kind if last.kind == span.kind else "block"
+                symbol = ", ".join(s for s in (last.symbol, span.symbol) if s)
+                merged[-1] = Span(last.start, span.end, kind, symbol, last.context)
+                continue
+        merged.append(span)
+    return merged
+
+def spans_to_chunks(index: LineIndex, spans: List[Span], metadata: Dict) -> List[Chunk]:
+    chunks = []
+    for span in spans:
+        text = index.text(span.start, span.end)
+        if not text.strip():
+            continue
+        chunk_metadata = metadata.copy()
+        chunk_metadata["chunk_type"] = span.kind
+        if span.symbol:
+            chunk_metadata["symbol"] = span.symbol
+        chunks.append(
+            Chunk(
+                content=span.context + text,
+                metadata=chunk_metadata,
+                start_line=span.start,
+                end_line=span.end,
+            )
+        )
+    return chunks
+
+def window_chunks(text: str, metadata: Dict, max_chars: int, index: LineIndex = None) -> List[Chunk]:
+    """Fallback chunking: consecutive line windows of at most `max_chars`."""
+    index = index or LineIndex(text)
+    if not len(index):
+        return []
+    return spans_to_chunks(index, split_span(index, Span(1, len(index)), max_chars), metadata)
+
+@dataclass
+class Node:
+    """A syntactic unit (statement, function, class) found by a language-specific parser."""
+    start: int
+    end: int
+    kind: str = "block"          # "class", "function", "block", or a language-specific kind
+    name: str = ""
+    signature: tuple = (0, 0)    # lines of the signature, carried as context by the node's pieces
+    body_start: int = 0          # first line of the body; 0 if the node can't be split along its body
+    children: list = field(default_factory=list)
+
+class StructuralChunker:
+    """
+    Turns a tree of Nodes into spans that cover every line.
+
+    Each node becomes one span, with the comments and blank lines before it.
+    Spans over `max_chars` are split along their body: a class into its
+    members, a function into its statements, anything else into line
+    windows. Pieces cut out of a node carry its signature as context.
+    Adjacent spans under `min_chars` are merged with their siblings.
+    """
+
+    def __init__(self, index: LineIndex, max_chars: int, min_chars: int):
+        self.index = index
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+
+    def chunk(self, nodes: List[Node], metadata: Dict) -> List[Chunk]:
+        if not len(self.index):
+            return []
+        if nodes:
+            spans = self.body_spans(nodes, 1, len(self.index), "", "")
+        else:
+            spans = split_span(self.index, Span(1, len(self.index)), self.max_chars)
+        return spans_to_chunks(self.index, spans, metadata)
+
+    def body_spans(self, nodes: List[Node], start: int, end: int, context: str, parent: str) -> List[Span]:
+        """Covers lines start..end with one span per node, expanding oversized ones."""
+        # Nodes sharing a line can't be cut apart
+        units = []
+        for node in nodes:
+            if units and node.start <= units[-1].end:
+                last = units[-1]
+                units[-1] = Node(last.start, max(last.end, node.end), last.kind, last.name)
+            else:
+                units.append(node)
+
+        spans = []
+        for i, node in enumerate(units):
+            node_start = start if i == 0 else units[i - 1].end + 1
+            node_end = end if i == len(units) - 1 else node.end
+            spans.extend(self.node_spans(node, node_start, node_end, context, parent))
+        return merge_spans(self.index, spans, self.min_chars, self.max_chars)
+
+    def node_spans(self, node: Node, start: int, end: int, context: str, parent: str) -> List[Span]:
+        nested = bool(parent)
+        symbol = f"{parent}.{node.name}" if parent and node.name else node.name
+        if node.kind == "function":
+            kind = "method" if nested else "function"
+        elif node.kind == "block":
+            kind = "block" if nested else "module"
+        else:
+            kind = node.kind
+        span = Span(start, end, kind, symbol, context)
+
+        if self.index.size(start, end) + len(context) <= self.max_chars:
+            return [span]
+        if not node.body_start or not node.children or not start < node.body_start <= end:
+            return split_span(self.index, span, self.max_chars)
+
+        header = Span(start, node.body_start - 1, kind, symbol, context, mergeable=False)
+        signature = self.index.text(*node.signature)
+        if len(signature) > self.max_chars // 4:
+            signature = self.index.lines[node.signature[1] - 1]
+        inner_context = context + signature + "\n"
+
+        children = self.body_spans(
+            node.children, node.body_start, end, inner_context, symbol if node.kind == "class" else parent
+        )
+        if node.kind == "function":
+            for child in children:
+                child.kind = kind
+                child.symbol = symbol
+
+        # The first piece holds the header itself rather than repeating it as context,
+        # so it is labelled as the node rather than as its first member
+        first = children[0]
+        if self.index.size(start, first.end) + len(context) <= self.max_chars:
+            children[0] = Span(start, first.end, kind, symbol, context, mergeable=False)
+            return children
+        # A long preamble (comments, or code before the node's largest block) is split like any oversized span
+        return split_span(self.index, header, self.max_chars) + children
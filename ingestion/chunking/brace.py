@@ -0,0 +1,290 @@
+"""
+Structure-aware chunker for brace-delimited languages (JavaScript,
+TypeScript, Java, C++ and the <script> section of Vue files).
+
+A single pass over the source tracks strings, template literals, comments
+and bracket nesting, and records every statement together with the block
+it owns (a class, function or object body). Statements end at `;`, at a
+`}` that closes their block, or at a `,` directly inside a block, and are
+kept on line boundaries. The resulting tree goes through the same
+StructuralChunker as Python, so chunks follow functions, classes and
+methods with the same size caps. Unbalanced input raises and falls back to
+line windows.
+"""
+
+import re
+from core.config import CHUNK_MAX_CHARS, CHUNK_MIN_CHARS
+from .base import LineIndex, Node, StructuralChunker, window_chunks
+
+BRACE_LANGUAGES = {"javascript", "typescript", "java", "cpp", "vue"}
+
+_CLOSERS = {")": "(", "]": "[", "}": "{"}
+_CLASS_RE = re.compile(r"\b(?:class|interface|enum|struct|namespace|trait|record)\s+([A-Za-z_$][\w$]*)")
+_FUNCTION_RE = re.compile(r"\bfunction\b\s*\*?\s*([A-Za-z_$][\w$]*)")
+_ASSIGNED_RE = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(.*)", re.S
+)
+_CALL_RE = re.compile(r"(@?)([A-Za-z_$~][\w$:~]*)\s*(?:<[^<>;{}]*>)?\s*\(")
+_CONTROL = {
+    "if", "for", "while", "switch", "catch", "return", "else", "do", "try",
+    "new", "await", "typeof", "sizeof", "with", "super", "this",
+}
+_STATEMENT_START_RE = re.compile(
+    r"\s*(?:import|export|const|let|var|function|class|interface|type|enum|async|@)\b"
+)
+_CONTINUATION = set(",([{=+-*/%&|^!?:.<>\\")
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+_REGEX_KEYWORD_RE = re.compile(r"\b(?:return|typeof|case|yield|void|in|of)\s*$")
+_SCRIPT_OPEN_RE = re.compile(r"^\s*<script\b[^>]*>\s*$", re.I)
+_SCRIPT_CLOSE_RE = re.compile(r"^\s*</script>\s*$", re.I)
+
+class _Statement:
+    __slots__ = ("start", "end", "body")
+
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.body = None
+
+class _Frame:
+    """An open bracket; `{` frames (and the root) also collect the statements inside them."""
+    __slots__ = ("char", "line", "close_line", "statements", "current", "terminated", "owner")
+
+    def __init__(self, char, line, owner=None):
+        self.char = char
+        self.line = line
+        self.close_line = line
+        self.statements = []
+        self.current = None
+        self.terminated = False
+        self.owner = owner
+
+    def begin(self, line):
+        if self.current is None:
+            self.current = _Statement(line)
+
+    def close_statement(self, end):
+        if self.current is not None:
+            self.current.end = max(self.current.start, end)
+            self.statements.append(self.current)
+            self.current = None
+        self.terminated = False
+
+def _ends_statement(line: str, next_line: str) -> bool:
+    """Semicolon-free code: a line ends a statement when the next one clearly starts a new one."""
+    code = line.split("//", 1)[0].rstrip()
+    return bool(code) and code[-1] not in _CONTINUATION and bool(_STATEMENT_START_RE.match(next_line))
+
+def _regex_end(line: str, i: int) -> int:
+    """Index just past a regex literal starting at line[i], or -1 if there isn't one on this line."""
+    j, in_class = i + 1, False
+    while j < len(line):
+        c = line[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            j += 1
+            while j < len(line) and line[j].isalpha():
+                j += 1
+            return j
+        j += 1
+    return -1
+
+def _scan(lines, first, last, templates: bool, preprocessor: bool = False):
+    """Returns the top-level statements of lines first..last (1-based, inclusive)."""
+    root = _Frame("root", first)
+    stack = [root]
+    in_comment = False
+    in_template = False
+    # Last significant character, to tell a regex literal from a division
+    prev = ""
+
+    def block():
+        # Innermost frame that collects statements
+        for frame in reversed(stack):
+            if frame.char in ("{", "root"):
+                return frame
+
+    for line_no in range(first, last + 1):
+        line = lines[line_no - 1]
+        i, n = 0, len(line)
+        top = stack[-1]
+        if preprocessor and not in_comment and not in_template and top.char in ("{", "root"):
+            stripped = line.lstrip()
+            if stripped.startswith("#") and top.current is None:
+                # Preprocessor directive: a statement of its own (continued by a trailing backslash)
+                top.begin(line_no)
+                if not stripped.rstrip().endswith("\\"):
+                    top.terminated = True
+                i = n
+
+        while i < n:
+            c = line[i]
+            if in_comment:
+                end = line.find("*/", i)
+                if end < 0:
+                    break
+                in_comment = False
+                i = end + 2
+                continue
+            if in_template:
+                if c == "\\":
+                    i += 2
+                    continue
+                if c == "`":
+                    in_template = False
+                elif c == "$" and line.startswith("${", i):
+                    stack.append(_Frame("${", line_no))
+                    in_template = False
+                    i += 2
+                    continue
+                i += 1
+                continue
+
+            if c in " \t\r":
+                i += 1
+                continue
+            if c == "/" and line.startswith("//", i):
+                break
+            if c == "/" and line.startswith("/*", i):
+                in_comment = True
+                i += 2
+                continue
+            if c == "/" and templates and (prev in _REGEX_PRECEDERS or _REGEX_KEYWORD_RE.search(line, 0, i)):
+                end = _regex_end(line, i)
+                if end > 0:
+                    block().begin(line_no)
+                    prev = "/"
+                    i = end
+                    continue
+            prev = c
+
+            frame = block()
+            frame.begin(line_no)
+
+            if c in "\"'":
+                # Plain strings can't span lines; an unmatched quote ends at the line break
+                j = i + 1
+                while j < n and line[j] != c:
+                    j += 2 if line[j] == "\\" else 1
+                i = j + 1
+                continue
+            if c == "`" and templates:
+                in_template = True
+            elif c in "({[":
+                new_frame = _Frame(c, line_no)
+                if c == "{":
+                    new_frame.owner = frame.current
+                stack.append(new_frame)
+            elif c in ")]}":
+                opened = stack.pop() if len(stack) > 1 else None
+                if opened is None:
+                    raise ValueError(f"unbalanced '{c}' at line {line_no}")
+                if opened.char == "${" and c == "}":
+                    in_template = True
+                elif opened.char != _CLOSERS[c]:
+                    raise ValueError(f"mismatched '{c}' at line {line_no}")
+                elif c == "}":
+                    opened.close_line = line_no
+                    opened.close_statement(line_no - 1 if line_no > opened.line else line_no)
+                    owner = opened.owner
+                    if owner is not None:
+                        if owner.body is None or (line_no - opened.line) > (owner.body.close_line - owner.body.line):
+                            owner.body = opened
+                    if stack[-1].char in ("{", "root"):
+                        stack[-1].terminated = True
+            elif c == ";" or (c == "," and stack[-1].char == "{"):
+                if stack[-1].char in ("{", "root"):
+                    stack[-1].terminated = True
+            i += 1
+
+        top = stack[-1]
+        if in_comment or in_template or top.char not in ("{", "root") or top.current is None:
+            continue
+        if top.terminated or _ends_statement(line, lines[line_no] if line_no < last else ""):
+            top.close_statement(line_no)
+
+    if len(stack) > 1 or in_template:
+        raise ValueError("unbalanced brackets at end of input")
+    root.close_statement(last)
+    return root.statements
+
+def _classify(header: str, has_body: bool):
+    match = _CLASS_RE.search(header)
+    if match:
+        return "class", match.group(1)
+    match = _FUNCTION_RE.search(header)
+    if match:
+        return "function", match.group(1)
+    match = _ASSIGNED_RE.match(header)
+    if match:
+        value = match.group(2).lstrip()
+        if "=>" in value or value.startswith(("function", "async")):
+            return "function", match.group(1)
+        return "block", match.group(1)
+    if has_body:
+        for call in _CALL_RE.finditer(header):
+            name = call.group(2)
+            if not call.group(1) and name not in _CONTROL:
+                return "function", name
+    return "block", ""
+
+def _to_nodes(statements, lines):
+    nodes = []
+    for stmt in statements:
+        body = stmt.body
+        header_end = body.line if body is not None else stmt.start
+        header = "\n".join(lines[stmt.start - 1 : min(header_end, stmt.start + 10)])
+        kind, name = _classify(header[:1000], body is not None)
+        node = Node(stmt.start, stmt.end, kind, name)
+        if body is not None and body.statements and stmt.start <= body.line < body.close_line:
+            node.signature = (stmt.start, body.line)
+            node.body_start = body.line + 1
+            node.children = _to_nodes(body.statements, lines)
+        nodes.append(node)
+    return nodes
+
+def _vue_nodes(lines, templates):
+    """Markup before and after the <script> block stays as plain nodes; the script is parsed."""
+    open_line = close_line = None
+    for line_no, line in enumerate(lines, start=1):
+        if open_line is None and _SCRIPT_OPEN_RE.match(line):
+            open_line = line_no
+        elif open_line is not None and _SCRIPT_CLOSE_RE.match(line):
+            close_line = line_no
+            break
+    if open_line is None or close_line is None:
+        raise ValueError("no <script> block")
+
+    nodes = [Node(1, open_line, "markup")]
+    if close_line - open_line > 1:
+        nodes.extend(_to_nodes(_scan(lines, open_line + 1, close_line - 1, templates), lines))
+    nodes.append(Node(close_line, len(lines), "markup"))
+    return nodes
+
+def chunk_brace_code(
+    code: str,
+    metadata,
+    language: str,
+    max_chars: int = CHUNK_MAX_CHARS,
+    min_chars: int = CHUNK_MIN_CHARS,
+):
+    index = LineIndex(code)
+    if not len(index):
+        return []
+    templates = language in ("javascript", "typescript", "vue")
+    try:
+        if language == "vue":
+            nodes = _vue_nodes(index.lines, templates)
+        else:
+            nodes = _to_nodes(_scan(index.lines, 1, len(index), templates, language == "cpp"), index.lines)
+    except ValueError:
+        # fallback chunking
+        return window_chunks(code, metadata, max_chars, index)
+
+    return StructuralChunker(index, max_chars, min_chars).chunk(nodes, metadata)
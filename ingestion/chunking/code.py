@@ -1,41 +1,61 @@
+"""
+Hierarchical Python chunker.
+
+The module's statements are turned into a tree of Nodes and handed to the
+shared StructuralChunker: every line is covered, classes over
+`CHUNK_MAX_CHARS` are split into methods that carry the class signature as
+context, oversized functions are split along their statements, and small
+siblings are merged up to the size cap.
+
+The source is split into lines once and sizes are looked up from prefix
+sums, so chunking stays linear in the size of the file.
+"""
+
 import ast
 import warnings
-from .base import Chunk
+from typing import Optional
+from core.config import CHUNK_MAX_CHARS, CHUNK_MIN_CHARS
+from .base import LineIndex, Node, StructuralChunker, window_chunks
 
-def chunk_python_code(code: str, metadata):
-    chunks = []
+def _to_nodes(statements):
+    nodes = []
+    for stmt in statements:
+        # Decorators belong to the definition they decorate
+        start = min([stmt.lineno] + [d.lineno for d in getattr(stmt, "decorator_list", [])])
+        node = Node(start, stmt.end_lineno or stmt.lineno)
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            node.kind = "class" if isinstance(stmt, ast.ClassDef) else "function"
+            node.name = stmt.name
+            body_start = stmt.body[0].lineno
+            if body_start > stmt.lineno:
+                node.signature = (stmt.lineno, body_start - 1)
+                node.body_start = body_start
+                node.children = _to_nodes(stmt.body)
+        nodes.append(node)
+    return nodes
+
+def parse_python(code: str) -> Optional[ast.Module]:
+    """Parses Python source, returning None when it is not valid Python."""
     try:
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", SyntaxWarning)
-            tree = ast.parse(code)
-
-        for node in tree.body:
-            if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
-                start_line = node.lineno
-                end_line = getattr(node, "end_lineno", start_line)
-                chunk_text = "\n".join(
-                    code.splitlines()[start_line - 1 : end_line]
-                )
-                chunks.append(
-                    Chunk(
-                        content=chunk_text,
-                        metadata=metadata.copy(),
-                        start_line=start_line,
-                        end_line=end_line,
-                    )
-                )
+            return ast.parse(code)
     except Exception:
+        return None
+
+def chunk_python_code(
+    code: str,
+    metadata,
+    max_chars: int = CHUNK_MAX_CHARS,
+    min_chars: int = CHUNK_MIN_CHARS,
+    tree: ast.Module = None,
+):
+    """Chunks Python source; pass `tree` when the caller has already parsed it (e.g. for symbols)."""
+    index = LineIndex(code)
+    if tree is None:
+        tree = parse_python(code)
+    if tree is None:
         # fallback chunking
-        lines = code.splitlines()
-        chunk_size = 50
-        for i in range(0, len(lines), chunk_size):
-            chunks.append(
-                Chunk(
-                    content="\n".join(lines[i : i + chunk_size]),
-                    metadata=metadata.copy(),
-                    start_line=i + 1,
-                    end_line=min(i + chunk_size, len(lines)),
-                )
-            )
+        return window_chunks(code, metadata, max_chars, index)
 
-    return chunks
+    return StructuralChunker(index, max_chars, min_chars).chunk(_to_nodes(tree.body), metadata)
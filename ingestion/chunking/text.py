@@ -17,3 +17,15 @@ def chunk_text(text, metadata, chunk_size=500, overlap=50):
         )
         start += chunk_size - overlap
     return chunks
+
+def chunk_pages(pages, metadata, chunk_size=500, overlap=50):
+    """
+    Chunks a paged document (PDF, DOCX) page by page, recording each chunk's
+    1-based page number in its metadata.
+    """
+    chunks = []
+    for number, page in enumerate(pages, start=1):
+        if not page.strip():
+            continue
+        chunks.extend(chunk_text(page, {**metadata, "page": number}, chunk_size, overlap))
+    return chunks
@@ -0,0 +1,484 @@
+"""
+Pipelined ingestion engine.
+
+Files flow through three overlapping stages so the CPU keeps parsing while
+the embedding server is busy, and the embedding server keeps working while
+the vector store is written:
+
+1. prepare: a process pool reads, hashes and chunks each file
+2. embed:   a pool of threads diffs each file's chunks against the store and
+            sends only new chunks to the embedding model
+3. write:   a single writer thread batches vector store and state updates
+
+At most `max_in_flight` files are held between being read and being written,
+so a slow embedding server applies back-pressure to the file readers and peak
+memory depends on that window rather than on the size of the repository.
+"""
+
+import functools
+import hashlib
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from core.config import (
+    INDEX_WORKERS,
+    EMBED_WORKERS,
+    EMBED_BATCH_CHUNKS,
+    WRITE_BATCH_CHUNKS,
+    MAX_IN_FLIGHT_FILES,
+    GUARD_SAMPLE_BYTES,
+    MAX_DOCUMENT_KB,
+    PDF_PAGES_PER_TASK,
+)
+from ingestion.chunking import chunk_document, chunk_pages, chunk_python_code, parse_python
+from ingestion.loaders.base import SourceFile
+from ingestion.loaders.filesystem import build_document, decode_content
+from ingestion.loaders.guard import check_name, check_size, check_sample, detect_encoding
+from ingestion.loaders.document import (
+    is_document,
+    pdf_page_count,
+    extract_pages,
+    extract_pdf_pages,
+    load_cached_pages,
+    store_cached_pages,
+)
+from indexing.indexer import FileUpdate
+from indexing.state import FileStat
+from indexing.symbols import FileSymbols, extract_symbols
+from indexing.trigrams import file_trigrams
+
+_STOP = object()
+
+
+@dataclass
+class PreparedFile:
+    """Result of the prepare stage for a single file."""
+    abs_path: str
+    rel_path: str
+    file_hash: Optional[str] = None
+    stat: Optional[FileStat] = None
+    changed: bool = False
+    chunks: List = field(default_factory=list)
+    update: Optional[FileUpdate] = None
+    skip_reason: Optional[str] = None
+    error: Optional[str] = None
+    page_count: int = 0                       # set when a PDF's pages are left to extract in ranges
+    metadata: Optional[dict] = None           # extra chunk metadata, kept for those deferred PDFs
+    symbols: Optional[FileSymbols] = None     # set for Python files, from the chunker's parse
+    trigrams: Optional[bytes] = None          # for the grep index; unset for PDF/DOCX files
+
+
+@dataclass
+class IngestionStats:
+    indexed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    filtered: int = 0   # rejected by the loader guard (too large, binary, minified, generated)
+
+
+def prepare_file(
+    abs_path: str,
+    source_root: str,
+    known_hash: Optional[str] = None,
+    extra_metadata: Optional[dict] = None,
+    split_pages: bool = False,
+) -> PreparedFile:
+    """
+    Reads, hashes and chunks a file. Runs inside the prepare process pool.
+
+    The file is read exactly once; the same buffer is hashed and decoded. Its
+    stat is taken before the read so a concurrent edit shows up as a stat
+    mismatch on the next run. The loader guard looks at the name, the size
+    and a bounded prefix first, so junk files are rejected without being
+    read in full.
+
+    Args:
+        abs_path: Absolute path of the file
+        source_root: Project root the relative path is computed against
+        known_hash: Hash recorded at the last indexing; chunking is skipped when it matches
+            (pass None to re-chunk anyway, e.g. to extract missing symbols)
+        extra_metadata: Additional metadata attached to every chunk (e.g. repository info)
+        split_pages: Leave long, uncached PDFs to be extracted in page ranges
+            by the caller (`page_count` is set) instead of extracting them here
+
+    Returns:
+        PreparedFile: The chunks to embed, or an unchanged/skipped/error marker
+    """
+    rel_path = os.path.relpath(abs_path, source_root)
+    result = PreparedFile(abs_path=abs_path, rel_path=rel_path)
+    document = is_document(abs_path)
+    try:
+        with open(abs_path, "rb") as f:
+            result.stat = FileStat.from_stat(os.fstat(f.fileno()))
+            if document:
+                size_reason = check_size(result.stat.size, MAX_DOCUMENT_KB * 1024)
+            else:
+                size_reason = check_size(result.stat.size)
+            result.skip_reason = check_name(abs_path) or size_reason
+            if result.skip_reason:
+                return result
+            sample = f.read(GUARD_SAMPLE_BYTES)
+            # PDF and DOCX files are binary by nature
+            result.skip_reason = None if document else check_sample(abs_path, sample)
+            if result.skip_reason:
+                return result
+            data = sample + f.read()
+        result.file_hash = hashlib.sha256(data).hexdigest()
+        if result.file_hash == known_hash:
+            return result
+
+        result.changed = True
+        if document:
+            pages = load_cached_pages(source_root, result.file_hash)
+            if pages is None:
+                if split_pages and abs_path.lower().endswith(".pdf"):
+                    page_count = pdf_page_count(abs_path)
+                    if page_count > PDF_PAGES_PER_TASK:
+                        result.page_count = page_count
+                        result.metadata = extra_metadata
+                        return result
+                pages = extract_pages(abs_path)
+                store_cached_pages(source_root, result.file_hash, pages)
+            result.chunks = chunk_document_pages(result, pages, source_root, extra_metadata)
+            return result
+
+        result.trigrams = file_trigrams(data)
+        content = decode_content(data, detect_encoding(sample))
+        doc = build_document(abs_path, source_root, content, extra_metadata)
+        if doc.metadata.get("language") == "python":
+            # One parse feeds both the chunker and the symbol table
+            tree = parse_python(doc.content)
+            result.chunks = chunk_python_code(doc.content, doc.metadata, tree=tree)
+            result.symbols = extract_symbols(tree) if tree is not None else FileSymbols()
+        else:
+            result.chunks = chunk_document(doc)
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def chunk_document_pages(prepared: PreparedFile, pages: List[str], source_root: str, extra_metadata=None) -> list:
+    """Chunks the extracted pages of a PDF or DOCX file, tagging each chunk with its page."""
+    doc = build_document(prepared.abs_path, source_root, "", extra_metadata)
+    return chunk_pages(pages, doc.metadata)
+
+
+class IngestionEngine:
+    """
+    Runs the prepare → embed → write pipeline over a set of files.
+
+    Engines indexing several projects at once can share one prepare pool
+    (`executor`, left running when the engine is done) and one embedding
+    model; `label` prefixes their progress messages.
+    """
+
+    def __init__(
+        self,
+        indexer,
+        state_manager,
+        workers: int = None,
+        embed_workers: int = EMBED_WORKERS,
+        embed_batch_chunks: int = EMBED_BATCH_CHUNKS,
+        write_batch_chunks: int = WRITE_BATCH_CHUNKS,
+        max_in_flight: int = MAX_IN_FLIGHT_FILES,
+        executor: ProcessPoolExecutor = None,
+        label: str = None,
+    ):
+        self.indexer = indexer
+        self.state_manager = state_manager
+        self.workers = max(1, workers or INDEX_WORKERS)
+        self.embed_workers = max(1, embed_workers)
+        self.embed_batch_chunks = embed_batch_chunks
+        self.write_batch_chunks = write_batch_chunks
+        self.max_in_flight = max(1, max_in_flight)
+        self.shared_executor = executor
+        self.prefix = f"[{label}] " if label else ""
+
+        self.stats = IngestionStats()
+        self._stats_lock = threading.Lock()
+        self._embed_queue = None
+        self._write_queue = None
+        self._window = None
+        self._executor = None
+        self._source_root = None
+        self._pending = 0
+        self._pending_done = threading.Condition()
+
+    def run(self, files: Iterable[SourceFile], source_root: str) -> IngestionStats:
+        """
+        Indexes every changed file in `files`.
+
+        Args:
+            files: File descriptors to consider, typically from `load_folder`
+            source_root: Project root used for relative paths
+
+        Returns:
+            IngestionStats: Counts of indexed, skipped and failed files
+        """
+        self.stats = IngestionStats()
+        # The window bounds memory, so the queues themselves can be unbounded
+        self._embed_queue = queue.Queue()
+        self._write_queue = queue.Queue()
+        self._window = threading.BoundedSemaphore(self.max_in_flight)
+        self._source_root = source_root
+        # One bulk read instead of a query per file
+        self.state_manager.prefetch_all()
+
+        executor = self.shared_executor
+        if executor is None and self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            # Fork the worker processes before this process starts its own threads
+            executor.submit(os.getpid).result()
+
+        embed_threads = [
+            threading.Thread(target=self._embed_loop, name=f"cortex-embed-{i}", daemon=True)
+            for i in range(self.embed_workers)
+        ]
+        self._executor = executor
+        writer = threading.Thread(target=self._write_loop, name="cortex-writer", daemon=True)
+        for thread in embed_threads:
+            thread.start()
+        writer.start()
+
+        try:
+            for source_file in files:
+                # Untouched files are recognised from their stat alone, unless
+                # they were indexed before their symbols were recorded
+                needs_symbols = self._needs_symbols(source_file.abs_path)
+                if not needs_symbols and self._is_unchanged(source_file.abs_path):
+                    with self._stats_lock:
+                        self.stats.skipped += 1
+                    continue
+
+                self._window.acquire()
+                args = (
+                    source_file.abs_path,
+                    source_root,
+                    None if needs_symbols else self._known_hash(source_file.abs_path),
+                    source_file.metadata,
+                    executor is not None,
+                )
+                if executor is None:
+                    self._dispatch(prepare_file(*args))
+                else:
+                    self._submit(self._on_prepared, prepare_file, *args)
+        finally:
+            if executor is not None:
+                # Waits for every pending prepare job and its callback
+                with self._pending_done:
+                    self._pending_done.wait_for(lambda: self._pending == 0)
+                if executor is not self.shared_executor:
+                    executor.shutdown()
+            for _ in embed_threads:
+                self._embed_queue.put(_STOP)
+            for thread in embed_threads:
+                thread.join()
+            self._write_queue.put(_STOP)
+            writer.join()
+            self.state_manager.flush()
+
+        return self.stats
+
+    def _submit(self, callback, fn, *args):
+        """Runs `fn` on the prepare pool; `run` waits for its callback before stopping."""
+        with self._pending_done:
+            self._pending += 1
+        self._executor.submit(fn, *args).add_done_callback(callback)
+
+    def _on_prepared(self, future):
+        try:
+            try:
+                prepared = future.result()
+            except Exception as e:
+                print(f"{self.prefix}Error preparing file: {e}")
+                self._finish(failed=1)
+                return
+            self._dispatch(prepared)
+        finally:
+            with self._pending_done:
+                self._pending -= 1
+                self._pending_done.notify_all()
+
+    def _is_unchanged(self, abs_path):
+        try:
+            return self.state_manager.is_unchanged(abs_path)
+        except Exception:
+            return False
+
+    def _needs_symbols(self, abs_path):
+        try:
+            return self.state_manager.needs_symbols(abs_path)
+        except Exception:
+            return False
+
+    def _known_hash(self, abs_path):
+        try:
+            return self.state_manager.get_stored_hash(abs_path)
+        except Exception:
+            return None
+
+    def _finish(self, files: int = 1, **deltas):
+        """Records the outcome of `files` files and frees their in-flight slots."""
+        with self._stats_lock:
+            for name, value in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+        for _ in range(files):
+            self._window.release()
+
+    def _dispatch(self, prepared: PreparedFile):
+        if prepared.error:
+            print(f"{self.prefix}Error reading {prepared.abs_path}: {prepared.error}")
+            self._finish(failed=1)
+        elif prepared.page_count:
+            self._extract_page_ranges(prepared)
+        elif prepared.skip_reason:
+            print(f"{self.prefix}Skipped {prepared.rel_path}: {prepared.skip_reason}")
+            record = self.state_manager.get_record(prepared.abs_path)
+            if record is not None and not record.skip_reason:
+                # Previously indexed: an empty chunk list removes its chunks
+                self._embed_queue.put(prepared)
+            else:
+                self.state_manager.update_state(
+                    prepared.abs_path, None, prepared.stat, prepared.skip_reason
+                )
+                self._finish(filtered=1)
+        elif not prepared.changed:
+            # Same content under a new stat (e.g. touched): refresh the stat only
+            self.state_manager.update_state(prepared.abs_path, prepared.file_hash, prepared.stat)
+            self._finish(skipped=1)
+        else:
+            print(f"{self.prefix}Indexing: {prepared.rel_path}")
+            self._embed_queue.put(prepared)
+
+    def _extract_page_ranges(self, prepared: PreparedFile):
+        """
+        Extracts a long PDF in page ranges across the prepare pool, then
+        chunks it and passes it on as if it had been prepared in one piece.
+        """
+        ranges = [
+            (first, min(first + PDF_PAGES_PER_TASK - 1, prepared.page_count))
+            for first in range(1, prepared.page_count + 1, PDF_PAGES_PER_TASK)
+        ]
+        results = [None] * len(ranges)
+        remaining = [len(ranges)]
+        lock = threading.Lock()
+
+        def on_range(index, future):
+            try:
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    prepared.error = prepared.error or str(e)
+                with lock:
+                    remaining[0] -= 1
+                    done = remaining[0] == 0
+                if done:
+                    self._on_pages_extracted(prepared, results)
+            finally:
+                with self._pending_done:
+                    self._pending -= 1
+                    self._pending_done.notify_all()
+
+        for index, (first, last) in enumerate(ranges):
+            self._submit(functools.partial(on_range, index), extract_pdf_pages, prepared.abs_path, first, last)
+
+    def _on_pages_extracted(self, prepared: PreparedFile, ranges: List[List[str]]):
+        if not prepared.error:
+            pages = [page for pages in ranges for page in pages]
+            try:
+                store_cached_pages(self._source_root, prepared.file_hash, pages)
+                prepared.chunks = chunk_document_pages(prepared, pages, self._source_root, prepared.metadata)
+            except Exception as e:
+                prepared.error = str(e)
+        prepared.page_count = 0
+        self._dispatch(prepared)
+
+    def _embed_loop(self):
+        stopping = False
+        while not stopping:
+            item = self._embed_queue.get()
+            if item is _STOP:
+                return
+
+            # Coalesce small files into one embedding request
+            batch = [item]
+            size = len(item.chunks)
+            while size < self.embed_batch_chunks:
+                try:
+                    item = self._embed_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item.chunks)
+
+            try:
+                # Only chunks whose content is not stored yet need embeddings
+                for prepared in batch:
+                    diff = self.indexer.diff_file(prepared.rel_path, prepared.chunks)
+                    prepared.update = FileUpdate(prepared.rel_path, prepared.chunks, diff, trigrams=prepared.trigrams)
+                texts = [
+                    prepared.chunks[i].content
+                    for prepared in batch
+                    for i in prepared.update.diff.new
+                ]
+                embeddings = self.indexer.embedding_model.embed(texts) if texts else []
+            except Exception as e:
+                for prepared in batch:
+                    print(f"{self.prefix}Error embedding {prepared.rel_path}: {e}")
+                self._finish(len(batch), failed=len(batch))
+                continue
+
+            offset = 0
+            for prepared in batch:
+                count = len(prepared.update.diff.new)
+                prepared.update.embeddings = embeddings[offset : offset + count]
+                offset += count
+                self._write_queue.put(prepared)
+
+    def _write_loop(self):
+        pending = []
+        size = 0
+        while True:
+            item = self._write_queue.get()
+            if item is _STOP:
+                self._flush(pending)
+                return
+            pending.append(item)
+            size += len(item.chunks)
+            if size >= self.write_batch_chunks or self._write_queue.empty():
+                self._flush(pending)
+                pending = []
+                size = 0
+
+    def _flush(self, files: List[PreparedFile]):
+        if not files:
+            return
+        try:
+            self.indexer.apply_updates(prepared.update for prepared in files)
+        except Exception as e:
+            print(f"{self.prefix}Error writing {len(files)} files to the vector store: {e}")
+            self._finish(len(files), failed=len(files))
+            return
+
+        for prepared in files:
+            self.state_manager.update_state(
+                prepared.abs_path, prepared.file_hash, prepared.stat, prepared.skip_reason
+            )
+            self.state_manager.update_symbols(prepared.abs_path, prepared.symbols)
+        filtered = sum(1 for prepared in files if prepared.skip_reason)
+        self._finish(
+            len(files),
+            indexed=len(files) - filtered,
+            filtered=filtered,
+            chunks=sum(len(prepared.chunks) for prepared in files),
+            embedded=sum(len(prepared.update.diff.new) for prepared in files),
+        )
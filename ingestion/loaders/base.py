@@ -1,7 +1,15 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict
 
 @dataclass
 class IngestedDocument:
     content: str
     metadata: Dict
+
+@dataclass
+class SourceFile:
+    """Lightweight descriptor of a file to ingest; content is read later, once."""
+    abs_path: str
+    rel_path: str
+    size: int = 0
+    metadata: Dict = field(default_factory=dict)
@@ -1,16 +1,94 @@
+"""
+Text extraction for PDF and DOCX documents.
+
+Documents are extracted page by page, so chunks can carry the page they came
+from. PDF extraction is CPU-heavy, so a large PDF is split into page ranges
+that the ingestion engine spreads across its process pool. Extracted pages
+are cached under `.cortex/documents/`, keyed by the file's hash, so an
+unchanged document is never parsed twice.
+"""
+
+import json
+import os
+from typing import List, Optional
+
 import pdfplumber
 from docx import Document as DocxDocument
+from docx.oxml.ns import qn
+
+from core.config import DOCUMENT_EXTENSIONS, get_document_cache_dir
 from .base import IngestedDocument
 
-def load_pdf(path: str):
-    docs = []
+def is_document(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in DOCUMENT_EXTENSIONS
+
+def pdf_page_count(path: str) -> int:
     with pdfplumber.open(path) as pdf:
-        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-    docs.append(
-        IngestedDocument(
-            content=text,
-            metadata={"type": "pdf", "path": path}
-        )
-    )
-    return docs
+        return len(pdf.pages)
+
+def extract_pdf_pages(path: str, first: int = 1, last: int = None) -> List[str]:
+    """
+    Extracts the text of pages `first` to `last` (1-based, inclusive) of a PDF.
+
+    Only the requested pages are parsed, so ranges of one file can be
+    extracted by several processes at once.
+    """
+    pages = list(range(first, last + 1)) if last else None
+    with pdfplumber.open(path, pages=pages) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+def extract_docx_pages(path: str) -> List[str]:
+    """
+    Extracts the text of a DOCX file, split where Word broke pages when the
+    file was last saved (or at explicit page breaks).
+
+    Tables are read in document order, one row per line.
+    """
+    pages = [[]]
+    for block in DocxDocument(path).iter_inner_content():
+        if hasattr(block, "rows"):
+            for row in block.rows:
+                pages[-1].append(" | ".join(cell.text for cell in row.cells))
+            continue
+        element = block._p
+        breaks = element.findall(".//" + qn("w:lastRenderedPageBreak"))
+        breaks += [
+            br for br in element.findall(".//" + qn("w:br")) if br.get(qn("w:type")) == "page"
+        ]
+        # A paragraph that crosses a page break is counted on the later page
+        if breaks and pages[-1]:
+            pages.append([])
+        pages[-1].append(block.text)
+    return ["\n".join(lines) for lines in pages]
+
+def extract_pages(path: str) -> List[str]:
+    """Extracts every page of a PDF or DOCX file in this process."""
+    if path.lower().endswith(".pdf"):
+        return extract_pdf_pages(path)
+    return extract_docx_pages(path)
+
+def load_cached_pages(project_path: str, file_hash: str) -> Optional[List[str]]:
+    """Returns the pages extracted earlier from a file with this hash, if cached."""
+    path = os.path.join(get_document_cache_dir(project_path), f"{file_hash}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def store_cached_pages(project_path: str, file_hash: str, pages: List[str]) -> None:
+    cache_dir = get_document_cache_dir(project_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{file_hash}.json")
+    # Written aside and renamed, so a concurrent reader never sees half a file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pages, f)
+    os.replace(tmp_path, path)
+
+def load_pdf(path: str):
+    """Loads a PDF as one document per page."""
+    return [
+        IngestedDocument(content=text, metadata={"type": "pdf", "path": path, "page": number})
+        for number, text in enumerate(extract_pdf_pages(path), start=1)
+    ]
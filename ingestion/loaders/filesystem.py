@@ -1,65 +1,93 @@
 import os
-from .base import IngestedDocument
+import stat
+from .base import IngestedDocument, SourceFile
 from datetime import datetime
+from typing import Iterator
 
-from core.config import CODE_EXTENSIONS, TEXT_EXTENSIONS, IGNORED_DIRS
+from core.config import CODE_EXTENSIONS, TEXT_EXTENSIONS, DOCUMENT_EXTENSIONS, GUARD_SAMPLE_BYTES
+from core.ignore import get_matcher
+from .guard import detect_encoding
 
-def read_file_robust(path: str) -> str:
+def decode_content(data: bytes, encoding: str = None) -> str:
     """
-    Reads a file using multiple encodings as fallback.
+    Decodes raw file bytes with an encoding detected once from their prefix.
+
+    Line endings are normalised the same way text-mode `open()` does.
     """
-    encodings = ["utf-8", "latin-1", "utf-16", "utf-16le", "utf-16be"]
-    
-    for enc in encodings:
-        try:
-            with open(path, "r", encoding=enc) as f:
-                return f.read()
-        except (UnicodeDecodeError, LookupError):
-            continue
-            
-    # Final fallback: read with utf-8 and ignore errors
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
+    if encoding is None:
+        encoding = detect_encoding(data[:GUARD_SAMPLE_BYTES])
+    return _normalize_newlines(data.decode(encoding, errors="replace"))
 
-def load_folder(path: str) -> list[IngestedDocument]:
-    documents = []
+def _normalize_newlines(text: str) -> str:
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+def read_file_robust(path: str) -> str:
+    """
+    Reads a file and decodes it with its detected encoding.
+    """
+    with open(path, "rb") as f:
+        return decode_content(f.read())
 
-    for root, dirs, files in os.walk(path):
-        # Skip ignored directories in-place
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS]
-        
-        for file in files:
-            # Skip hidden files
-            if file.startswith('.'):
-                continue
-                
-            ext = os.path.splitext(file)[1].lower()
-            full_path = os.path.join(root, file)
+def build_document(full_path: str, root: str, content: str, extra_metadata: dict = None) -> IngestedDocument:
+    """
+    Wraps file content in an IngestedDocument with the standard filesystem metadata.
+    """
+    ext = os.path.splitext(full_path)[1].lower()
+    if ext in CODE_EXTENSIONS:
+        doc_type = "code"
+    elif ext in DOCUMENT_EXTENSIONS:
+        doc_type = "document"
+    else:
+        doc_type = "text"
+    doc = IngestedDocument(
+        content=content,
+        metadata={
+            "source": "filesystem",
+            "path": os.path.relpath(full_path, root),
+            "abs_path": os.path.abspath(full_path),
+            "type": doc_type,
+            "language": CODE_EXTENSIONS.get(ext) or DOCUMENT_EXTENSIONS.get(ext, "unknown"),
+            "last_modified": datetime.fromtimestamp(
+                os.path.getmtime(full_path)
+            ).isoformat()
+        }
+    )
+    if extra_metadata:
+        doc.metadata.update(extra_metadata)
+    return doc
 
-            if ext not in CODE_EXTENSIONS and ext not in TEXT_EXTENSIONS:
-                continue
+def is_indexable(path: str) -> bool:
+    """Returns True for files with an extension the index handles."""
+    ext = os.path.splitext(path)[1].lower()
+    return ext in CODE_EXTENSIONS or ext in TEXT_EXTENSIONS or ext in DOCUMENT_EXTENSIONS
 
-            try:
-                content = read_file_robust(full_path)
+def load_folder(path: str, start: str = None, listing: list = None) -> Iterator[SourceFile]:
+    """
+    Walks a folder and yields a descriptor for every indexable file.
 
-                doc_type = "code" if ext in CODE_EXTENSIONS else "text"
+    Paths excluded by the project's ignore rules (defaults, `.gitignore`,
+    `.cortexignore`) are never visited. File contents are not read here, so
+    memory use does not grow with the size of the repository. `start` limits
+    the walk to a subfolder, with paths still relative to `path`. `listing`,
+    if given, receives the absolute path of every non-ignored file walked,
+    indexable or not, so the walk can also fill the file manifest.
+    """
+    for full_path in get_matcher(path).iter_files(start):
+        if listing is not None:
+            listing.append(full_path)
+        if not is_indexable(full_path):
+            continue
 
-                documents.append(
-                    IngestedDocument(
-                        content=content,
-                        metadata={
-                            "source": "filesystem",
-                            "path": os.path.relpath(full_path, path),
-                            "abs_path": os.path.abspath(full_path),
-                            "type": doc_type,
-                            "language": CODE_EXTENSIONS.get(ext, "unknown"),
-                            "last_modified": datetime.fromtimestamp(
-                                os.path.getmtime(full_path)
-                            ).isoformat()
-                        }
-                    )
-                )
-            except Exception as e:
-                print(f"Skipped {full_path}: {e}")
+        try:
+            st = os.stat(full_path)
+        except OSError as e:
+            print(f"Skipped {full_path}: {e}")
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
 
-    return documents
+        yield SourceFile(
+            abs_path=full_path,
+            rel_path=os.path.relpath(full_path, path),
+            size=st.st_size,
+        )
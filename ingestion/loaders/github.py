@@ -1,57 +1,195 @@
 import subprocess
 import os
 import shutil
+from dataclasses import dataclass, field
 from pathlib import Path
-from .filesystem import load_folder
+from typing import Iterator, Optional
+from .base import SourceFile
+from .filesystem import load_folder, is_indexable
 from core.config import get_global_repos_dir
+from core.ignore import IGNORE_FILES, get_matcher
 
-def load_github_repo(repo_url: str) -> tuple[list, str]:
+# State DB meta key holding the commit a cloned repository was last indexed at
+INDEXED_COMMIT_KEY = "indexed_commit"
+
+@dataclass
+class RepoChanges:
+    """What changed in a clone between the indexed commit and the new HEAD."""
+    updated: list = field(default_factory=list)   # SourceFile for each added or modified indexable file
+    listed: list = field(default_factory=list)    # absolute path of every added or modified file, for the manifest
+    deleted: list = field(default_factory=list)   # absolute paths
+    renamed: list = field(default_factory=list)   # (old absolute path, new absolute path)
+    metadata: dict = field(default_factory=dict)  # repository metadata attached to every chunk
+
+def _repo_name(repo_url: str) -> str:
+    return os.path.basename(repo_url.rstrip('/').replace('.git', ''))
+
+def clone_name(repo_url: str, name: str = None) -> str:
+    """Returns the folder name a repository is cloned to under the global repos directory."""
+    return name or _repo_name(repo_url)
+
+def _git(*args, cwd: Path = None):
+    command = ["git", "-C", str(cwd), *args] if cwd else ["git", *args]
+    return subprocess.run(command, check=True, capture_output=True, text=True)
+
+def clone_or_pull(repo_url: str, branch: str = None, subpath: str = None, name: str = None) -> Path:
     """
-    Clone a GitHub repository to persistent storage and load its files.
-    
+    Clones a repository to persistent storage, or pulls it if already cloned.
+
+    With `subpath` the clone is blobless and sparse: only the trees are
+    fetched up front, and file contents are downloaded for that folder alone.
+    Git's output is captured so several clones can run side by side.
+
     Args:
-        repo_url: GitHub repository URL (e.g., https://github.com/user/repo.git)
-    
+        repo_url: GitHub repository URL
+        branch: Branch or tag to check out (defaults to the remote's HEAD)
+        subpath: Folder within the repository to check out
+        name: Folder name under the repos directory (defaults to the repository name)
+
     Returns:
-        tuple: (list of documents, absolute path to cloned repo)
+        Path: Absolute path to the clone
     """
-    # Extract repo name from URL
-    repo_name = os.path.basename(repo_url.rstrip('/').replace('.git', ''))
-    
-    # Create persistent storage directory
-    cortex_home = get_global_repos_dir()
-    
-    clone_path = cortex_home / repo_name
-    
-    # Clone or update the repository
+    repo_name = clone_name(repo_url, name)
+    clone_path = get_global_repos_dir() / repo_name
+
     if clone_path.exists():
         print(f"Repository '{repo_name}' already exists at {clone_path}. Pulling latest changes...")
         try:
-            subprocess.run(
-                ["git", "-C", str(clone_path), "pull"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
+            if subpath:
+                _git("sparse-checkout", "set", subpath, cwd=clone_path)
+            _git("pull", cwd=clone_path)
         except subprocess.CalledProcessError as e:
             print(f"Warning: Could not pull latest changes: {e.stderr}")
-    else:
-        print(f"Cloning repository to {clone_path}...")
-        subprocess.run(
-            ["git", "clone", "--depth", "1", repo_url, str(clone_path)],
-            check=True
-        )
-    
-    # Load documents from the cloned repository
-    docs = load_folder(str(clone_path))
+        return clone_path
+
+    print(f"Cloning repository to {clone_path}...")
+    command = ["clone", "--depth", "1"]
+    if branch:
+        command += ["--branch", branch]
+    if subpath:
+        command += ["--filter=blob:none", "--sparse"]
+    try:
+        _git(*command, repo_url, str(clone_path))
+        if subpath:
+            _git("sparse-checkout", "set", subpath, cwd=clone_path)
+    except subprocess.CalledProcessError as e:
+        print(f"Error cloning {repo_url}: {e.stderr}")
+        raise
+    return clone_path
+
+def load_github_repo(repo_url: str, branch: str = None, subpath: str = None, name: str = None, listing: list = None) -> tuple[Iterator[SourceFile], str]:
+    """
+    Clone a GitHub repository to persistent storage and list its files.
     
-    # Add GitHub metadata
-    for doc in docs:
-        doc.metadata["source"] = "github"
-        doc.metadata["repo"] = repo_name
-        doc.metadata["repo_url"] = repo_url
+    Args:
+        repo_url: GitHub repository URL (e.g., https://github.com/user/repo.git)
+        branch: Branch or tag to check out
+        subpath: Only this folder of the repository is checked out and listed
+        name: Folder name under the repos directory
+        listing: Receives every non-ignored file walked (see `load_folder`)
     
-    return docs, str(clone_path)
+    Returns:
+        tuple: (iterator of file descriptors, absolute path to cloned repo)
+    """
+    clone_path = clone_or_pull(repo_url, branch, subpath, name)
+    start = str(clone_path / subpath) if subpath else None
+    return _with_github_metadata(load_folder(str(clone_path), start, listing), repo_url), str(clone_path)
+
+def _github_metadata(repo_url: str) -> dict:
+    return {
+        "source": "github",
+        "repo": _repo_name(repo_url),
+        "repo_url": repo_url,
+    }
+
+def _with_github_metadata(files: Iterator[SourceFile], repo_url: str) -> Iterator[SourceFile]:
+    """Tags each file descriptor with the repository it was cloned from."""
+    metadata = _github_metadata(repo_url)
+    for source_file in files:
+        source_file.metadata.update(metadata)
+        yield source_file
+
+def get_head_commit(clone_path: str) -> Optional[str]:
+    """Returns the commit SHA checked out in a clone, or None if it can't be read."""
+    try:
+        return subprocess.run(
+            ["git", "-C", str(clone_path), "rev-parse", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _in_subpath(rel_path: str, subpath: Optional[str]) -> bool:
+    return not subpath or rel_path == subpath or rel_path.startswith(subpath.rstrip("/") + "/")
+
+def load_github_changes(repo_url: str, clone_path: str, old_commit: Optional[str], new_commit: Optional[str], subpath: str = None) -> Optional[RepoChanges]:
+    """
+    Lists the files that changed between two commits of a clone, from
+    `git diff --name-status -M`. With `subpath`, changes outside that folder
+    are left out, and a rename across its boundary becomes a delete or an add.
+    The project's ignore rules apply as in a full walk: ignored files are
+    never added, and a rename into an ignored path becomes a delete.
+
+    Returns None when the diff can't stand in for a full walk: nothing was
+    indexed yet, the old commit is gone (e.g. after a force push), or an
+    ignore file changed and the set of indexed files may differ.
+    """
+    if not old_commit or not new_commit:
+        return None
+    if old_commit == new_commit:
+        return RepoChanges()
+    try:
+        output = subprocess.run(
+            ["git", "-C", str(clone_path), "diff", "--name-status", "-M", "-z", old_commit, new_commit],
+            check=True,
+            capture_output=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    fields = output.decode("utf-8", errors="surrogateescape").split("\0")
+    matcher = get_matcher(str(clone_path))
+    changes = RepoChanges(metadata=_github_metadata(repo_url))
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i][0]
+        if status in ("R", "C"):
+            old_path, new_path = fields[i + 1], fields[i + 2]
+            i += 3
+        else:
+            old_path = new_path = fields[i + 1]
+            i += 2
+        if os.path.basename(new_path) in IGNORE_FILES or os.path.basename(old_path) in IGNORE_FILES:
+            return None
+
+        if not _in_subpath(old_path, subpath):
+            if not _in_subpath(new_path, subpath):
+                continue
+            status = "A"
+        elif not _in_subpath(new_path, subpath):
+            status = "D"
+
+        if status != "D" and matcher.is_ignored(new_path, is_dir=False):
+            if status != "R":
+                continue
+            status = "D"
+        elif status == "R" and matcher.is_ignored(old_path, is_dir=False):
+            # Never indexed under its old name
+            status = "A"
+
+        old_abs = os.path.join(str(clone_path), old_path)
+        new_abs = os.path.join(str(clone_path), new_path)
+        if status == "D":
+            changes.deleted.append(old_abs)
+        elif status == "R":
+            changes.renamed.append((old_abs, new_abs))
+        else:
+            changes.listed.append(new_abs)
+            if is_indexable(new_path):
+                changes.updated.append(SourceFile(abs_path=new_abs, rel_path=new_path, metadata=dict(changes.metadata)))
+    return changes
 
 def list_cloned_repos() -> list[str]:
     """
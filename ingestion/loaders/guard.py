@@ -0,0 +1,116 @@
+"""
+Cheap checks that keep junk out of the index.
+
+Files are judged from their name, their size and a bounded prefix, so a
+40 MB lockfile or a minified bundle is rejected without being read in full.
+Each check returns a short skip reason, or None if the file should be indexed.
+"""
+
+import codecs
+import os
+from typing import Optional
+
+from core.config import (
+    CODE_EXTENSIONS,
+    MAX_FILE_KB,
+    MINIFIED_AVG_LINE_CHARS,
+    LOCKFILE_NAMES,
+    GENERATED_FILE_SUFFIXES,
+    GENERATED_MARKERS,
+)
+
+# Bytes that never appear in text, apart from the usual whitespace controls
+_TEXT_CONTROLS = {7, 8, 9, 10, 12, 13, 27}
+_NON_TEXT = bytes(b for b in range(32) if b not in _TEXT_CONTROLS)
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Line comments, and block comments as (opening, closing) delimiters; a
+# leading docstring counts as part of the header too
+_LINE_COMMENTS = ("#", "//", "--", ";", "%")
+_BLOCK_COMMENTS = (("/*", "*/"), ("<!--", "-->"), ('"""', '"""'), ("'''", "'''"), ("{-", "-}"), ("(*", "*)"))
+
+def leading_comments(text: str) -> str:
+    """
+    Returns the comment block at the top of a file, up to its first line of
+    code: markers such as "do not edit" only mean something there, not in
+    a string or a comment further down.
+    """
+    header = []
+    closing = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if closing is not None:
+            header.append(stripped)
+            if closing in stripped:
+                closing = None
+            continue
+        if not stripped:
+            continue
+        for opening, close in _BLOCK_COMMENTS:
+            if stripped.startswith(opening):
+                header.append(stripped)
+                if close not in stripped[len(opening) :]:
+                    closing = close
+                break
+        else:
+            if not stripped.startswith(_LINE_COMMENTS):
+                break
+            header.append(stripped)
+    return "\n".join(header)
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Picks the encoding of a file from its first bytes.
+
+    A BOM decides outright; otherwise the sample is tried as UTF-8 (allowing
+    a multi-byte character cut off at the end of the sample) and anything
+    else is read as latin-1, which never fails.
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        if e.start >= len(sample) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+    return "latin-1"
+
+def check_name(path: str) -> Optional[str]:
+    name = os.path.basename(path)
+    if name in LOCKFILE_NAMES:
+        return "lockfile"
+    if name.endswith(GENERATED_FILE_SUFFIXES):
+        return "generated"
+    return None
+
+def check_size(size: int, max_bytes: int = MAX_FILE_KB * 1024) -> Optional[str]:
+    return "too_large" if size > max_bytes else None
+
+def check_sample(path: str, sample: bytes) -> Optional[str]:
+    """Classifies a file from the prefix read by the loader."""
+    if not sample:
+        return None
+    has_bom = any(sample.startswith(bom) for bom, _ in _BOMS)
+    if not has_bom:
+        if b"\0" in sample:
+            return "binary"
+        if len(sample.translate(None, _NON_TEXT)) < len(sample) * 0.9:
+            return "binary"
+
+    head = leading_comments(sample[:2048].decode(detect_encoding(sample), errors="ignore")).lower()
+    if any(marker in head for marker in GENERATED_MARKERS):
+        return "generated"
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CODE_EXTENSIONS and len(sample) >= 2048:
+        average_line = len(sample) / (sample.count(b"\n") + 1)
+        if average_line > MINIFIED_AVG_LINE_CHARS:
+            return "minified"
+    return None
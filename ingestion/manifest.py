@@ -0,0 +1,99 @@
+"""
+Manifests: a YAML or JSON list of repositories and folders to index together.
+
+Each entry is either a plain string (a GitHub URL or a local path) or a
+mapping with these keys:
+
+- `source` (or `url` / `path`): GitHub URL or local folder, required
+- `branch`: branch or tag to clone, defaults to the remote's HEAD
+- `subpath`: folder inside the repository to index; a GitHub repository is
+  then cloned blobless and sparse, so only that folder is downloaded
+- `name`: folder name under `~/.cortex/repos/`, defaults to the repository name
+
+The list may also sit under a top-level `repos` key:
+
+    repos:
+      - https://github.com/user/api.git
+      - source: https://github.com/user/monorepo.git
+        branch: main
+        subpath: services/billing
+        name: billing
+      - ../local/project
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from ingestion.loaders.github import clone_name
+
+MANIFEST_SUFFIXES = (".yaml", ".yml", ".json")
+
+@dataclass
+class ManifestEntry:
+    source: str
+    branch: Optional[str] = None
+    subpath: Optional[str] = None
+    name: Optional[str] = None
+
+    @property
+    def is_github(self) -> bool:
+        return is_remote_source(self.source)
+
+def is_remote_source(source: str) -> bool:
+    return source.startswith(("http://", "https://", "git@"))
+
+def is_manifest(path: str) -> bool:
+    """Returns True if `path` names a manifest file rather than a project."""
+    return path.lower().endswith(MANIFEST_SUFFIXES) and os.path.isfile(path)
+
+def load_manifest(path: str) -> List[ManifestEntry]:
+    """
+    Parses a manifest file.
+
+    Local paths are resolved against the manifest's directory.
+
+    Raises:
+        ValueError: If the manifest is malformed or two entries share a clone name
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+        else:
+            import yaml
+            data = yaml.safe_load(f)
+
+    if isinstance(data, dict):
+        data = data.get("repos")
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of repositories")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    for i, item in enumerate(data):
+        if isinstance(item, str):
+            item = {"source": item}
+        if not isinstance(item, dict):
+            raise ValueError(f"{path}: entry {i + 1} must be a string or a mapping")
+        source = item.get("source") or item.get("url") or item.get("path")
+        if not source:
+            raise ValueError(f"{path}: entry {i + 1} has no source")
+        source = str(source)
+        subpath = item.get("subpath")
+        if subpath:
+            subpath = str(subpath).strip("/")
+        if not is_remote_source(source):
+            source = os.path.normpath(os.path.join(base_dir, os.path.expanduser(source)))
+        entries.append(ManifestEntry(
+            source=source,
+            branch=str(item["branch"]) if item.get("branch") else None,
+            subpath=subpath or None,
+            name=str(item["name"]) if item.get("name") else None,
+        ))
+
+    names = [clone_name(entry.source, entry.name) for entry in entries if entry.is_github]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: several entries clone to {', '.join(duplicates)}; give them distinct names")
+    return entries
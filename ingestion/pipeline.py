@@ -1,11 +1,35 @@
 import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from core.config import IGNORED_DIRS, IGNORED_FILE_SUFFIXES, INDEX_WORKERS, CLONE_WORKERS, REPO_WORKERS
+from core.ignore import get_matcher
+from ingestion.loaders.base import SourceFile
 from indexing.indexer import Indexer
+from embeddings.factory import get_embedding_model
 from indexing.state import StateManager
-from ingestion.loaders.filesystem import load_folder
-from ingestion.loaders.github import load_github_repo
-from ingestion.chunking import chunk_document
+from ingestion.loaders.filesystem import is_indexable, load_folder
+from ingestion.loaders.github import INDEXED_COMMIT_KEY, clone_name, load_github_repo, load_github_changes, get_head_commit
+from ingestion.engine import IngestionEngine, IngestionStats, prepare_file
+from ingestion.manifest import ManifestEntry, load_manifest
 
-def index_file(abs_path: str, source_root: str, indexer: Indexer = None, state_manager: StateManager = None):
+def is_ignored_path(rel_path: str, source_root: str = None) -> bool:
+    """
+    Returns True for files the index never tracks.
+
+    With `source_root`, the project's full ignore rules apply (defaults,
+    `.gitignore`, `.cortexignore`); without it, only the built-in defaults.
+    """
+    if source_root is not None:
+        return get_matcher(source_root).is_ignored(rel_path, is_dir=False)
+    parts = rel_path.split(os.sep)
+    if any(part.startswith(".") or part in IGNORED_DIRS for part in parts):
+        return True
+
+    # Also ignore typical temporary/journal files
+    return rel_path.endswith(IGNORED_FILE_SUFFIXES)
+
+def index_file(abs_path: str, source_root: str, indexer: Indexer = None, state_manager: StateManager = None, extra_metadata: dict = None):
     """Indexes a single file if it has changed."""
     if indexer is None:
         indexer = Indexer(project_path=source_root)
@@ -16,62 +40,263 @@ def index_file(abs_path: str, source_root: str, indexer: Indexer = None, state_m
     rel_path = os.path.relpath(abs_path, source_root)
     
     # Check if we should ignore
-    from core.config import IGNORED_DIRS, IGNORED_FILE_SUFFIXES, CODE_EXTENSIONS
-    
-    parts = rel_path.split(os.sep)
-    if any(part.startswith(".") or part in IGNORED_DIRS for part in parts):
+    if is_ignored_path(rel_path, source_root):
         return False
 
-    # Also ignore typical temporary/journal files
-    if rel_path.endswith(IGNORED_FILE_SUFFIXES):
+    if not os.path.exists(abs_path):
         return False
 
-    if not os.path.exists(abs_path):
+    state_manager.update_manifest([abs_path])
+    # Listed in the manifest, but only files a full walk would index are indexed
+    if not is_indexable(abs_path):
         return False
 
-    has_changed, current_hash = state_manager.has_changed(abs_path)
-    
-    if has_changed:
+    needs_symbols = state_manager.needs_symbols(abs_path)
+    if not needs_symbols and state_manager.is_unchanged(abs_path):
+        return False
+
+    known_hash = None if needs_symbols else state_manager.get_stored_hash(abs_path)
+    prepared = prepare_file(abs_path, source_root, known_hash, extra_metadata)
+    if prepared.error:
+        print(f"Error reading {abs_path}: {prepared.error}")
+        return False
+
+    if prepared.skip_reason:
+        print(f"Skipped {rel_path}: {prepared.skip_reason}")
+        record = state_manager.get_record(abs_path)
+        if record is not None and not record.skip_reason:
+            indexer.delete_file_index(rel_path)
+        state_manager.update_state(abs_path, None, prepared.stat, prepared.skip_reason)
+        state_manager.update_symbols(abs_path, None)
+        state_manager.flush()
+        return False
+
+    if prepared.changed:
         print(f"Indexing: {rel_path}")
-        ext = os.path.splitext(abs_path)[1].lower()
-        doc_type = "code" if ext in CODE_EXTENSIONS else "text"
-        
-        # Minimally load document for this file
-        try:
-            from ingestion.loaders.filesystem import read_file_robust
-            content = read_file_robust(abs_path)
-        except Exception as e:
-            print(f"Error reading {abs_path}: {e}")
-            return False
-
-        from ingestion.loaders.document import IngestedDocument
-        from datetime import datetime
-        doc = IngestedDocument(
-            content=content,
-            metadata={
-                "source": "filesystem",
-                "path": rel_path,
-                "abs_path": abs_path,
-                "type": doc_type,
-                "language": CODE_EXTENSIONS.get(ext, "unknown"),
-                "last_modified": datetime.fromtimestamp(os.path.getmtime(abs_path)).isoformat()
-            }
-        )
+        indexer.update_file(rel_path, prepared.chunks, prepared.trigrams)
 
-        indexer.delete_file_index(rel_path)
-        chunks = chunk_document(doc)
-        indexer.index_chunks(chunks)
-        state_manager.update_state(abs_path, current_hash)
-        return True
-    return False
+    state_manager.update_state(abs_path, prepared.file_hash, prepared.stat)
+    if prepared.changed:
+        state_manager.update_symbols(abs_path, prepared.symbols)
+    state_manager.flush()
+    return prepared.changed
+
+def index_files(abs_paths, source_root: str, indexer: Indexer, state_manager: StateManager, workers: int = 1):
+    """
+    Indexes a batch of files through the pipelined engine, so chunks from many
+    files share embedding requests and vector store writes.
+
+    Files are prepared in-process by default: callers such as the watcher run
+    inside long-lived, multi-threaded processes where forking a pool is unsafe.
+
+    Returns:
+        IngestionStats: Counts of indexed, skipped and failed files
+    """
+    files = []
+    for abs_path in dict.fromkeys(os.path.abspath(p) for p in abs_paths):
+        rel_path = os.path.relpath(abs_path, source_root)
+        if is_ignored_path(rel_path, source_root) or not os.path.isfile(abs_path):
+            continue
+        files.append(SourceFile(abs_path=abs_path, rel_path=rel_path))
+
+    state_manager.update_manifest(source_file.abs_path for source_file in files)
+    engine = IngestionEngine(indexer, state_manager, workers=workers)
+    return engine.run([f for f in files if is_indexable(f.abs_path)], source_root)
+
+def _tracked_under(abs_path: str, state_manager: StateManager, is_directory: bool = None) -> list[str]:
+    """
+    Returns the tracked paths equal to `abs_path` or, for directories, inside it.
+
+    Pass `is_directory=False` when the caller knows it is a file, to avoid
+    scanning every tracked path.
+    """
+    if not is_directory and state_manager.get_record(abs_path) is not None:
+        return [abs_path]
+    if is_directory is False:
+        return []
+    prefix = abs_path.rstrip(os.sep) + os.sep
+    return [p for p in state_manager.all_paths() if p.startswith(prefix)]
+
+def remove_paths(removals, source_root: str, indexer: Indexer, state_manager: StateManager) -> int:
+    """
+    Drops deleted files, or every file under deleted directories, from the index.
+
+    Args:
+        removals: Iterable of (absolute path, is_directory) pairs; is_directory may be None if unknown
+
+    Returns:
+        int: Number of files removed
+    """
+    tracked = []
+    for abs_path, is_directory in removals:
+        # The manifest lists untracked files too
+        state_manager.remove_manifest(abs_path, is_directory)
+        tracked.extend(_tracked_under(os.path.abspath(abs_path), state_manager, is_directory))
+    tracked = list(dict.fromkeys(tracked))
+    if not tracked:
+        return 0
+
+    indexer.delete_files_index([os.path.relpath(p, source_root) for p in tracked])
+    state_manager.remove_states(tracked)
+    state_manager.flush()
+    for path in tracked:
+        print(f"Removed: {os.path.relpath(path, source_root)}")
+    return len(tracked)
+
+def remove_path(abs_path: str, source_root: str, indexer: Indexer, state_manager: StateManager, is_directory: bool = None) -> int:
+    """Drops a deleted file, or every file under a deleted directory, from the index."""
+    return remove_paths([(abs_path, is_directory)], source_root, indexer, state_manager)
+
+def move_path(src_path: str, dest_path: str, source_root: str, indexer: Indexer, state_manager: StateManager, is_directory: bool = None, extra_metadata: dict = None) -> int:
+    """
+    Follows a file or directory move by re-keying stored chunks instead of re-embedding.
+
+    Files moved into an ignored location, or renamed to an extension the
+    index does not handle, are removed; files that were never indexed, or
+    whose content changed along the way, are indexed normally.
+
+    Returns:
+        int: Number of files moved
+    """
+    src_path = os.path.abspath(src_path)
+    dest_path = os.path.abspath(dest_path)
+    moved = 0
+    # Files that arrive at the destination are added back by index_file below
+    state_manager.remove_manifest(src_path, is_directory)
+
+    for old_abs in _tracked_under(src_path, state_manager, is_directory):
+        new_abs = dest_path + old_abs[len(src_path):]
+        old_rel = os.path.relpath(old_abs, source_root)
+        new_rel = os.path.relpath(new_abs, source_root)
 
-def ingest_and_index(source: str, source_type: str):
+        if new_rel.startswith(os.pardir) or is_ignored_path(new_rel, source_root) or not is_indexable(new_rel):
+            remove_path(old_abs, source_root, indexer, state_manager, is_directory=False)
+            continue
+
+        print(f"Moved: {old_rel} -> {new_rel}")
+        # A file the move overwrote leaves chunks behind under the new path
+        indexer.delete_file_index(new_rel)
+        indexer.rename_file_index(old_rel, new_rel, new_abs)
+        state_manager.rename_state(old_abs, new_abs)
+        moved += 1
+    state_manager.flush()
+
+    # Picks up files that were not tracked before; a no-op for clean renames
+    if os.path.isdir(dest_path):
+        for root, _, names in get_matcher(source_root).walk(dest_path):
+            for name in names:
+                index_file(os.path.join(root, name), source_root, indexer, state_manager, extra_metadata)
+    else:
+        index_file(dest_path, source_root, indexer, state_manager, extra_metadata)
+    return moved
+
+def reconcile(seen_paths: set, source_root: str, indexer: Indexer, state_manager: StateManager,
+              start: str = None) -> int:
+    """
+    Garbage-collects index entries for files that no longer exist in the tree.
+
+    Args:
+        seen_paths: Absolute paths found by the walk that was just indexed
+        source_root: Project root
+        start: Subfolder the walk was limited to, if any; files recorded
+            outside it are only removed once they are gone from disk
+
+    Returns:
+        int: Number of vanished files removed
+    """
+    prefix = os.path.abspath(source_root).rstrip(os.sep) + os.sep
+    walked = os.path.abspath(start).rstrip(os.sep) + os.sep if start else prefix
+    vanished = [
+        p for p in state_manager.all_paths()
+        if p not in seen_paths and p.startswith(prefix)
+        and (p.startswith(walked) or not os.path.lexists(p))
+    ]
+    if not vanished:
+        return 0
+
+    indexer.delete_files_index([os.path.relpath(p, source_root) for p in vanished])
+    state_manager.remove_states(vanished)
+    # Inside the walk, the manifest is replaced from the walk's own listing
+    for path in vanished:
+        if not path.startswith(walked):
+            state_manager.remove_manifest(path, is_directory=False)
+    state_manager.flush()
+    return len(vanished)
+
+def _track_paths(files, seen_paths: set):
+    for source_file in files:
+        seen_paths.add(source_file.abs_path)
+        yield source_file
+
+@dataclass
+class RepoResult:
+    """Outcome of indexing one entry of a manifest."""
+    name: str
+    project_path: str = None
+    stats: IngestionStats = None
+    removed: int = 0
+    error: str = None
+
+def _index_project(project_path: str, files, repo_url: str = None, subpath: str = None,
+                   embedding_model=None, workers: int = None, executor=None, label: str = None,
+                   listing: list = None):
+    """
+    Indexes one project: every file for a folder or a first clone, only the
+    changes since the last indexed commit for a clone that was indexed before.
+
+    `listing` is filled by the walk behind `files` (see `load_folder`) and
+    becomes the file manifest, of the subpath only if just that was walked;
+    without it, the project is listed again.
+
+    Returns:
+        tuple: (IngestionStats, number of removed files, Indexer)
+    """
+    prefix = f"[{label}] " if label else ""
+    indexer = Indexer(project_path=project_path, embedding_model=embedding_model)
+    seen_paths = set()
+    with StateManager(project_path=project_path) as state_manager:
+        engine = IngestionEngine(indexer, state_manager, workers=workers, executor=executor, label=label)
+        head = changes = None
+        if repo_url:
+            head = get_head_commit(project_path)
+            indexed_commit = state_manager.get_meta(INDEXED_COMMIT_KEY)
+            changes = load_github_changes(repo_url, project_path, indexed_commit, head, subpath)
+
+        if changes is None:
+            # Files outside a walked subpath, e.g. from an earlier index of the whole folder, are kept
+            start = os.path.join(project_path, subpath) if subpath else None
+            stats = engine.run(_track_paths(files, seen_paths), project_path)
+            removed_count = reconcile(seen_paths, project_path, indexer, state_manager, start)
+            # The manifest lists every file, not only indexable ones
+            if listing is None:
+                listing = get_matcher(project_path).iter_files(start)
+            state_manager.replace_manifest(listing, project_path, start)
+        else:
+            # Only what the pull brought in is read; the rest of the clone is untouched
+            print(f"{prefix}Syncing changes {indexed_commit[:12]}..{head[:12]}: {len(changes.updated)} updated, "
+                  f"{len(changes.renamed)} renamed, {len(changes.deleted)} deleted")
+            removed_count = remove_paths(
+                [(path, False) for path in changes.deleted], project_path, indexer, state_manager
+            )
+            for old_path, new_path in changes.renamed:
+                move_path(old_path, new_path, project_path, indexer, state_manager, False, changes.metadata)
+            stats = engine.run(changes.updated, project_path)
+            # Like a full walk, the manifest gets every file, not only indexable ones
+            state_manager.update_manifest(changes.listed)
+
+        # A failed file is retried on the next sync, which diffs from the old commit again
+        if head and not stats.failed:
+            state_manager.set_meta(INDEXED_COMMIT_KEY, head)
+    return stats, removed_count, indexer
+
+def ingest_and_index(source: str, source_type: str, workers: int = None):
     """
     Ingest and index a codebase from a folder or GitHub repository.
     
     Args:
         source: Path to folder or GitHub URL
         source_type: Either 'folder' or 'github'
+        workers: Number of processes used to read and chunk files (defaults to CPU count)
     
     Returns:
         tuple: (number of indexed files, project path)
@@ -79,31 +304,119 @@ def ingest_and_index(source: str, source_type: str):
     # Determine if source is a GitHub URL
     is_github_url = source_type == "github" or source.startswith(("http://", "https://", "git@"))
     
+    listing = []
     if is_github_url:
         # For GitHub repos, clone and get the persistent path
-        docs, project_path = load_github_repo(source)
+        files, project_path = load_github_repo(source, listing=listing)
     else:
         # For local folders, use the absolute path
         project_path = os.path.abspath(source)
-        docs = load_folder(project_path)
+        files = load_folder(project_path, listing=listing)
 
-    indexer = Indexer(project_path=project_path)
-    state_manager = StateManager(project_path=project_path)
-    
-    indexed_count = 0
-    skipped_count = 0
-
-    for doc in docs:
-        abs_path = doc.metadata.get("abs_path")
-        if index_file(abs_path, project_path, indexer, state_manager):
-            indexed_count += 1
-        else:
-            skipped_count += 1
+    stats, removed_count, indexer = _index_project(
+        project_path, files, repo_url=source if is_github_url else None, workers=workers, listing=listing
+    )
 
     print(f"\n--- Indexing Summary ---")
-    print(f"Files Indexed: {indexed_count}")
-    print(f"Files Skipped: {skipped_count}")
-    return indexed_count, project_path
+    print(f"Files Indexed: {stats.indexed}")
+    print(f"Files Skipped: {stats.skipped}")
+    print(f"Files Filtered: {stats.filtered} (too large, binary, minified, generated or lockfiles)")
+    print(f"Files Removed: {removed_count}")
+    print(f"Chunks Embedded: {stats.embedded} of {stats.chunks}")
+    cache = getattr(indexer.embedding_model, "cache", None)
+    if cache is not None:
+        print(f"Embedding Cache: {cache.hits} hits, {cache.misses} misses")
+    if stats.failed:
+        print(f"Files Failed: {stats.failed}")
+    return stats.indexed, project_path
+
+def ingest_manifest(manifest_path: str, workers: int = None,
+                    clone_workers: int = CLONE_WORKERS, repo_workers: int = REPO_WORKERS) -> list[RepoResult]:
+    """
+    Indexes every repository and folder listed in a manifest (see `ingestion.manifest`).
+
+    Clones and pulls run concurrently, and each repository starts indexing
+    as soon as its clone is ready. All repositories share one prepare process
+    pool and one embedding model, whose limiter caps the requests in flight
+    across all of them, so the fleet is bounded by embedding throughput
+    rather than by the sum of per-repository latencies.
+
+    Args:
+        manifest_path: YAML or JSON manifest file
+        workers: Processes used to read and chunk files (defaults to CPU count)
+        clone_workers: Clones or pulls run at the same time
+        repo_workers: Repositories indexed at the same time
+
+    Returns:
+        list[RepoResult]: One result per manifest entry, in manifest order
+    """
+    entries = load_manifest(manifest_path)
+    results = [
+        RepoResult(name=clone_name(entry.source, entry.name) if entry.is_github else os.path.basename(entry.source))
+        for entry in entries
+    ]
+    embedding_model = get_embedding_model()
+
+    workers = max(1, workers or INDEX_WORKERS)
+    prepare_pool = None
+    if workers > 1:
+        prepare_pool = ProcessPoolExecutor(max_workers=workers)
+        # Fork the worker processes before any clone or indexing thread starts
+        prepare_pool.submit(os.getpid).result()
+
+    def fetch(entry: ManifestEntry):
+        listing = []
+        if entry.is_github:
+            files, project_path = load_github_repo(entry.source, entry.branch, entry.subpath, entry.name, listing)
+            return files, project_path, listing
+        project_path = entry.source
+        start = os.path.join(project_path, entry.subpath) if entry.subpath else None
+        return load_folder(project_path, start, listing), project_path, listing
+
+    def index(result: RepoResult, entry: ManifestEntry, files, project_path: str, listing: list):
+        result.project_path = project_path
+        print(f"[{result.name}] Indexing {project_path}")
+        result.stats, result.removed, _ = _index_project(
+            project_path,
+            files,
+            repo_url=entry.source if entry.is_github else None,
+            subpath=entry.subpath,
+            embedding_model=embedding_model,
+            workers=workers,
+            executor=prepare_pool,
+            label=result.name,
+            listing=listing,
+        )
+        stats = result.stats
+        print(f"[{result.name}] Done: {stats.indexed} indexed, {stats.skipped} skipped, "
+              f"{stats.filtered} filtered, {result.removed} removed, {stats.failed} failed")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, clone_workers), thread_name_prefix="cortex-clone") as cloner, \
+             ThreadPoolExecutor(max_workers=max(1, repo_workers), thread_name_prefix="cortex-repo") as indexers:
+            fetches = {cloner.submit(fetch, entry): i for i, entry in enumerate(entries)}
+            indexing = {}
+            for future in as_completed(fetches):
+                i = fetches[future]
+                try:
+                    files, project_path, listing = future.result()
+                except subprocess.CalledProcessError:
+                    # git's own message was printed by the clone
+                    results[i].error = "clone failed"
+                    continue
+                except Exception as e:
+                    results[i].error = f"clone failed: {e}"
+                    continue
+                indexing[indexers.submit(index, results[i], entries[i], files, project_path, listing)] = i
+            for future in as_completed(indexing):
+                try:
+                    future.result()
+                except Exception as e:
+                    results[indexing[future]].error = str(e)
+    finally:
+        if prepare_pool is not None:
+            prepare_pool.shutdown()
+    return results
 
 if __name__ == "__main__":
     num_indexed = ingest_and_index(".", "folder")
\ No newline at end of file
@@ -1,48 +1,293 @@
 import time
 import os
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from ingestion.pipeline import index_file
+from core.config import WATCH_DEBOUNCE_MS, WATCH_MAX_DELAY_MS
+from core.ignore import IGNORE_FILES, get_matcher
+from ingestion.pipeline import index_files, remove_paths, move_path
+from ingestion.loaders.filesystem import is_indexable
 from indexing.indexer import Indexer
 from indexing.state import StateManager
 
+@dataclass
+class ChangeBatch:
+    moves: list = field(default_factory=list)
+    deletes: list = field(default_factory=list)
+    updates: list = field(default_factory=list)
+
+class ChangeQueue:
+    """
+    Coalesces file system events and releases them as debounced batches.
+
+    Repeated events for the same path collapse into one pending change, and a
+    batch is released once no event has arrived for `debounce` seconds (or
+    `max_delay` seconds after the first pending event, whichever is sooner).
+    """
+
+    def __init__(self, debounce: float = WATCH_DEBOUNCE_MS / 1000, max_delay: float = WATCH_MAX_DELAY_MS / 1000):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._changes = {}  # path -> "update" | "delete" | "delete_dir"
+        self._moves = []
+        self._in_flight = set()
+        self._first_event = None
+        self._last_event = None
+
+    def _touch(self):
+        now = time.monotonic()
+        if self._first_event is None:
+            self._first_event = now
+        self._last_event = now
+        self._cond.notify()
+
+    def add_update(self, path: str):
+        with self._cond:
+            self._changes[path] = "update"
+            self._touch()
+
+    def add_delete(self, path: str, is_directory: bool = False):
+        with self._cond:
+            self._changes[path] = "delete_dir" if is_directory else "delete"
+            self._touch()
+
+    def add_move(self, src_path: str, dest_path: str, is_directory: bool = False):
+        with self._cond:
+            # The source may already be indexed, even if it was edited or is itself the
+            # destination of an earlier move (A -> B -> C): re-key it rather than leave
+            # its entries behind. A pending edit is picked up by the update below.
+            self._changes.pop(src_path, None)
+            self._moves.append((src_path, dest_path, is_directory))
+            if not is_directory:
+                # Editors that save via a temp file end up here as a plain update
+                self._changes[dest_path] = "update"
+            self._touch()
+
+    def get_batch(self, stop: threading.Event):
+        """Blocks until a debounced batch is ready, or returns None once `stop` is set."""
+        with self._cond:
+            while not stop.is_set():
+                if self._first_event is None:
+                    self._cond.wait(timeout=0.5)
+                    continue
+
+                now = time.monotonic()
+                ready_at = min(self._last_event + self.debounce, self._first_event + self.max_delay)
+                if now < ready_at:
+                    self._cond.wait(timeout=ready_at - now)
+                    continue
+
+                batch = ChangeBatch(moves=self._moves)
+                for path, kind in self._changes.items():
+                    if kind == "update":
+                        batch.updates.append(path)
+                    else:
+                        batch.deletes.append((path, kind == "delete_dir"))
+                self._changes = {}
+                self._moves = []
+                self._in_flight = set(batch.updates)
+                self._first_event = None
+                self._last_event = None
+                return batch
+        return None
+
+    def task_done(self):
+        """Marks the last batch returned by `get_batch` as processed."""
+        with self._cond:
+            self._in_flight = set()
+
+    def pending_updates(self) -> set:
+        """Files queued or being indexed, whose index entries may not match their content yet."""
+        with self._cond:
+            return {path for path, kind in self._changes.items() if kind == "update"} | self._in_flight
+
+# Project root -> the handler keeping its index current in this process
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+def pending_updates(project_path: str) -> Optional[set]:
+    """
+    Returns the files a project's watcher has yet to index (absolute paths),
+    including the changes its session-start catch-up found; every other
+    indexed file is current. None if no watcher runs for the project in
+    this process.
+    """
+    with _handlers_lock:
+        handler = _handlers.get(os.path.abspath(project_path))
+    return handler.changes.pending_updates() if handler is not None else None
+
 class CodebaseHandler(FileSystemEventHandler):
-    def __init__(self, source_root: str):
+    def __init__(self, source_root: str, observer=None):
         self.source_root = os.path.abspath(source_root)
-        self.indexer = Indexer()
-        self.state_manager = StateManager()
+        self.observer = observer
+        self.matcher = get_matcher(self.source_root)
+        self.indexer = Indexer(project_path=self.source_root)
+        self.state_manager = StateManager(project_path=self.source_root)
+        self.changes = ChangeQueue()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._process_loop, name="cortex-watcher", daemon=True)
+        self._worker.start()
+        with _handlers_lock:
+            _handlers[self.source_root] = self
+
+    # --- Observer scheduling ---
+
+    def _ignored(self, path: str, is_directory: bool = None) -> bool:
+        if os.path.basename(path) in IGNORE_FILES:
+            # Ignore files themselves are never indexed, but their edits change the rules
+            self.matcher.invalidate(os.path.relpath(os.path.dirname(path), self.source_root))
+            return True
+        return self.matcher.is_ignored(path, is_directory)
+
+    def schedule(self):
+        """
+        Registers one recursive watch on the project root.
+
+        Ignored paths are filtered as their events arrive. A watch per
+        directory would keep node_modules and build output quiet, but on
+        Linux each one is a separate inotify instance and thread, and the
+        default limit of 128 instances is reached by most real projects.
+        """
+        self.observer.schedule(self, self.source_root, recursive=True)
+
+    def _on_new_directory(self, path: str):
+        if self._ignored(path, True):
+            return
+        # Files written before the observer picked up the directory produce no events
+        for root, _, files in self.matcher.walk(path):
+            for name in files:
+                self.changes.add_update(os.path.join(root, name))
+
+    # --- Event callbacks: only enqueue, never index on the observer thread ---
 
     def on_modified(self, event):
-        if not event.is_directory:
-            try:
-                index_file(event.src_path, self.source_root, self.indexer, self.state_manager)
-            except Exception as e:
-                print(f"Error handling modification for {event.src_path}: {e}")
+        if not event.is_directory and not self._ignored(event.src_path, False):
+            self.changes.add_update(event.src_path)
 
     def on_created(self, event):
-        if not event.is_directory:
+        if event.is_directory:
+            self._on_new_directory(event.src_path)
+        elif not self._ignored(event.src_path, False):
+            self.changes.add_update(event.src_path)
+
+    def on_deleted(self, event):
+        if self._ignored(event.src_path, event.is_directory):
+            return
+        self.changes.add_delete(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        if self._ignored(event.src_path, event.is_directory):
+            # e.g. an editor renaming its temp file over the real one
+            if self._ignored(event.dest_path, event.is_directory):
+                return
+            if event.is_directory:
+                self._on_new_directory(event.dest_path)
+            else:
+                self.changes.add_update(event.dest_path)
+            return
+        self.changes.add_move(event.src_path, event.dest_path, event.is_directory)
+
+    def catch_up(self):
+        """
+        Queues the changes made while nothing was watching, e.g. between sessions.
+
+        The project is listed once: the listing replaces the file manifest,
+        and files whose stat no longer matches their recorded state, or
+        recorded files that are gone, are queued as if their events had just
+        arrived. A project that was never indexed only gets its manifest.
+        """
+        files = list(self.matcher.iter_files())
+        self.state_manager.replace_manifest(files, self.source_root)
+        # Committed now, so file trees loaded from the database by the tools see it
+        self.state_manager.flush()
+        recorded = self.state_manager.all_paths()
+        if not recorded:
+            return
+
+        queued = 0
+        for path in files:
+            if is_indexable(path) and not self.state_manager.is_unchanged(path):
+                self.changes.add_update(path)
+                queued += 1
+        listed = set(files)
+        prefix = self.source_root + os.sep
+        for path in recorded:
+            if path.startswith(prefix) and path not in listed:
+                self.changes.add_delete(path)
+                queued += 1
+        if queued:
+            print(f"Catching up on {queued} files changed since the last session")
+
+    # --- Batch processing ---
+
+    def _process_loop(self):
+        while True:
+            batch = self.changes.get_batch(self._stop)
+            if batch is None:
+                return
             try:
-                index_file(event.src_path, self.source_root, self.indexer, self.state_manager)
+                self.process_batch(batch)
             except Exception as e:
-                print(f"Error handling creation for {event.src_path}: {e}")
+                print(f"Error processing file changes: {e}")
+            finally:
+                self.changes.task_done()
+
+    def process_batch(self, batch: ChangeBatch):
+        for src_path, dest_path, is_directory in batch.moves:
+            move_path(src_path, dest_path, self.source_root, self.indexer, self.state_manager, is_directory)
+        # A path deleted and re-created within the window is handled as an update
+        removals = [(path, is_dir) for path, is_dir in batch.deletes if not os.path.exists(path)]
+        if removals:
+            remove_paths(removals, self.source_root, self.indexer, self.state_manager)
+        if batch.updates:
+            index_files(batch.updates, self.source_root, self.indexer, self.state_manager)
+
+    def stop(self):
+        with _handlers_lock:
+            if _handlers.get(self.source_root) is self:
+                del _handlers[self.source_root]
+        self._stop.set()
+        self._worker.join()
+        # Commits the last batch's state writes
+        self.state_manager.close()
+
+def _start_observer(path: str):
+    observer = Observer()
+    event_handler = CodebaseHandler(path, observer)
+    event_handler.schedule()
+    try:
+        observer.start()
+    except OSError as e:
+        # e.g. the inotify instance or watch limits are reached
+        print(f"Could not watch {event_handler.source_root} for changes ({e}); continuing without the watcher")
+        observer = None
+    # After the watches exist, so nothing changed during the catch-up is missed
+    event_handler.catch_up()
+    return observer, event_handler
+
+def stop_watcher(observer, event_handler):
+    """Stops the observer first, so no events arrive after the handler is stopped."""
+    if observer is not None:
+        observer.stop()
+        observer.join()
+    event_handler.stop()
 
 def start_watching(path: str):
     print(f"Starting to watch for changes in: {os.path.abspath(path)}")
-    event_handler = CodebaseHandler(path)
-    observer = Observer()
-    observer.schedule(event_handler, path, recursive=True)
-    observer.start()
+    observer, event_handler = _start_observer(path)
     try:
-        while True:
+        while observer is not None:
             time.sleep(1)
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        pass
+    stop_watcher(observer, event_handler)
 
 def start_background_watcher(path: str):
-    """Starts the watcher in a non-blocking way."""
-    event_handler = CodebaseHandler(path)
-    observer = Observer()
-    observer.schedule(event_handler, path, recursive=True)
-    observer.start()
-    return observer
+    """
+    Starts the watcher in a non-blocking way. Returns the observer (None if
+    the project can't be watched) and the event handler, for `stop_watcher`.
+    """
+    return _start_observer(path)
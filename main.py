@@ -3,10 +3,12 @@ from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.markdown import Markdown
-from ingestion.pipeline import ingest_and_index
-from ingestion.watcher import start_watching, start_background_watcher
+from ingestion.pipeline import ingest_and_index, ingest_manifest
+from ingestion.manifest import is_manifest
+from ingestion.watcher import start_watching, start_background_watcher, stop_watcher
 from ingestion.loaders.github import list_cloned_repos, delete_cloned_repo
 from agents.orchestrator import Orchestrator
+from vectorstore.chroma import configure_hnsw
 import os
 from dotenv import load_dotenv
 
@@ -19,14 +21,30 @@ console = Console()
 
 @app.command()
 def index(
-    path: str = typer.Argument(".", help="Path to folder or GitHub URL (e.g., https://github.com/user/repo.git)"),
-    source_type: str = typer.Option("folder", "--type", "-t", help="Type of source: 'folder' or 'github'")
+    path: str = typer.Argument(".", help="Path to folder, GitHub URL (e.g., https://github.com/user/repo.git) or a YAML/JSON manifest of several"),
+    source_type: str = typer.Option("folder", "--type", "-t", help="Type of source: 'folder' or 'github'"),
+    workers: int = typer.Option(None, "--workers", "-w", help="Processes used to read and chunk files (defaults to CPU count)"),
+    hnsw_space: str = typer.Option(None, "--hnsw-space", help="Vector distance: 'l2', 'cosine' or 'ip' (rebuilds the index if it differs)"),
+    hnsw_m: int = typer.Option(None, "--hnsw-m", help="HNSW graph degree M (rebuilds the index if it differs)"),
+    hnsw_construction_ef: int = typer.Option(None, "--hnsw-construction-ef", help="HNSW construction_ef (rebuilds the index if it differs)"),
+    hnsw_search_ef: int = typer.Option(None, "--hnsw-search-ef", help="HNSW search_ef, applied in place"),
 ):
     """
     Index a codebase for retrieval.
     
     For GitHub repos, use: cortex index https://github.com/user/repo.git --type github
+    For many repos at once, use: cortex index repos.yaml
     """
+    configure_hnsw(
+        space=hnsw_space,
+        m=hnsw_m,
+        construction_ef=hnsw_construction_ef,
+        search_ef=hnsw_search_ef,
+    )
+    if is_manifest(path):
+        index_manifest(path, workers)
+        return
+
     is_github_url = source_type == "github" or path.startswith(("http://", "https://", "git@"))
     
     if is_github_url:
@@ -36,7 +54,7 @@ def index(
         console.print(Panel(f"[bold blue]Indexing Source:[/bold blue] {project_path} ({source_type})", title="Cortex Ingestion"))
     
     with console.status("[bold green]Working on indexing...[/bold green]"):
-        num_indexed, actual_project_path = ingest_and_index(path, source_type)
+        num_indexed, actual_project_path = ingest_and_index(path, source_type, workers=workers)
     
     console.print(f"\n[bold green]Success![/bold green] Indexed {num_indexed} files.")
     
@@ -44,6 +62,102 @@ def index(
         console.print(f"\n[bold cyan]Repository cloned to:[/bold cyan] {actual_project_path}")
         console.print(f"[bold cyan]To chat with this repo, use:[/bold cyan] cortex chat --project {actual_project_path}")
 
+def index_manifest(manifest_path: str, workers: int = None):
+    console.print(Panel(f"[bold blue]Indexing Manifest:[/bold blue] {os.path.abspath(manifest_path)}", title="Cortex Ingestion"))
+    try:
+        results = ingest_manifest(manifest_path, workers=workers)
+    except ValueError as e:
+        console.print(f"[bold red]Invalid manifest:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    table = Table(title="Indexed Repositories")
+    table.add_column("Repository", style="cyan")
+    table.add_column("Indexed", justify="right")
+    table.add_column("Skipped", justify="right")
+    table.add_column("Removed", justify="right")
+    table.add_column("Failed", justify="right")
+    table.add_column("Path")
+    for result in results:
+        if result.error:
+            table.add_row(result.name, "-", "-", "-", f"[red]{result.error}[/red]", result.project_path or "")
+            continue
+        stats = result.stats
+        table.add_row(
+            result.name,
+            str(stats.indexed),
+            str(stats.skipped + stats.filtered),
+            str(result.removed),
+            str(stats.failed),
+            result.project_path,
+        )
+    console.print(table)
+    if any(result.error for result in results):
+        raise typer.Exit(code=1)
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+@app.command("hnsw-sweep")
+def hnsw_sweep(
+    project: str = typer.Option(".", "--project", "-p", help="Path to the indexed project"),
+    m: str = typer.Option("16,32", "--m", help="Comma-separated M values"),
+    construction_ef: str = typer.Option("100,200", "--construction-ef", help="Comma-separated construction_ef values"),
+    search_ef: str = typer.Option("10,25,50,100,200", "--search-ef", help="Comma-separated search_ef values"),
+    k: int = typer.Option(10, "--k", help="Neighbours per query (recall@k)"),
+    queries: int = typer.Option(200, "--queries", help="Stored chunks held out as queries"),
+    queries_file: str = typer.Option(None, "--queries-file", help="Text queries, one per line, used instead of held-out chunks"),
+    space: str = typer.Option(None, "--space", help="Distance space (defaults to the index's own)"),
+    limit: int = typer.Option(None, "--limit", help="Use at most this many stored embeddings"),
+):
+    """
+    Measure recall@k and query latency of HNSW settings against brute force.
+    """
+    from vectorstore.tuning import sweep_hnsw
+
+    project_path = os.path.abspath(project)
+    query_texts = None
+    if queries_file:
+        with open(queries_file, "r", encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+
+    console.print(Panel(f"[bold blue]Project:[/bold blue] {project_path}", title="Cortex HNSW Sweep"))
+    with console.status("[bold green]Building indexes and running queries...[/bold green]"):
+        try:
+            results = sweep_hnsw(
+                project_path,
+                _int_list(m),
+                _int_list(construction_ef),
+                _int_list(search_ef),
+                k=k,
+                query_count=queries,
+                query_texts=query_texts,
+                space=space,
+                limit=limit,
+            )
+        except ValueError as e:
+            console.print(f"[bold red]Error:[/bold red] {e}")
+            raise typer.Exit(code=1)
+
+    table = Table(title=f"Recall@{k} vs. Latency")
+    for column in ("Space", "M", "construction_ef", "search_ef"):
+        table.add_column(column, style="cyan")
+    for column in (f"Recall@{k}", "p50 (ms)", "p95 (ms)", "Build (s)"):
+        table.add_column(column, justify="right")
+    for result in results:
+        settings = result.settings
+        table.add_row(
+            settings.space,
+            str(settings.m),
+            str(settings.construction_ef),
+            str(settings.search_ef),
+            f"{result.recall:.3f}",
+            f"{result.p50_ms:.2f}",
+            f"{result.p95_ms:.2f}",
+            f"{result.build_seconds:.1f}",
+        )
+    console.print(table)
+    console.print("Apply a setting with: cortex index <path> --hnsw-m M --hnsw-construction-ef EF --hnsw-search-ef EF")
+
 @app.command()
 def watch(
     path: str = typer.Argument(".", help="Path to the folder to watch for changes")
@@ -58,6 +172,12 @@ def watch(
     except KeyboardInterrupt:
         console.print("\n[bold red]Stopping watcher...[/bold red]")
 
+def _print_rerank_stats(orchestrator):
+    """Shows which reranking tier served the session's searches."""
+    counts = orchestrator.project_tools.reranker.stats()
+    if sum(counts.values()):
+        console.print("[dim]Reranking: " + ", ".join(f"{count} {tier}" for tier, count in counts.items()) + "[/dim]")
+
 @app.command()
 def ask(
     query: str = typer.Argument(..., help="The question you want to ask about your codebase"),
@@ -69,7 +189,7 @@ def ask(
     Ask a single question about the indexed codebase.
     """
     project_path = os.path.abspath(project)
-    watcher = start_background_watcher(project_path)
+    observer, event_handler = start_background_watcher(project_path)
     try:
         console.print(Panel(f"[bold blue]Project:[/bold blue] {project_path}\n[bold blue]Query:[/bold blue] {query}", title="Cortex Search"))
         
@@ -80,9 +200,9 @@ def ask(
         
         console.print("\n[bold green]Cortex Agent:[/bold green]")
         console.print(Markdown(response))
+        _print_rerank_stats(orchestrator)
     finally:
-        watcher.stop()
-        watcher.join()
+        stop_watcher(observer, event_handler)
 
 @app.command()
 def chat(
@@ -94,7 +214,7 @@ def chat(
     Start an interactive chat session with your codebase.
     """
     project_path = os.path.abspath(project)
-    watcher = start_background_watcher(project_path)
+    observer, event_handler = start_background_watcher(project_path)
     try:
         console.print(Panel(f"[bold magenta]Welcome to Cortex Chat![/bold magenta]\n[bold blue]Project:[/bold blue] {project_path}\nType 'exit' or 'quit' to end the session.", title="Cortex Interactive"))
         
@@ -116,9 +236,9 @@ def chat(
                 
             console.print(f"\n[bold green]Cortex :[/bold green]")
             console.print(Markdown(response))
+        _print_rerank_stats(orchestrator)
     finally:
-        watcher.stop()
-        watcher.join()
+        stop_watcher(observer, event_handler)
 
 @repo_app.command("list")
 def repo_list():
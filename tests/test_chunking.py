@@ -0,0 +1,46 @@
+import unittest
+
+from ingestion.chunking.brace import chunk_brace_code
+from ingestion.chunking.code import chunk_python_code
+
+MAX_CHARS = 4000
+
+
+def _declaration_file() -> str:
+    # A long doc comment before `declare module` ends up in the header of the module's node
+    preamble = [f" * Line {i} of a long description of the module and how it is used." for i in range(300)]
+    members = [f"  export function member{i}(value: string): number;" for i in range(200)]
+    return "\n".join(["/**", *preamble, " */", 'declare module "example" {', *members, "}"]) + "\n"
+
+
+class ChunkSizeTest(unittest.TestCase):
+    def test_large_preamble_is_split_under_the_cap(self):
+        code = _declaration_file()
+        chunks = chunk_brace_code(code, {"path": "example.d.ts"}, "typescript", max_chars=MAX_CHARS, min_chars=400)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(len(chunk.content) for chunk in chunks), MAX_CHARS)
+        # Every line is still covered, in order
+        self.assertEqual(chunks[0].start_line, 1)
+        self.assertEqual(chunks[-1].end_line, len(code.splitlines()))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(chunk.start_line, previous.end_line + 1)
+
+
+class ChunkMetadataTest(unittest.TestCase):
+    def test_split_class_header_is_labelled_as_the_class(self):
+        methods = [f"    def m{i}(self):\n" + "".join(f"        x{j} = {j}\n" for j in range(20)) for i in range(10)]
+        code = "class Big:\n    \"\"\"A class too large for one chunk.\"\"\"\n\n" + "\n".join(methods)
+        chunks = chunk_python_code(code, {"path": "big.py"}, max_chars=1000, min_chars=100)
+
+        self.assertGreater(len(chunks), 1)
+        first = chunks[0]
+        self.assertIn("class Big:", first.content)
+        self.assertEqual((first.metadata["chunk_type"], first.metadata["symbol"]), ("class", "Big"))
+        for chunk in chunks[1:]:
+            self.assertEqual(chunk.metadata["chunk_type"], "method")
+            self.assertTrue(chunk.metadata["symbol"].startswith("Big.m"))
+
+
+if __name__ == "__main__":
+    unittest.main()
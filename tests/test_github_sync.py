@@ -0,0 +1,127 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from ingestion.loaders.github import get_head_commit, load_github_changes
+
+REPO_URL = "https://github.com/example/project.git"
+
+
+def _git(cwd: str, *args: str):
+    subprocess.run(
+        ["git", "-C", cwd, "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _write(root: str, rel_path: str, text: str):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class IncrementalSyncTest(unittest.TestCase):
+    """Diffs a clone of a local bare repository before and after a pull, as a sync of a GitHub clone does."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        tmp = self._tmp.name
+        self.bare = os.path.join(tmp, "remote.git")
+        self.work = os.path.join(tmp, "work")
+        self.clone = os.path.join(tmp, "clone")
+        subprocess.run(["git", "init", "-q", "--bare", self.bare], check=True)
+        subprocess.run(["git", "init", "-q", self.work], check=True)
+
+    def commit_and_push(self, files: dict = None, removed=(), renamed=(), force=()):
+        for rel_path, text in (files or {}).items():
+            _write(self.work, rel_path, text)
+        for rel_path in removed:
+            _git(self.work, "rm", "-q", rel_path)
+        for old_path, new_path in renamed:
+            os.makedirs(os.path.dirname(os.path.join(self.work, new_path)), exist_ok=True)
+            _git(self.work, "mv", old_path, new_path)
+        _git(self.work, "add", "-A")
+        for rel_path in force:
+            _git(self.work, "add", "-f", rel_path)
+        _git(self.work, "commit", "-q", "-m", "change")
+        _git(self.work, "push", "-q", "file://" + self.bare, "HEAD:refs/heads/main")
+
+    def clone_and_pull(self, **change):
+        """Returns the clone's commits before and after pulling `change`."""
+        if not os.path.exists(self.clone):
+            subprocess.run(["git", "clone", "-q", "--branch", "main", "file://" + self.bare, self.clone], check=True)
+        old = get_head_commit(self.clone)
+        self.commit_and_push(**change)
+        _git(self.clone, "pull", "-q")
+        return old, get_head_commit(self.clone)
+
+    def changes(self, old, new, subpath=None):
+        return load_github_changes(REPO_URL, self.clone, old, new, subpath)
+
+    def rel(self, paths):
+        return sorted(os.path.relpath(path, self.clone) for path in paths)
+
+    def test_rename_delete_add_and_modify(self):
+        self.commit_and_push({
+            ".gitignore": "build/\n",
+            "keep.py": "x = 1\n",
+            "gone.py": "y = 1\n",
+            "old_name.py": "def f():\n    return 1\n",
+            "to_build.py": "z = 1\n",
+        })
+        old, new = self.clone_and_pull(
+            files={"keep.py": "x = 2\n", "added.py": "w = 1\n", "logo.png": "not really a png", "build/gen.py": "g = 1\n"},
+            removed=["gone.py"],
+            renamed=[("old_name.py", "new_name.py"), ("to_build.py", "build/to_build.py")],
+            force=["build/gen.py"],
+        )
+        changes = self.changes(old, new)
+
+        self.assertEqual(sorted(f.rel_path for f in changes.updated), ["added.py", "keep.py"])
+        self.assertEqual(self.rel(changes.listed), ["added.py", "keep.py", "logo.png"])
+        self.assertEqual(
+            [(os.path.relpath(a, self.clone), os.path.relpath(b, self.clone)) for a, b in changes.renamed],
+            [("old_name.py", "new_name.py")],
+        )
+        # A rename into an ignored folder drops the file like a delete
+        self.assertEqual(self.rel(changes.deleted), ["gone.py", "to_build.py"])
+        self.assertEqual(changes.updated[0].metadata["repo_url"], REPO_URL)
+
+    def test_ignore_file_change_needs_a_full_walk(self):
+        self.commit_and_push({".gitignore": "build/\n", "a.py": "a = 1\n"})
+        old, new = self.clone_and_pull(files={".gitignore": "build/\ndist/\n", "b.py": "b = 1\n"})
+
+        self.assertIsNone(self.changes(old, new))
+
+    def test_same_or_missing_commit(self):
+        self.commit_and_push({"a.py": "a = 1\n"})
+        old, _ = self.clone_and_pull(files={"b.py": "b = 1\n"})
+
+        self.assertIsNone(self.changes(None, old))
+        self.assertEqual(self.changes(old, old).updated, [])
+        self.assertIsNone(self.changes("0" * 40, old))
+
+    def test_subpath_boundaries(self):
+        self.commit_and_push({
+            "svc/inside.py": "i = 1\n",
+            "svc/leaving.py": "l = 1\n",
+            "other/arriving.py": "a = 1\n",
+            "other/outside.py": "o = 1\n",
+        })
+        old, new = self.clone_and_pull(
+            files={"svc/inside.py": "i = 2\n", "other/outside.py": "o = 2\n"},
+            renamed=[("svc/leaving.py", "other/leaving.py"), ("other/arriving.py", "svc/arriving.py")],
+        )
+        changes = self.changes(old, new, subpath="svc")
+
+        self.assertEqual(sorted(f.rel_path for f in changes.updated), ["svc/arriving.py", "svc/inside.py"])
+        self.assertEqual(self.rel(changes.deleted), ["svc/leaving.py"])
+        self.assertEqual(changes.renamed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
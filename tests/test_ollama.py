@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from embeddings.ollama import AdaptiveLimiter, OllamaEmbeddingModel
+
+
+class _StandInOllama(BaseHTTPRequestHandler):
+    """Answers /v1/embeddings with the scripted statuses, then with embeddings."""
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            status, retry_after = server.script.pop(0) if server.script else (200, None)
+
+        if status != 200:
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header("Retry-After", retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({
+            "data": [{"embedding": [float(len(text)), 1.0]} for text in payload["input"]]
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OllamaRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInOllama)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.script = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def model(self, **kwargs):
+        host, port = self.server.server_address
+        return OllamaEmbeddingModel("stand-in", base_url=f"http://{host}:{port}", timeout=5, **kwargs)
+
+    def test_throttling_is_retried_and_halves_the_limit(self):
+        self.server.script = [(429, "0"), (503, "0")]
+        model = self.model(max_in_flight=8, max_retries=5)
+
+        vectors = model.embed(["abc", "de"])
+
+        np.testing.assert_array_equal(vectors, np.array([[3.0, 1.0], [2.0, 1.0]], dtype=np.float32))
+        self.assertEqual(self.server.requests, 3)
+        # Halved twice (8 -> 4 -> 2), then nudged up by the success
+        self.assertEqual(model.limiter.limit, 2.5)
+        self.assertEqual(model.limiter.in_flight, 0)
+
+    def test_backoff_without_retry_after(self):
+        self.server.script = [(500, None)]
+        model = self.model(max_in_flight=4, max_retries=2)
+
+        started = time.monotonic()
+        model.embed(["a"])
+
+        # The first backoff is 0.5s, with up to 20% jitter either way
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+        self.assertEqual(self.server.requests, 2)
+        # A server error is retried but doesn't count as throttling
+        self.assertEqual(model.limiter.limit, 4)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.script = [(503, "0")] * 3
+        model = self.model(max_retries=3)
+
+        with self.assertRaises(requests.HTTPError):
+            model.embed(["a"])
+        self.assertEqual(self.server.requests, 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.script = [(400, None)]
+        model = self.model(max_retries=3)
+
+        with self.assertRaises(requests.HTTPError):
+            model.embed(["a"])
+        self.assertEqual(self.server.requests, 1)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def test_slow_responses_shrink_the_limit(self):
+        limiter = AdaptiveLimiter(max_limit=4)
+        limiter.acquire()
+        limiter.release(latency_per_item=0.01)
+        self.assertEqual(limiter.limit, 4)
+
+        limiter.acquire()
+        limiter.release(latency_per_item=0.05)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_limit_stays_within_bounds(self):
+        limiter = AdaptiveLimiter(max_limit=2)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 1)
+
+        for _ in range(50):
+            limiter.acquire()
+            limiter.release(latency_per_item=0.01)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        limiter = AdaptiveLimiter(max_limit=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def second():
+            limiter.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=second)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(latency_per_item=0.01)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import threading
+import unittest
+
+from ingestion.watcher import ChangeQueue
+
+
+def _drain(queue: ChangeQueue):
+    return queue.get_batch(threading.Event())
+
+
+class ChangeQueueMoveTest(unittest.TestCase):
+    def test_edit_then_rename_keeps_the_move(self):
+        queue = ChangeQueue(debounce=0, max_delay=0)
+        queue.add_update("/p/a.py")
+        queue.add_move("/p/a.py", "/p/b.py")
+
+        batch = _drain(queue)
+        self.assertEqual(batch.moves, [("/p/a.py", "/p/b.py", False)])
+        self.assertEqual(batch.updates, ["/p/b.py"])
+        self.assertEqual(batch.deletes, [])
+
+    def test_chained_renames_move_every_step(self):
+        queue = ChangeQueue(debounce=0, max_delay=0)
+        queue.add_move("/p/a.py", "/p/b.py")
+        queue.add_move("/p/b.py", "/p/c.py")
+
+        batch = _drain(queue)
+        self.assertEqual(batch.moves, [("/p/a.py", "/p/b.py", False), ("/p/b.py", "/p/c.py", False)])
+        self.assertEqual(batch.updates, ["/p/c.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
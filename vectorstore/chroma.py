@@ -1,44 +1,323 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, replace
 import chromadb
 from chromadb.config import Settings
-from uuid import uuid4
 
-from core.config import get_vector_persist_dir
+from core.config import (
+    HNSW_SPACE,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF,
+    get_vector_persist_dir,
+)
+
+def chunk_id(path: str, content: str, occurrence: int = 0) -> str:
+    """
+    Derives a stable chunk ID from the file path and the chunk's content.
+
+    `occurrence` tells apart identical chunks within the same file.
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+    return hashlib.sha256(f"{path}\0{content_hash}\0{occurrence}".encode("utf-8", errors="surrogatepass")).hexdigest()[:32]
+
+def chunk_ids(path: str, contents) -> list[str]:
+    """Returns the IDs for all chunks of one file, in order."""
+    seen = {}
+    ids = []
+    for content in contents:
+        occurrence = seen.get(content, 0)
+        seen[content] = occurrence + 1
+        ids.append(chunk_id(path, content, occurrence))
+    return ids
+
+def assign_chunk_ids(chunks) -> list[str]:
+    """Returns the IDs of chunks from any number of files, in order."""
+    by_path = {}
+    for chunk in chunks:
+        by_path.setdefault(chunk.metadata.get("path"), []).append(chunk.content)
+    assigned = {path: iter(chunk_ids(path, contents)) for path, contents in by_path.items()}
+    return [next(assigned[chunk.metadata.get("path")]) for chunk in chunks]
+
+def chunk_metadata(chunk) -> dict:
+    """Builds the stored metadata for a chunk."""
+    metadata = chunk.metadata.copy()
+    metadata["start_line"] = chunk.start_line
+    metadata["end_line"] = chunk.end_line
+
+    # ChromaDB doesn't allow None values in metadata
+    return {k: v for k, v in metadata.items() if v is not None}
+
+@dataclass
+class SearchResult:
+    """A chunk returned by a similarity query; lower distances are closer."""
+    id: str
+    content: str
+    metadata: dict
+    distance: float
+
+@dataclass(frozen=True)
+class HnswSettings:
+    """
+    HNSW parameters of a collection.
+
+    `space`, `m` and `construction_ef` shape the graph and are fixed when it
+    is built; `search_ef` only affects queries and can change at any time.
+    """
+    space: str = HNSW_SPACE
+    m: int = HNSW_M
+    construction_ef: int = HNSW_CONSTRUCTION_EF
+    search_ef: int = HNSW_SEARCH_EF
+
+    @classmethod
+    def from_collection(cls, collection) -> "HnswSettings":
+        hnsw = (collection.configuration or {}).get("hnsw") or {}
+        return cls(
+            space=hnsw.get("space", "l2"),
+            m=hnsw.get("max_neighbors", 16),
+            construction_ef=hnsw.get("ef_construction", 100),
+            search_ef=hnsw.get("ef_search", 100),
+        )
+
+    def build_params(self) -> tuple:
+        return (self.space, self.m, self.construction_ef)
+
+    def configuration(self) -> dict:
+        return {
+            "hnsw": {
+                "space": self.space,
+                "max_neighbors": self.m,
+                "ef_construction": self.construction_ef,
+                "ef_search": self.search_ef,
+            }
+        }
+
+    def describe(self) -> str:
+        return f"space={self.space} M={self.m} construction_ef={self.construction_ef} search_ef={self.search_ef}"
+
+# Settings for collections opened by this process; see `configure_hnsw`
+hnsw_settings = HnswSettings()
+_hnsw_explicit = False
+
+def configure_hnsw(**overrides) -> HnswSettings:
+    """
+    Overrides the HNSW settings (e.g. from the command line) for collections
+    opened from now on. Unlike settings from the environment, explicit ones
+    are applied to existing collections, rebuilding their graphs if needed.
+    """
+    global hnsw_settings, _hnsw_explicit
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    if overrides:
+        hnsw_settings = replace(hnsw_settings, **overrides)
+        _hnsw_explicit = True
+    return hnsw_settings
 
 class VectorStoreManager:
-    def __init__(self, project_path: str = ".", collection_name="cortex", persist_dir=None):
+    def __init__(self, project_path: str = ".", collection_name="cortex", persist_dir=None, hnsw: HnswSettings = None):
         if persist_dir is None:
             persist_dir = get_vector_persist_dir(project_path)
-            
+
         self.client = chromadb.PersistentClient(path=persist_dir)
+        self.collection_name = collection_name
+        self.hnsw = hnsw or hnsw_settings
+        self._recover_rebuild()
+        # The configuration only applies when the collection is created
         self.collection = self.client.get_or_create_collection(
-            name=collection_name
+            name=collection_name,
+            configuration=self.hnsw.configuration(),
         )
+        if hnsw is not None or _hnsw_explicit:
+            self.reconfigure(self.hnsw)
+        else:
+            self._check_settings()
 
-    def add_chunks(self, chunks, embeddings):
-        ids = []
-        documents = []
-        metadatas = []
+    @property
+    def _rebuild_name(self) -> str:
+        return f"{self.collection_name}-rebuild"
+
+    def _recover_rebuild(self):
+        """Finishes a rebuild that was interrupted between dropping the old collection and renaming the new one."""
+        names = {collection.name for collection in self.client.list_collections()}
+        if self._rebuild_name in names and self.collection_name not in names:
+            self.client.get_collection(self._rebuild_name).modify(name=self.collection_name)
+
+    def _check_settings(self):
+        current = HnswSettings.from_collection(self.collection)
+        if current.build_params() != self.hnsw.build_params():
+            print(f"Note: the vector index uses {current.describe()}, not the configured {self.hnsw.describe()}; "
+                  f"pass the --hnsw options to `cortex index` to rebuild it")
+        if current.search_ef != self.hnsw.search_ef:
+            self.collection.modify(configuration={"hnsw": {"ef_search": self.hnsw.search_ef}})
+
+    def reconfigure(self, settings: HnswSettings) -> bool:
+        """
+        Applies HNSW settings to the collection.
 
-        for chunk in chunks:
-            ids.append(str(uuid4()))
-            documents.append(chunk.content)
-            
-            # Prepare metadata and filter out None values
-            metadata = chunk.metadata.copy()
-            metadata["start_line"] = chunk.start_line
-            metadata["end_line"] = chunk.end_line
-            
-            # ChromaDB doesn't allow None values in metadata
-            clean_metadata = {k: v for k, v in metadata.items() if v is not None}
-            metadatas.append(clean_metadata)
-
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas,
+        A new `search_ef` is applied in place; new graph parameters rebuild
+        the collection from its stored embeddings, without re-embedding.
+
+        Returns:
+            bool: True if the collection was rebuilt
+        """
+        self.hnsw = settings
+        current = HnswSettings.from_collection(self.collection)
+        if current.build_params() == settings.build_params():
+            if current.search_ef != settings.search_ef:
+                self.collection.modify(configuration={"hnsw": {"ef_search": settings.search_ef}})
+            return False
+
+        print(f"Rebuilding the vector index with {settings.describe()}...")
+        names = {collection.name for collection in self.client.list_collections()}
+        if self._rebuild_name in names:
+            self.client.delete_collection(self._rebuild_name)
+        rebuilt = self.client.create_collection(self._rebuild_name, configuration=settings.configuration())
+        batch_size = self.client.get_max_batch_size()
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            if not len(page["ids"]):
+                break
+            rebuilt.add(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+            )
+            offset += len(page["ids"])
+        # The old collection stays intact until the copy is complete
+        self.client.delete_collection(self.collection_name)
+        rebuilt.modify(name=self.collection_name)
+        self.collection = self.client.get_collection(self.collection_name)
+        return True
+
+    def _batches(self, *columns):
+        # Chroma rejects writes larger than the client's max batch size
+        max_batch = self.client.get_max_batch_size()
+        for i in range(0, len(columns[0]), max_batch):
+            yield [column[i : i + max_batch] for column in columns]
+
+    def add_chunks(self, chunks, embeddings, ids=None):
+        """
+        Stores chunks with their embeddings.
+
+        Args:
+            chunks: Chunks to store
+            embeddings: (n, dim) float32 array, one row per chunk
+            ids: Precomputed chunk IDs; derived from path and content when omitted
+        """
+        if ids is None:
+            ids = assign_chunk_ids(chunks)
+
+        documents = [chunk.content for chunk in chunks]
+        metadatas = [chunk_metadata(chunk) for chunk in chunks]
+
+        for batch_ids, batch_documents, batch_embeddings, batch_metadatas in self._batches(
+            ids, documents, embeddings, metadatas
+        ):
+            self.collection.upsert(
+                ids=batch_ids,
+                documents=batch_documents,
+                embeddings=batch_embeddings,
+                metadatas=batch_metadatas,
+            )
+
+    def query(self, embedding, k: int = 10, where: dict = None) -> list[SearchResult]:
+        """Returns the `k` chunks nearest to a query embedding, closest first."""
+        if not self.collection.count():
+            return []
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
         )
+        return [
+            SearchResult(id_, content, metadata, distance)
+            for id_, content, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+
+    def get_file_chunks(self, path: str) -> dict:
+        """Returns the stored chunk IDs of a file mapped to their metadata."""
+        existing = self.collection.get(where={"path": path}, include=["metadatas"])
+        return dict(zip(existing["ids"], existing["metadatas"]))
+
+    def update_metadata(self, ids, chunks):
+        """Refreshes the metadata (e.g. line numbers) of already stored chunks."""
+        metadatas = [chunk_metadata(chunk) for chunk in chunks]
+        for batch_ids, batch_metadatas in self._batches(list(ids), metadatas):
+            self.collection.update(ids=batch_ids, metadatas=batch_metadatas)
+
+    def delete_ids(self, ids):
+        ids = list(ids)
+        for (batch_ids,) in self._batches(ids):
+            self.collection.delete(ids=batch_ids)
 
     def delete_by_file(self, path: str):
         self.collection.delete(where={"path": path})
 
+    def delete_by_files(self, paths, batch_size: int = 500):
+        """Deletes the chunks of many files with a handful of calls."""
+        paths = list(paths)
+        for i in range(0, len(paths), batch_size):
+            self.collection.delete(where={"path": {"$in": paths[i : i + batch_size]}})
+
+    def rename_file(self, old_path: str, new_path: str, new_abs_path: str = None):
+        """
+        Re-keys the chunks of a moved file without re-embedding them.
+
+        Chunk IDs include the path, so the stored embeddings are copied under
+        new IDs and the old entries removed.
+        """
+        existing = self.collection.get(
+            where={"path": old_path}, include=["metadatas", "documents", "embeddings"]
+        )
+        if not len(existing["ids"]):
+            return 0
+
+        metadatas = []
+        for metadata in existing["metadatas"]:
+            metadata = dict(metadata)
+            metadata["path"] = new_path
+            if new_abs_path is not None:
+                metadata["abs_path"] = new_abs_path
+            metadatas.append(metadata)
+
+        documents = list(existing["documents"])
+        new_ids = chunk_ids(new_path, documents)
+        embeddings = existing["embeddings"]
+        for batch_ids, batch_documents, batch_embeddings, batch_metadatas in self._batches(
+            new_ids, documents, embeddings, metadatas
+        ):
+            self.collection.upsert(
+                ids=batch_ids,
+                documents=batch_documents,
+                embeddings=batch_embeddings,
+                metadatas=batch_metadatas,
+            )
+        self.delete_ids(existing["ids"])
+        return len(new_ids)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_vector_store(project_path: str = ".") -> VectorStoreManager:
+    """
+    Returns the process-wide vector store handle for a project, opening it on
+    first use, so the indexer, the watcher and the agent tools share one client.
+    """
+    persist_dir = get_vector_persist_dir(os.path.abspath(project_path))
+    with _stores_lock:
+        store = _stores.get(persist_dir)
+        if store is None:
+            store = _stores[persist_dir] = VectorStoreManager(persist_dir=persist_dir)
+        return store
+
+def reset_vector_stores():
+    """Forgets the cached handles, e.g. after Chroma's client cache was cleared; they reopen on next use."""
+    with _stores_lock:
+        _stores.clear()
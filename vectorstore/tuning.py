@@ -0,0 +1,169 @@
+"""
+Recall/latency sweep over HNSW parameters.
+
+For each combination of M and construction_ef, the project's stored
+embeddings are indexed into a scratch collection, and a held-out query set
+is run against it at each search_ef. Results are compared with exact
+(brute-force) nearest neighbours, giving recall@k next to p50/p95 query
+latency, so an operating point can be chosen per repository size.
+
+Queries are either texts (e.g. questions agents typically ask), embedded
+with the project's model, or a random sample of stored chunks, which are
+then left out of the scratch index so they don't find themselves.
+"""
+
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+from .chroma import HnswSettings, get_vector_store, reset_vector_stores
+
+@dataclass
+class SweepResult:
+    settings: HnswSettings
+    recall: float        # mean recall@k against brute force
+    p50_ms: float
+    p95_ms: float
+    build_seconds: float
+
+def load_embeddings(collection, limit: int = None, batch_size: int = 5000) -> np.ndarray:
+    """Reads up to `limit` stored embeddings as one (n, dim) float32 array."""
+    pages = []
+    offset = 0
+    while limit is None or offset < limit:
+        size = batch_size if limit is None else min(batch_size, limit - offset)
+        page = collection.get(include=["embeddings"], limit=size, offset=offset)
+        if not len(page["ids"]):
+            break
+        pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    if not pages:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(pages)
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int, space: str, block: int = 32) -> np.ndarray:
+    """Returns the row indices of each query's `k` nearest corpus vectors, by brute force."""
+    if space == "cosine":
+        corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    squared_norms = (corpus * corpus).sum(axis=1)
+    k = min(k, len(corpus))
+    neighbors = []
+    # Query blocks keep the distance matrix small on large corpora
+    for start in range(0, len(queries), block):
+        products = queries[start : start + block] @ corpus.T
+        if space == "l2":
+            # |q - c|^2 up to the per-query constant |q|^2
+            distances = squared_norms[None, :] - 2 * products
+        else:
+            distances = -products
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+        neighbors.append(np.take_along_axis(top, order, axis=1))
+    return np.concatenate(neighbors)
+
+def sweep_hnsw(
+    project_path: str,
+    m_values: Sequence[int],
+    construction_efs: Sequence[int],
+    search_efs: Sequence[int],
+    k: int = 10,
+    query_count: int = 200,
+    query_texts: List[str] = None,
+    space: str = None,
+    limit: int = None,
+    seed: int = 0,
+) -> List[SweepResult]:
+    """
+    Measures recall@k and query latency for every parameter combination.
+
+    Args:
+        project_path: Indexed project whose embeddings are used
+        m_values, construction_efs, search_efs: Values to combine
+        k: Neighbours retrieved per query
+        query_count: Stored chunks held out as queries when no texts are given
+        query_texts: Queries to embed instead of sampling stored chunks
+        space: Distance space (defaults to the collection's own)
+        limit: Use at most this many stored embeddings
+        seed: Seed for the held-out sample
+
+    Returns:
+        list[SweepResult]: One result per combination, in sweep order
+    """
+    store = get_vector_store(project_path)
+    space = space or HnswSettings.from_collection(store.collection).space
+    corpus = load_embeddings(store.collection, limit)
+    if not len(corpus):
+        raise ValueError("The project has no indexed chunks; run `cortex index` first")
+
+    if query_texts:
+        from embeddings.factory import get_embedding_model
+        queries = np.asarray(get_embedding_model().embed(query_texts), dtype=np.float32)
+    else:
+        rng = np.random.default_rng(seed)
+        held_out = rng.choice(len(corpus), size=min(query_count, len(corpus) // 2), replace=False)
+        queries = corpus[held_out]
+        corpus = np.delete(corpus, held_out, axis=0)
+
+    k = min(k, len(corpus))
+    truth = exact_neighbors(corpus, queries, k, space)
+
+    results = []
+    try:
+        for m in m_values:
+            for construction_ef in construction_efs:
+                for search_ef, build_seconds, latencies, found in _run_graph(
+                    corpus, queries, k, space, m, construction_ef, search_efs
+                ):
+                    hits = sum(len(set(row) & set(expected.tolist())) for row, expected in zip(found, truth))
+                    results.append(SweepResult(
+                        settings=HnswSettings(space=space, m=m, construction_ef=construction_ef, search_ef=search_ef),
+                        recall=hits / (k * len(queries)),
+                        p50_ms=float(np.percentile(latencies, 50)),
+                        p95_ms=float(np.percentile(latencies, 95)),
+                        build_seconds=build_seconds,
+                    ))
+    finally:
+        # Reopening scratch clients dropped every cached Chroma system
+        reset_vector_stores()
+    return results
+
+def _run_graph(corpus, queries, k, space, m, construction_ef, search_efs):
+    """
+    Builds one graph in a scratch directory and yields, for each search_ef,
+    (search_ef, build seconds, per-query latencies in ms, neighbour rows).
+
+    Chroma reads `ef_search` when it loads a graph, so the scratch client is
+    reopened after each change, and warmed up before queries are timed.
+    """
+    with tempfile.TemporaryDirectory(prefix="cortex-sweep-") as scratch:
+        settings = HnswSettings(space=space, m=m, construction_ef=construction_ef, search_ef=search_efs[0])
+        started = time.perf_counter()
+        client = chromadb.PersistentClient(path=scratch)
+        collection = client.create_collection("sweep", configuration=settings.configuration())
+        batch_size = client.get_max_batch_size()
+        ids = [str(i) for i in range(len(corpus))]
+        for i in range(0, len(corpus), batch_size):
+            collection.add(ids=ids[i : i + batch_size], embeddings=corpus[i : i + batch_size])
+        collection.query(query_embeddings=queries[:1], n_results=k, include=[])
+        build_seconds = time.perf_counter() - started
+
+        for search_ef in search_efs:
+            collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+            SharedSystemClient.clear_system_cache()
+            collection = chromadb.PersistentClient(path=scratch).get_collection("sweep")
+            collection.query(query_embeddings=queries[:1], n_results=k, include=[])
+
+            latencies, found = [], []
+            for query in queries:
+                started = time.perf_counter()
+                row = collection.query(query_embeddings=[query], n_results=k, include=[])["ids"][0]
+                latencies.append((time.perf_counter() - started) * 1000)
+                found.append([int(id_) for id_ in row])
+            yield search_ef, build_seconds, latencies, found
+        SharedSystemClient.clear_system_cache()